@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+import fractions
+
+logger = logging.getLogger("NeonClock")
+
+VIDEO_CLOCK_RATE = 90000 # RTP video clock
+AUDIO_CLOCK_RATE = 48000 # Opus always runs at 48 kHz
+
+class ClockStream:
+    """
+    Timestamps one track's packets against a shared CaptureClock.
+
+    Video (frame_ticks None) is stamped straight from the capture time, so dropped or
+    duplicated frames just show up as a longer/shorter interval. Fixed-size audio
+    packets (frame_ticks samples each) stay sample-continuous, which is what the
+    decoder wants, and are re-anchored on the capture clock once they drift more than
+    RESYNC_FRAMES packets away from it (lost packets, stalls, sound card clock skew).
+    Timestamps always increase strictly.
+    """
+    RESYNC_FRAMES = 3
+
+    def __init__(self, clock, kind, clock_rate, frame_ticks=None):
+        self.clock = clock
+        self.kind = kind
+        self.clock_rate = clock_rate
+        self.frame_ticks = frame_ticks
+        self.time_base = fractions.Fraction(1, clock_rate)
+        self.last_pts = None
+        self.frames = 0
+        self.resyncs = 0
+        self.clamped = 0
+        self.offset_ms = 0.0  # media time minus capture time at the last stamp
+        self.max_interval_ms = 0.0
+
+    def stamp(self, capture_time=None):
+        """Returns (pts, time_base) for a packet captured at capture_time (monotonic s)."""
+        elapsed = self.clock.elapsed(capture_time)
+        clock_pts = round(elapsed * self.clock_rate)
+        last = self.last_pts
+
+        if last is None:
+            pts = clock_pts
+        elif self.frame_ticks:
+            pts = last + self.frame_ticks
+            if abs(clock_pts - pts) > self.RESYNC_FRAMES * self.frame_ticks:
+                logger.info(f"[CLOCK {self.kind}] Re-anchoring: {(clock_pts - pts) * 1000 / self.clock_rate:+.0f} ms drift")
+                pts = clock_pts
+                self.resyncs += 1
+        else:
+            pts = clock_pts
+
+        if last is not None:
+            if pts <= last:
+                pts = last + 1
+                self.clamped += 1
+            interval_ms = (pts - last) * 1000 / self.clock_rate
+            if interval_ms > self.max_interval_ms:
+                self.max_interval_ms = interval_ms
+
+        self.last_pts = pts
+        self.frames += 1
+        self.offset_ms = (pts / self.clock_rate - elapsed) * 1000
+        return pts, self.time_base
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "clock_rate": self.clock_rate,
+            "media_time_s": round((self.last_pts or 0) / self.clock_rate, 3),
+            "drift_ms": round(self.offset_ms, 1),
+            "max_interval_ms": round(self.max_interval_ms, 1),
+            "resyncs": self.resyncs,
+            "clamped": self.clamped,
+        }
+
+class CaptureClock:
+    """
+    Monotonic capture clock shared by the tracks of one MediaCaptureSystem.
+    Its epoch is the capture time of the first packet stamped by any of them, so
+    audio and video timestamps share the same zero and stay comparable for hours.
+    """
+    def __init__(self, time_fn=time.monotonic):
+        self._time = time_fn
+        self._epoch = None
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def now(self):
+        return self._time()
+
+    def elapsed(self, capture_time=None):
+        """Seconds since the epoch (never negative)."""
+        if capture_time is None:
+            capture_time = self._time()
+        with self._lock:
+            if self._epoch is None:
+                self._epoch = capture_time
+            return max(0.0, capture_time - self._epoch)
+
+    def stream(self, kind, clock_rate, frame_ticks=None):
+        with self._lock:
+            stream = self._streams.get(kind)
+            if stream is None:
+                stream = ClockStream(self, kind, clock_rate, frame_ticks)
+                self._streams[kind] = stream
+            return stream
+
+    def stats(self):
+        with self._lock:
+            streams = dict(self._streams)
+            uptime = 0.0 if self._epoch is None else self._time() - self._epoch
+        stats = {
+            "uptime_s": round(uptime, 1),
+            "streams": {kind: s.stats() for kind, s in streams.items()},
+        }
+        video, audio = streams.get("video"), streams.get("audio")
+        if video and audio and video.frames and audio.frames:
+            # Positive: audio is stamped later than the video captured at the same instant
+            stats["av_sync_ms"] = round(audio.offset_ms - video.offset_ms, 1)
+        return stats
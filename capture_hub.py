@@ -0,0 +1,336 @@
+import logging
+import asyncio
+import threading
+import time
+from collections import deque
+from aiortc.mediastreams import MediaStreamTrack
+from packet_queue import VIDEO_QUEUE_DEPTH
+from capture_clock import CaptureClock
+
+logger = logging.getLogger("NeonHub")
+
+# Ring depth per pipeline (~2s at 60 fps video / 20 ms Opus frames)
+VIDEO_RING_SIZE = 120
+AUDIO_RING_SIZE = 100
+
+class SharedPipeline:
+    """
+    One FFmpeg capture/encode process fanned out to many peer connections.
+
+    The source track (a BaseCaptureTrack) publishes encoded packets into a bounded
+    ring; every subscriber keeps its own cursor (sequence number) into that ring,
+    so a slow viewer never steals packets from a fast one.
+    """
+    def __init__(self, hub, key, source):
+        self.hub = hub
+        self.key = key
+        self.source = source
+        self.kind = source.kind
+        self._ring = deque(maxlen=VIDEO_RING_SIZE if self.kind == "video" else AUDIO_RING_SIZE)
+        self._next_seq = 0
+        self._last_key_seq = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.packets_published = 0
+        source._pipeline = self
+
+    def publish(self, data, is_keyframe=False, capture_time=None):
+        """Called by the source reader for every encoded packet."""
+        if capture_time is None:
+            capture_time = time.monotonic()
+        with self._lock:
+            seq = self._next_seq
+            self._ring.append((seq, data, is_keyframe, capture_time))
+            self._next_seq += 1
+            if is_keyframe:
+                self._last_key_seq = seq
+            self.packets_published += 1
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub._wake()
+
+    def read(self, sub):
+        """
+        Returns the next packet for a subscriber and advances its cursor, or None
+        when it is up to date. A cursor of None (new subscriber) or one that fell off
+        the ring is resynced: video restarts at the newest keyframe when it is within
+        VIDEO_QUEUE_DEPTH packets of the head, otherwise it waits at the head for the
+        next one (and asks the source for it) instead of replaying a stale GOP; audio
+        restarts at the newest packet. Video subscribers lagging more than
+        VIDEO_QUEUE_DEPTH packets skip whole dependent runs to the next keyframe, like
+        VideoPacketQueue; audio subscribers drifting over target catch up like
+        AudioPacketQueue.
+        """
+        with self._lock:
+            data, need_keyframe = self._read_locked(sub)
+        if need_keyframe:
+            # Long GOP / intra refresh: request an IDR (rate-limited by the source) instead of waiting
+            request_keyframe = getattr(self.source, "request_keyframe", None)
+            if request_keyframe:
+                request_keyframe()
+        return data
+
+    def _read_locked(self, sub):
+        if not self._ring:
+            return None, False
+        need_keyframe = False
+        oldest = self._ring[0][0]
+        cursor = sub._cursor
+        if sub._awaiting_key:
+            if self._last_key_seq is None or self._last_key_seq < cursor:
+                sub._cursor = self._next_seq # P-frames before the IDR are undecodable: never queued
+                return None, False
+            sub._awaiting_key = False
+            cursor = self._last_key_seq
+        elif cursor is None or cursor < oldest:
+            if cursor is not None:
+                logger.warning(f"[HUB {self.kind}] Subscriber lagged {oldest - cursor} packets behind the ring, resyncing")
+                sub.dropped_packets += oldest - cursor
+            cursor = self._resync_cursor(oldest)
+            if cursor is None:
+                # Wait at the head for the next IDR rather than replaying up to a GOP of old video
+                sub._cursor = self._next_seq
+                sub._awaiting_key = True
+                return None, True
+        elif self.kind == "video" and self._next_seq - cursor > VIDEO_QUEUE_DEPTH:
+            # Too far behind: jump to the newest keyframe if it is ahead of us
+            if self._last_key_seq is not None and self._last_key_seq > cursor:
+                sub.dropped_packets += self._last_key_seq - cursor
+                sub.dropped_gops += 1
+                cursor = self._last_key_seq
+            else:
+                need_keyframe = True # Nothing to skip to yet
+        elif self.kind == "audio":
+            # Same catch-up rule as AudioPacketQueue: never let audio lag build up
+            drop = self.source._audio_queue.excess(self._next_seq - cursor)
+            if drop:
+                sub.dropped_packets += drop
+                sub.catchups += 1
+                cursor += drop
+        idx = cursor - oldest
+        if idx >= len(self._ring):
+            sub._cursor = cursor
+            return None, need_keyframe
+        seq, data, _, sub._capture_time = self._ring[idx]
+        sub._cursor = seq + 1
+        return data, need_keyframe
+
+    def _resync_cursor(self, oldest):
+        if self.kind == "video":
+            if self._last_key_seq is None or self._last_key_seq < oldest:
+                return None # Wait for the next IDR, P-frames alone are undecodable
+            if self._next_seq - self._last_key_seq > VIDEO_QUEUE_DEPTH:
+                return None # Newest IDR too far behind the head: a burst of stale frames
+            return self._last_key_seq
+        return self._next_seq - 1
+
+    def ensure_running(self):
+        self.source._check_process()
+
+    def source_alive(self):
+        is_capturing = getattr(self.source, "is_capturing", None)
+        return is_capturing() if is_capturing else True
+
+    def subscribe(self, loop=None):
+        sub = SubscriberTrack(self, loop)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+            remaining = len(self._subscribers)
+        if remaining == 0:
+            self.hub._release(self)
+
+    def subscribers(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stop(self):
+        self.source._pipeline = None
+        self.source.stop()
+
+class SubscriberTrack(MediaStreamTrack):
+    """Per-peer-connection track reading a SharedPipeline through its own cursor."""
+    def __init__(self, pipeline, loop=None):
+        super().__init__()
+        self.kind = pipeline.kind
+        self.pipeline = pipeline
+        self.frame_count = 0
+        self.pool_hit = False # Pipeline was already running (warm or shared) when subscribed
+        self._clock = None
+        self._capture_time = None # Capture time of the last packet read
+        self._cursor = None
+        self._awaiting_key = False # Video: cursor parked at the head until the next IDR
+        self._active = True
+        self.dropped_packets = 0
+        self.dropped_gops = 0
+        self.catchups = 0
+        self.on_remb = None # REMB from this viewer's RTP sender (--adaptive-bitrate)
+        self._ev = asyncio.Event()
+        try:
+            self._loop = loop or asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def _wake(self):
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._ev.set() # Published from the asyncio pipe reader: no thread handoff
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._ev.set)
+        except RuntimeError:
+            pass
+
+    async def recv(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        while self._active:
+            self.pipeline.ensure_running()
+            data = self.pipeline.read(self)
+            if data is not None:
+                source = self.pipeline.source
+                frame = source._make_frame(data)
+                if self.on_remb is not None:
+                    frame._report_remb = self.on_remb
+                if self._clock is None:
+                    self.attach_clock(CaptureClock())
+                frame.pts, frame.time_base = self._clock.stamp(self._capture_time)
+                self.frame_count += 1
+                return frame
+
+            self._ev.clear()
+            try:
+                await asyncio.wait_for(self._ev.wait(), timeout=0.1)
+            except asyncio.TimeoutError:
+                continue
+        raise Exception(f"Track {self.kind} stopped")
+
+    def attach_clock(self, clock):
+        """Stamps this subscriber's frames on clock (its session's CaptureClock)."""
+        source = self.pipeline.source
+        self._clock = clock.stream(self.kind, source.clock_rate, source.frame_ticks)
+
+    def clock_stats(self):
+        return self._clock.stats() if self._clock else None
+
+    def queue_stats(self):
+        """Depth (packets behind the pipeline head) and drop counters."""
+        depth = 0
+        if self._cursor is not None:
+            depth = max(0, self.pipeline._next_seq - self._cursor)
+        stats = {
+            "depth": depth,
+            "dropped_packets": self.dropped_packets,
+        }
+        if self.kind == "video":
+            stats["dropped_gops"] = self.dropped_gops
+        else:
+            audio_queue = self.pipeline.source._audio_queue
+            stats["latency_ms"] = depth * audio_queue.frame_ms
+            stats["target_ms"] = audio_queue.target_ms
+            stats["catchups"] = self.catchups
+        return stats
+
+    def stop(self):
+        if not self._active:
+            return
+        self._active = False
+        super().stop()
+        self.pipeline.unsubscribe(self)
+
+class CaptureHub:
+    """
+    Registry of shared capture pipelines keyed by (source, resolution, fps, bitrate, codec).
+    Viewers asking for the same key share a single FFmpeg process.
+    """
+    def __init__(self):
+        self._pipelines = {}
+        self._lock = threading.Lock()
+        self.pool = None # CapturePool keeping idle pipelines warm (optional)
+        self.hits = 0    # Subscriptions served by an already running pipeline
+        self.misses = 0  # Subscriptions that had to spawn one
+
+    def subscribe(self, key, factory):
+        """Returns a new subscriber track, spawning the pipeline via factory() if needed."""
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            hit = pipeline is not None
+            if pipeline is None:
+                pipeline = SharedPipeline(self, key, factory())
+                self._pipelines[key] = pipeline
+                self.misses += 1
+                logger.info(f"[HUB] New {pipeline.kind} pipeline: {key}")
+            else:
+                self.hits += 1
+                logger.info(f"[HUB] Reusing {pipeline.kind} pipeline: {key} ({pipeline.subscriber_count} subscribers)")
+            sub = pipeline.subscribe()
+        sub.pool_hit = hit
+        if self.pool is not None:
+            self.pool.touch(pipeline.kind, key, factory)
+        return sub
+
+    def ensure(self, key, factory):
+        """Returns (pipeline, created) without subscribing: used to pre-spawn warm pipelines."""
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            if pipeline is not None:
+                return pipeline, False
+            pipeline = SharedPipeline(self, key, factory())
+            self._pipelines[key] = pipeline
+        return pipeline, True
+
+    def idle_pipelines(self):
+        with self._lock:
+            return [p for p in self._pipelines.values() if p.subscriber_count == 0]
+
+    def _release(self, pipeline):
+        with self._lock:
+            if pipeline.subscriber_count > 0:
+                return # Someone subscribed again meanwhile
+            if self.pool is not None and self.pool.wants(pipeline.kind, pipeline.key):
+                logger.info(f"[HUB] Last subscriber left, keeping {pipeline.kind} pipeline warm: {pipeline.key}")
+                return
+            if self._pipelines.get(pipeline.key) is pipeline:
+                del self._pipelines[pipeline.key]
+        logger.info(f"[HUB] Last subscriber left, stopping {pipeline.kind} pipeline: {pipeline.key}")
+        pipeline.stop()
+
+    def sources(self, kind=None):
+        """Source tracks of the running pipelines (for live encoder control)."""
+        with self._lock:
+            return [p.source for p in self._pipelines.values() if kind is None or p.kind == kind]
+
+    def stop_all(self):
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+            self._pipelines.clear()
+        for pipeline in pipelines:
+            pipeline.stop()
+
+    def stats(self):
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+        return [{
+            "kind": p.kind,
+            "key": list(p.key),
+            "subscribers": p.subscriber_count,
+            "packets": p.packets_published,
+            "queues": [sub.queue_stats() for sub in p.subscribers()],
+        } for p in pipelines]
+
+# Process-wide hub shared by every peer connection
+hub = CaptureHub()
@@ -0,0 +1,106 @@
+import logging
+import asyncio
+
+logger = logging.getLogger("NeonPool")
+
+REFILL_INTERVAL = 2.0
+
+class CapturePool:
+    """
+    Keeps capture pipelines for common profiles running while nobody watches them.
+
+    A warm pipeline is just a hub pipeline with zero subscribers: FFmpeg (or the PyAV
+    engine) is already spawned, the encoder initialised and the ring holds the latest
+    keyframe, so a new session subscribes and gets its first frame immediately.
+    Per kind, the pinned profiles (--pool-profiles / current settings) plus the most
+    recently used ones are kept, up to `size`; a background task respawns warm
+    pipelines that died and stops idle ones that fell out of the pool.
+    """
+    def __init__(self, hub, size=1):
+        self.hub = hub
+        self.size = max(0, int(size))
+        self._pinned = {}   # kind -> [(key, factory)]
+        self._recent = {}   # kind -> [(key, factory)], most recent first
+        self._task = None
+        self.spawned = 0
+        self.respawned = 0
+        self.evicted = 0
+        hub.pool = self
+
+    def pin(self, kind, key, factory):
+        """Always keeps this profile warm (pre-spawned at start)."""
+        pinned = self._pinned.setdefault(kind, [])
+        if all(k != key for k, _ in pinned):
+            pinned.append((key, factory))
+
+    def touch(self, kind, key, factory):
+        """Records a profile a session just used (most recent first)."""
+        recent = [(k, f) for k, f in self._recent.get(kind, []) if k != key]
+        recent.insert(0, (key, factory))
+        del recent[max(self.size, 1) * 2:]
+        self._recent[kind] = recent
+
+    def profiles(self, kind):
+        """Profiles of a kind that should stay warm, pinned first."""
+        wanted = list(self._pinned.get(kind, []))
+        for key, factory in self._recent.get(kind, []):
+            if len(wanted) >= self.size:
+                break
+            if all(k != key for k, _ in wanted):
+                wanted.append((key, factory))
+        return wanted
+
+    def wants(self, kind, key):
+        return self.size > 0 and any(k == key for k, _ in self.profiles(kind))
+
+    def start(self):
+        if self._task is None and self.size > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            while True:
+                self.refill()
+                await asyncio.sleep(REFILL_INTERVAL)
+        except asyncio.CancelledError:
+            pass
+
+    def refill(self):
+        """One maintenance pass: spawn missing warm pipelines, restart dead ones, evict stale idle ones."""
+        if self.size <= 0:
+            return
+        for kind in set(self._pinned) | set(self._recent):
+            for key, factory in self.profiles(kind):
+                try:
+                    pipeline, created = self.hub.ensure(key, factory)
+                    if created:
+                        self.spawned += 1
+                        logger.info(f"[POOL] Pre-spawned {kind} pipeline: {key}")
+                    elif pipeline.subscriber_count == 0 and not pipeline.source_alive():
+                        self.respawned += 1
+                    pipeline.ensure_running()
+                except Exception as e:
+                    logger.error(f"[POOL] Could not warm {kind} pipeline {key}: {e}")
+
+        for pipeline in self.hub.idle_pipelines():
+            if not self.wants(pipeline.kind, pipeline.key):
+                self.evicted += 1
+                self.hub._release(pipeline)
+
+    def stats(self):
+        idle = self.hub.idle_pipelines()
+        return {
+            "size": self.size,
+            "warm": len(idle),
+            "warm_keys": [list(p.key) for p in idle],
+            "hits": self.hub.hits,
+            "misses": self.hub.misses,
+            "spawned": self.spawned,
+            "respawned": self.respawned,
+            "evicted": self.evicted,
+        }
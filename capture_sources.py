@@ -0,0 +1,161 @@
+import logging
+import os
+
+logger = logging.getLogger("NeonSources")
+
+DEFAULT_SOURCE = "x11"
+
+class CaptureInput:
+    """One FFmpeg input: demuxer, URL and demuxer options (same spec for the CLI and av.open)."""
+    def __init__(self, fmt, url, options=None, env=None):
+        self.format = fmt
+        self.url = url
+        self.options = dict(options or {})
+        self.env = env # Extra environment for the FFmpeg CLI process
+
+    def cli_args(self):
+        args = ["-f", self.format]
+        for key, value in self.options.items():
+            args += [f"-{key}", str(value)]
+        return args + ["-i", self.url]
+
+    def __repr__(self):
+        return f"CaptureInput({self.format}, {self.url!r})"
+
+def filter_path(path):
+    """Path as a movie/amovie filename inside a lavfi graph (option level, then graph level escaping)."""
+    for ch in "\\':":
+        path = path.replace(ch, "\\" + ch)
+    for ch in "\\'[],;":
+        path = path.replace(ch, "\\" + ch)
+    return path
+
+def parse_region(region):
+    """--region "x,y,w,h" -> (x11grab input, width, height); full screen 1920x1080 otherwise."""
+    input_str = ":0.0+0,0"
+    src_w, src_h = "1920", "1080"
+    try:
+        if region and "," in region:
+            r = region.split(',')
+            src_w, src_h = r[2], r[3]
+            input_str = f":0.0+{r[0]},{r[1]}"
+    except: pass
+    return input_str, src_w, src_h
+
+class CaptureSource:
+    """
+    A named capture backend: the FFmpeg inputs for video and audio.
+    desktop sources grab the real screen/speakers and need a display and a sound
+    server; the others run on headless hosts.
+    """
+    name = None
+    aliases = ()
+    desktop = False
+
+    def key(self, args, kind):
+        """Capture hub key part: sessions with equal keys can share the pipeline."""
+        return (self.name,)
+
+    def available(self, args):
+        """(ok, reason) for this host and settings."""
+        return True, None
+
+    def video_input(self, args, fps):
+        raise NotImplementedError
+
+    def audio_input(self, args, device="default"):
+        raise NotImplementedError
+
+SOURCES = {}
+
+def register_source(cls):
+    source = cls()
+    for name in (cls.name,) + tuple(cls.aliases):
+        SOURCES[name] = source
+    return cls
+
+def get_source(name=None):
+    """Source registered under name (or alias); unknown names fall back to the desktop grabber."""
+    name = (name or DEFAULT_SOURCE).lower()
+    source = SOURCES.get(name)
+    if source is None:
+        logger.warning(f"[SOURCE] Unknown capture backend '{name}', using {DEFAULT_SOURCE}")
+        source = SOURCES[DEFAULT_SOURCE]
+    return source
+
+def available_sources():
+    return sorted({source.name for source in SOURCES.values()})
+
+@register_source
+class X11Source(CaptureSource):
+    """Desktop: x11grab + PulseAudio monitor (the original capture path)."""
+    name = "x11"
+    # Desktop grabbers without a dedicated source yet (GUI choices) map here
+    aliases = ("x11grab", "pipewire", "dda", "gdi")
+    desktop = True
+
+    def key(self, args, kind):
+        return ("x11grab", args.region) if kind == "video" else ("pulse",)
+
+    def available(self, args):
+        if os.environ.get("DISPLAY") or os.path.exists("/tmp/.X11-unix/X0"):
+            return True, None
+        return False, "no X display"
+
+    def video_input(self, args, fps):
+        input_str, src_w, src_h = parse_region(args.region)
+        return CaptureInput("x11grab", input_str,
+                            {"framerate": str(fps), "video_size": f"{src_w}x{src_h}", "draw_mouse": "0"})
+
+    def audio_input(self, args, device="default"):
+        latency = "10"
+        if getattr(args, 'audio_gpu', False) or getattr(args, 'ultra_low_latency', False):
+            latency = "1"
+        return CaptureInput("pulse", device, env={"PULSE_LATENCY_MSEC": latency})
+
+@register_source
+class SyntheticSource(CaptureSource):
+    """Headless: lavfi testsrc2 + sine tone, paced to wall clock by (a)realtime."""
+    name = "synthetic"
+    aliases = ("lavfi", "testsrc")
+
+    def video_input(self, args, fps):
+        return CaptureInput("lavfi", f"testsrc2=size={args.resolution}:rate={fps},realtime")
+
+    def audio_input(self, args, device="default"):
+        # One beep per second: audible A/V sync reference against the testsrc2 counter
+        return CaptureInput("lavfi", "sine=frequency=440:beep_factor=4:sample_rate=48000,arealtime")
+
+@register_source
+class FileSource(CaptureSource):
+    """Headless: loops a pre-recorded file (--capture-file) at its native speed."""
+    name = "file"
+
+    def key(self, args, kind):
+        return ("file", getattr(args, 'capture_file', None))
+
+    def available(self, args):
+        path = getattr(args, 'capture_file', None)
+        if not path or not os.path.isfile(path):
+            return False, f"capture file not found: {path}"
+        return True, None
+
+    @staticmethod
+    def _has_audio(path):
+        try:
+            import av
+            with av.open(path) as container:
+                return bool(container.streams.audio)
+        except Exception:
+            return False
+
+    def video_input(self, args, fps):
+        # Each loop restarts the file's timestamps: renumber them so the output stays monotonic
+        path = filter_path(args.capture_file)
+        return CaptureInput("lavfi", f"movie=filename={path}:loop=0,setpts=N/FRAME_RATE/TB,realtime")
+
+    def audio_input(self, args, device="default"):
+        if not self._has_audio(args.capture_file):
+            return CaptureInput("lavfi", "anullsrc=r=48000:cl=stereo,arealtime")
+        path = filter_path(args.capture_file)
+        return CaptureInput("lavfi", f"amovie=filename={path}:loop=0,asetpts=N/SR/TB,arealtime")
@@ -2,31 +2,98 @@ import logging
 import asyncio
 import os
 import time
-import fractions
 import subprocess
+import copy
 import threading
 import av
-import numpy as np
 from aiortc.mediastreams import MediaStreamTrack
+import capture_hub
+from packet_queue import VideoPacketQueue, AudioPacketQueue, classify_access_unit
+from pipe_reader import AnnexBSplitter, OggPacketSplitter
+from capture_clock import CaptureClock, VIDEO_CLOCK_RATE, AUDIO_CLOCK_RATE
+from pyav_engine import PyAVVideoEngine, intra_refresh_options
+from frame_pool import FrameBufferPool
+from dynamic_scale import DynamicScaler, FpsGovernor
+from idle_detect import StaticSceneDetector, mpdecimate_filter, IDLE_KEEPALIVE_FPS
+import capture_sources
+from keyframe_gate import KeyframeGate
+from rate_control import BitrateController
+from latency_probe import drawbox_filter, stamp_buffer, stamp_ms
 
 logger = logging.getLogger("NeonCapture")
 
 IS_WINDOWS = os.name == "nt"
 
+# Max bytes per pipe read; also the asyncio stream buffer limit
+PIPE_READ_SIZE = 1 << 20
+
+# Raw frame slots: latest frame + frames held by the encoder + the one being read
+RAW_FRAME_SLOTS = 4
+
+# --intra-refresh on the FFmpeg CLI: PLIs can't reach the encoder, so a real IDR still goes
+# out this often for late joiners and lossy viewers (the PyAV engine serves PLIs instead)
+INTRA_REFRESH_IDR_INTERVAL = 5.0
+
+# PLI/FIR on the FFmpeg CLI: the encoder can't be told to emit an IDR, but a respawned FFmpeg
+# starts on one. Done at most this often, and only when the next GOP IDR is further away
+CLI_KEYFRAME_RESPAWN_INTERVAL = 2.0
+
+# --dynamic-scale / --adaptive-fps: how often the encoded video source re-evaluates its ladders
+SCALE_CHECK_INTERVAL = 0.5
+
+# --adaptive-bitrate on the FFmpeg CLI: a new bitrate means a respawn (and an IDR),
+# so only sizeable retunes are applied, and not more often than this
+CLI_BITRATE_STEP = 0.25
+CLI_RESPAWN_INTERVAL = 5.0
+
+# --audio-latency presets (GUI sends the Portuguese labels lowercased)
+AUDIO_LATENCY_TARGETS_MS = {"low": 40, "baixa": 40, "normal": 80, "high": 150, "alta": 150}
+
+def audio_target_delay_ms(args):
+    """Most audio allowed to sit in the send queue; --buffer-audio (ms) overrides the preset."""
+    try:
+        buffer_ms = int(float(getattr(args, 'buffer_audio', 0) or 0))
+    except (TypeError, ValueError):
+        buffer_ms = 0
+    if buffer_ms > 0:
+        return buffer_ms
+    preset = str(getattr(args, 'audio_latency', 'low')).lower()
+    return AUDIO_LATENCY_TARGETS_MS.get(preset, AUDIO_LATENCY_TARGETS_MS["low"])
+
+class PassthroughVideoFrame(av.VideoFrame):
+    """Placeholder frame carrying an encoded access unit (plain av frames take no extra attributes)."""
+
+class PassthroughAudioFrame(av.AudioFrame):
+    """Placeholder frame carrying encoded Opus packets."""
+
 class BaseCaptureTrack(MediaStreamTrack):
     """
     Base simplificada para captura via FFmpeg com Pipes.
     """
+    # Timestamp clock: subclasses set the RTP clock rate and, for fixed-size audio
+    # packets, the samples per packet (None = stamp every frame by capture time)
+    clock_rate = VIDEO_CLOCK_RATE
+    frame_ticks = None
     def __init__(self):
         super().__init__()
         self.process = None
         self._running = False
         self._latest_frame = None
+        self._latest_time = None
+        self._clock = None # ClockStream of the owning MediaCaptureSystem
         self._lock = threading.Lock()
         self._ev = asyncio.Event()
         self.frame_count = 0
-        self._buf_idx = 0
-        
+        self._reader_task = None # Asyncio reader of the encoded passthrough
+        self._engine = None # In-process PyAV engine (--engine pyav)
+        self._pipeline = None # Set by capture_hub when this track feeds a shared pipeline
+        self._idle_detector = None # StaticSceneDetector (--idle-skip) on paths that see raw frames
+        self._latency_probe = False # --latency-probe marker stamped into raw frames
+        # Encoded video keeps whole GOPs instead of overwriting the latest frame
+        self._video_queue = VideoPacketQueue()
+        # Audio tracks replace this with their own frame duration / target delay
+        self._audio_queue = AudioPacketQueue()
+
         # Performance Tracking
         self._last_fps_check = time.time()
         self._frame_counter = 0
@@ -36,12 +103,20 @@ class BaseCaptureTrack(MediaStreamTrack):
     def _start_ffmpeg(self, cmd, env=None):
         self.stop() 
         self._running = True
+        with self._lock:
+            self._video_queue.clear()
+            self._audio_queue.clear()
         
         full_env = os.environ.copy()
         if env:
             full_env.update(env)
 
         logger.info(f"[{self.kind.upper()}] Iniciando FFmpeg (MAX PERF)...")
+        if getattr(self, "is_encoded", False):
+            # Encoded passthrough is read on the event loop: no threads, no demuxer probe
+            self._reader_task = asyncio.ensure_future(self._run_encoded(cmd, full_env))
+            return
+
         self.process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -52,88 +127,155 @@ class BaseCaptureTrack(MediaStreamTrack):
         
         self._thread = threading.Thread(target=self._read_loop, daemon=True)
         self._thread.start()
-        
-        self._err_thread = threading.Thread(target=self._error_loop, daemon=True)
-        self._err_thread.start()
+        threading.Thread(target=self._error_loop, daemon=True).start()
+
+    def _start_engine(self, engine):
+        """Starts an in-process PyAVVideoEngine; its packets are handed back to the event loop."""
+        self.stop()
+        self._running = True
+        with self._lock:
+            self._video_queue.clear()
+            self._audio_queue.clear()
+
+        loop = asyncio.get_event_loop()
+        def deliver(data, capture_time):
+            if self._engine is engine: # Packets already queued by a stopped engine never reach its successor
+                self._on_encoded_packet(data, capture_time)
+
+        def on_packet(data, capture_time):
+            try:
+                loop.call_soon_threadsafe(deliver, data, capture_time)
+            except RuntimeError:
+                engine.stop() # Event loop closed under us
+
+        engine.on_packet = on_packet
+        self._engine = engine
+        logger.info(f"[{self.kind.upper()}] Iniciando engine PyAV (in-process)...")
+        engine.start()
+
+    def _log_ffmpeg_line(self, line):
+        line_str = line.decode(errors="replace").strip()
+        if "error" in line_str.lower():
+            logger.error(f"[FFmpeg {self.kind}] {line_str}")
+        # Filter out warnings to clean logs unless critical
+        elif "dropped" in line_str.lower():
+            logger.warning(f"[FFmpeg {self.kind}] {line_str}")
 
     def _error_loop(self):
         while self._running and self.process and self.process.stderr:
             try:
                 line = self.process.stderr.readline()
                 if not line: break
-                line_str = line.decode().strip()
-                if "error" in line_str.lower():
-                    logger.error(f"[FFmpeg {self.kind}] {line_str}")
-                # Filter out warnings to clean logs unless critical
-                elif "dropped" in line_str.lower():
-                    logger.warning(f"[FFmpeg {self.kind}] {line_str}")
+                self._log_ffmpeg_line(line)
             except: break
 
     def _read_loop(self):
-        if hasattr(self, "is_encoded") and self.is_encoded:
-            self._read_loop_encoded()
-        else:
-            self._read_loop_raw()
+        self._read_loop_raw()
 
-    def _read_loop_encoded(self):
-        """Robust OBS-style reading using PyAV's demuxer on the pipe."""
-        container = None
+    async def _run_encoded(self, cmd, env):
+        """
+        Event-loop-native reader for the encoded passthrough: asyncio subprocess pipes
+        split in place into H.264 access units (Annex-B) or Opus packets (Ogg pages).
+        """
+        task = asyncio.current_task()
+        process = None
+        err_task = None
         try:
-            # We use Annex-B for H.264 and Matroska for Opus to ensure flushable packets
-            fmt = "h264" if self.kind == "video" else "matroska"
-            container = av.open(self.process.stdout, format=fmt)
-            
-            # Identify the stream
-            stream = None
-            if self.kind == "video":
-                stream = container.streams.video[0]
-            else:
-                stream = container.streams.audio[0]
-
-            for packet in container.demux(stream):
-                if not packet.data: continue
-                
-                with self._lock:
-                    packet_bytes = bytes(packet)
-                    if self.kind == "video":
-                        self._latest_frame = packet_bytes
-                    else:
-                        if not hasattr(self, "_queue"): self._queue = []
-                        self._queue.append(packet_bytes)
-                        if len(self._queue) > 50: self._queue.pop(0)
-                    self._frame_counter += 1
-                
-                self._ev.set()
-                
-                # Performance Tracking
-                now = time.time()
-                if now - self._last_fps_check >= 1.0:
-                    fps = self._frame_counter / (now - self._last_fps_check)
-                    self._fps_history.append(fps)
-                    if len(self._fps_history) > 60: self._fps_history.pop(0)
-                    self._frame_counter = 0
-                    self._last_fps_check = now
-                
-                if now - self._last_log_time >= 10.0:
-                    avg_fps = sum(self._fps_history) / len(self._fps_history) if self._fps_history else 0
-                    logger.info(f"[PERF] Capture {self.kind} (ENCODED): {avg_fps:.1f} FPS")
-                    self._last_log_time = now
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                limit=PIPE_READ_SIZE
+            )
+            if self._reader_task is not task:
+                return # Stopped or restarted while spawning
+            self.process = process
+            err_task = asyncio.ensure_future(self._error_loop_async(process.stderr))
+            splitter = AnnexBSplitter() if self.kind == "video" else OggPacketSplitter()
 
+            while self._running:
+                chunk = await process.stdout.read(PIPE_READ_SIZE)
+                if not chunk:
+                    break
+                now = time.monotonic()
+                for unit in splitter.feed(chunk):
+                    self._on_encoded_packet(unit, now)
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
             if self._running:
                 logger.error(f"Error in encoded read loop {self.kind}: {e}")
         finally:
-            if container: container.close()
-            self.stop()
+            if err_task:
+                err_task.cancel()
+            if process and process.returncode is None:
+                try: process.kill()
+                except ProcessLookupError: pass
+            if self._reader_task is task:
+                self._reader_task = None
+                self._running = False
+                self.process = None
+
+    async def _error_loop_async(self, stream):
+        try:
+            while True:
+                line = await stream.readline()
+                if not line: break
+                self._log_ffmpeg_line(line)
+        except (asyncio.CancelledError, ValueError):
+            pass
+
+    def _on_encoded_packet(self, packet_bytes, capture_time=None):
+        keyframe = disposable = False
+        if self.kind == "video":
+            keyframe, disposable = classify_access_unit(packet_bytes)
+        self._last_packet_key = keyframe
+        if self._pipeline is not None:
+            # Shared capture: the hub ring owns the packet, subscribers read it
+            self._pipeline.publish(packet_bytes, keyframe, capture_time)
+            self._frame_counter += 1
+        else:
+            with self._lock:
+                if self.kind == "video":
+                    self._video_queue.push(packet_bytes, keyframe, now=capture_time, disposable=disposable)
+                else:
+                    self._audio_queue.push(packet_bytes, now=capture_time)
+                self._frame_counter += 1
+            self._ev.set()
+        
+        # Performance Tracking
+        now = time.time()
+        if now - self._last_fps_check >= 1.0:
+            fps = self._frame_counter / (now - self._last_fps_check)
+            self._fps_history.append(fps)
+            if len(self._fps_history) > 60: self._fps_history.pop(0)
+            self._frame_counter = 0
+            self._last_fps_check = now
+        
+        if now - self._last_log_time >= 10.0:
+            avg_fps = sum(self._fps_history) / len(self._fps_history) if self._fps_history else 0
+            if self.kind == "video" and self._pipeline is None:
+                q = self._video_queue.stats()
+                logger.info(f"[PERF] Capture {self.kind} (ENCODED): {avg_fps:.1f} FPS | Queue {q['depth']}/{q['max_depth']} | Dropped {q['dropped_packets']} pkts ({q['dropped_gops']} GOPs)")
+            elif self._pipeline is None:
+                q = self._audio_queue.stats()
+                logger.info(f"[PERF] Capture {self.kind} (ENCODED): {avg_fps:.1f} FPS | Queue {q['latency_ms']}/{q['target_ms']} ms | Dropped {q['dropped_packets']} pkts")
+            else:
+                logger.info(f"[PERF] Capture {self.kind} (ENCODED): {avg_fps:.1f} FPS")
+            self._last_log_time = now
 
     def _read_loop_raw(self):
         """Standard raw pipe reading."""
         while self._running and self.process:
             try:
                 current_buf = None
+                slot = None
                 if self.kind == "video":
-                    if self._buffers is None: break
-                    current_buf = self._buffers[self._buf_idx]
+                    if self._frame_pool is None: break
+                    # Pipe -> pooled slot is the only copy; the slot is ours until wrapped
+                    slot = self._frame_pool.acquire()
+                    current_buf = slot.buffer if slot else self._scratch
                 else: 
                     current_buf = bytearray(self.frame_size)
                 
@@ -144,17 +286,28 @@ class BaseCaptureTrack(MediaStreamTrack):
                     if not n: break
                     total_read += n
                 
-                if total_read < self.frame_size: break
+                if total_read < self.frame_size:
+                    if slot: self._frame_pool.release(slot)
+                    break
+                if self.kind == "video" and slot is None:
+                    continue # Every slot still being encoded: drop this capture frame
+                if slot is not None and self._idle_detector is not None:
+                    if self._idle_detector.check(slot.array[:self.height]):
+                        self._frame_pool.release(slot) # Static scene: nothing new to encode
+                        continue
+                if slot is not None and self._latency_probe:
+                    stamp_buffer(slot.array, self.width, self.height, stamp_ms())
                 
+                stale = None
                 with self._lock:
                     if self.kind == "video":
-                        self._latest_frame = current_buf
-                        self._buf_idx = 1 - self._buf_idx
+                        stale, self._latest_frame = self._latest_frame, slot
+                        self._latest_time = time.monotonic()
                     else:
-                        if not hasattr(self, "_queue"): self._queue = []
-                        self._queue.append(bytes(current_buf))
-                        if len(self._queue) > 15: self._queue.pop(0)
+                        self._audio_queue.push(bytes(current_buf))
                     self._frame_counter += 1
+                if stale is not None:
+                    self._frame_pool.release(stale) # Never handed out: straight back to the pool
                 self._ev.set()
 
                 now = time.time()
@@ -180,15 +333,19 @@ class BaseCaptureTrack(MediaStreamTrack):
         while self._running:
             data = None
             with self._lock:
-                if self.kind == "video":
+                if self.kind == "video" and getattr(self, "is_encoded", False):
+                    data = self._video_queue.pop()
+                    capture_time = self._video_queue.last_arrival
+                elif self.kind == "video":
                     data = self._latest_frame
+                    capture_time = self._latest_time
                     self._latest_frame = None
                 else:
-                    if hasattr(self, "_queue") and self._queue:
-                        data = self._queue.pop(0)
+                    data = self._audio_queue.pop()
+                    capture_time = self._audio_queue.last_arrival
             
             if data:
-                return self._create_frame(data)
+                return self._create_frame(data, capture_time)
             
             self._ev.clear()
             try:
@@ -199,28 +356,30 @@ class BaseCaptureTrack(MediaStreamTrack):
                 continue
         raise Exception(f"Track {self.kind} stopped")
 
-    def _create_frame(self, data):
+    def _create_frame(self, data, capture_time=None):
+        frame = self._make_frame(data)
+        pts, tb = self._get_pts(capture_time)
+        frame.pts = pts
+        frame.time_base = tb
+        return frame
+
+    def _make_frame(self, data):
+        """Builds the av frame for a payload, without timestamps."""
         try:
             if self.kind == "video":
                 if hasattr(self, "is_encoded") and self.is_encoded:
                     # Video Passthrough
-                    frame = av.VideoFrame(16, 16, "yuv420p")
+                    frame = PassthroughVideoFrame(16, 16, "yuv420p")
                     frame._encoded_payload = [data]
+                    # PLI/FIR: aiortc's force_keyframe reaches the capture encoder through this
+                    frame._request_keyframe = getattr(self, "request_keyframe", None)
                 else:
-                    # Raw Video mode
-                    frame = av.VideoFrame(self.width, self.height, "yuv420p")
-                    y_size = self.width * self.height
-                    u_size = (self.width // 2) * (self.height // 2)
-                    y_plane = np.frombuffer(data, dtype=np.uint8, count=y_size, offset=0).reshape((self.height, self.width))
-                    u_plane = np.frombuffer(data, dtype=np.uint8, count=u_size, offset=y_size).reshape((self.height // 2, self.width // 2))
-                    v_plane = np.frombuffer(data, dtype=np.uint8, count=u_size, offset=y_size + u_size).reshape((self.height // 2, self.width // 2))
-                    frame.planes[0].update(y_plane)
-                    frame.planes[1].update(u_plane)
-                    frame.planes[2].update(v_plane)
+                    # Raw Video mode: zero-copy frame over the pooled slot (released with the frame)
+                    frame = self._frame_pool.wrap(data)
             else:
                 if hasattr(self, "is_encoded") and self.is_encoded:
                     # Audio Passthrough
-                    frame = av.AudioFrame(format="s16", layout="stereo", samples=960)
+                    frame = PassthroughAudioFrame(format="s16", layout="stereo", samples=960)
                     frame.sample_rate = 48000
                     # Return payload as list of bytes
                     frame._encoded_payload = [data]
@@ -229,33 +388,73 @@ class BaseCaptureTrack(MediaStreamTrack):
                     frame = av.AudioFrame(format="s16", layout="5.1", samples=480)
                     frame.sample_rate = 48000
                     frame.planes[0].update(data)
-
-            pts, tb = self._get_pts()
-            frame.pts = pts
-            frame.time_base = tb
             return frame
         except Exception as e:
             logger.error(f"Erro ao criar frame {self.kind}: {e}")
             raise e
 
+    def queue_stats(self):
+        """Depth, latency and drop counters of this track's packet queue."""
+        with self._lock:
+            if self.kind == "video" and getattr(self, "_frame_pool", None) is not None:
+                return self._frame_pool.stats() # Raw capture: buffer pool occupancy
+            if self.kind == "video":
+                return self._video_queue.stats()
+            return self._audio_queue.stats()
+
+    def is_capturing(self):
+        if self._engine is not None:
+            return self._engine.is_alive()
+        if getattr(self, "is_encoded", False):
+            # The asyncio reader lives exactly as long as its FFmpeg process
+            return self._reader_task is not None and not self._reader_task.done()
+        return self.process is not None and self.process.poll() is None
+
     def _check_process(self):
-        if self.process is None or self.process.poll() is not None:
+        if not self.is_capturing():
             self._start_capture()
 
     def stop(self):
         self._running = False
+        frame_pool = getattr(self, "_frame_pool", None)
+        if frame_pool is not None:
+            with self._lock:
+                stale, self._latest_frame = self._latest_frame, None
+            if stale is not None:
+                frame_pool.release(stale)
+        if self._engine is not None:
+            self._engine.stop()
+            self._engine = None
+        if self._reader_task is not None:
+            task, self._reader_task = self._reader_task, None
+            try: task.cancel()
+            except RuntimeError: pass # Event loop already closed
         if self.process:
             try:
                 self.process.terminate()
-                self.process.wait(timeout=0.2)
+                if isinstance(self.process, subprocess.Popen):
+                    self.process.wait(timeout=0.2)
             except:
                 try: self.process.kill()
                 except: pass
             self.process = None
 
-    def _get_pts(self):
-        # Override me
-        pass
+    def attach_clock(self, clock):
+        """Stamps this track's frames on clock (shared with the other track of its session)."""
+        self._clock = clock.stream(self.kind, self.clock_rate, self.frame_ticks)
+
+    def clock_stats(self):
+        return self._clock.stats() if self._clock else None
+
+    def idle_stats(self):
+        return self._idle_detector.stats() if self._idle_detector else None
+
+    def _get_pts(self, capture_time=None):
+        if self._clock is None:
+            self.attach_clock(CaptureClock())
+        pts, tb = self._clock.stamp(capture_time)
+        self.frame_count += 1
+        return pts, tb
 
     def _start_capture(self):
         # Override me
@@ -266,15 +465,24 @@ class BaseCaptureTrack(MediaStreamTrack):
 
 class EncodedAudioTrack(BaseCaptureTrack):
     kind = "audio"
+    clock_rate = AUDIO_CLOCK_RATE
+    frame_ticks = 960 # 20 ms Opus packets
     def __init__(self, args, device="default"):
         super().__init__()
         self.args = args
+        self.source = capture_sources.get_source(getattr(args, 'capture_backend', None))
         self.device = device
-        if self.device == "default":
+        if self.device == "default" and self.source.desktop:
             self.device = self._find_best_audio_source()
         self.is_encoded = True
         self.frame_size = 0 
-        self._queue = []
+        self._audio_queue = AudioPacketQueue(frame_ms=20, target_ms=audio_target_delay_ms(args))
+
+    @staticmethod
+    def pipeline_key(args, device="default"):
+        """Capture hub key: sessions with the same key share one FFmpeg process."""
+        source = capture_sources.get_source(getattr(args, 'capture_backend', None))
+        return source.key(args, "audio") + (device, getattr(args, 'audio_bitrate', 128), "opus")
     
     def _find_best_audio_source(self):
         try:
@@ -295,45 +503,33 @@ class EncodedAudioTrack(BaseCaptureTrack):
         except: pass
         return "default"
 
-    def _get_pts(self):
-        pts = self.frame_count * 960
-        tb = fractions.Fraction(1, 48000)
-        self.frame_count += 1
-        return pts, tb
-
     def _start_capture(self):
-        # OBS-Style: Direct Opus encoding in Matroska for robust piping
+        # OBS-Style: Direct Opus encoding in Ogg, split into packets on the event loop
+        spec = self.source.audio_input(self.args, self.device)
         cmd = [
             "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
-            "-f", "pulse", "-i", self.device,
+        ] + spec.cli_args() + [
             "-ac", "2", "-ar", "48000",
             "-c:a", "libopus", "-b:a", f"{getattr(self.args, 'audio_bitrate', 128)}k",
             "-vbr", "on", "-compression_level", "10", "-frame_duration", "20",
             "-application", "lowdelay",
-            "-f", "matroska", "-cluster_size_limit", "2", "-cluster_time_limit", "10", "-"
+            # One Ogg page per 20 ms Opus packet, flushed immediately to the pipe
+            "-f", "ogg", "-page_duration", "20000", "-flush_packets", "1", "-"
         ]
-        
-        latency = "10"
-        if getattr(self.args, 'audio_gpu', False) or getattr(self.args, 'ultra_low_latency', False):
-             latency = "1"
-             
+
         logger.info(f"[AUDIO OBS-STYLE] CMD: {' '.join(cmd)}")
-        self._start_ffmpeg(cmd, env={"PULSE_LATENCY_MSEC": latency})
+        self._start_ffmpeg(cmd, env=spec.env)
 
 class WindowsAudioTrack(BaseCaptureTrack):
     kind = "audio"
+    clock_rate = AUDIO_CLOCK_RATE
+    frame_ticks = 480 # 10 ms PCM blocks
     def __init__(self, args):
         super().__init__()
         self.args = args
         self.channels = 2 # WASAPI loopback usually stereo
         self.frame_size = 480 * self.channels * 2 
-        self._queue = []
-
-    def _get_pts(self):
-        pts = self.frame_count * 480
-        tb = fractions.Fraction(1, 48000)
-        self.frame_count += 1
-        return pts, tb
+        self._audio_queue = AudioPacketQueue(frame_ms=10, target_ms=audio_target_delay_ms(args))
 
     def _start_capture(self):
         # We use WASAPI loopback to capture system audio on Windows
@@ -350,31 +546,229 @@ class EncodedVideoTrack(BaseCaptureTrack):
     def __init__(self, pc_id, args):
         self.args = args
         self.width, self.height = map(int, args.resolution.split('x'))
-        self.fps = 60
+        self.base_fps = self.fps = int(getattr(args, 'fps', 60))
+        self.source = capture_sources.get_source(getattr(args, 'capture_backend', None))
         self.is_encoded = True
-        self._buffers = None
+        self._frame_pool = None
         super().__init__()
-        
-    def _get_pts(self):
-        pts = self.frame_count
-        tb = fractions.Fraction(1, self.fps)
-        self.frame_count += 1
-        return pts, tb
+        # Resolution / frame-rate ladders below the configured ones, switched from encoder load + RTCP feedback
+        self.scaler = DynamicScaler(self.width, self.height) if getattr(args, 'dynamic_scale', False) else None
+        self.fps_governor = FpsGovernor(self.fps) if getattr(args, 'adaptive_fps', False) else None
+        self._last_scale_check = 0.0
+        # Static scenes: mpdecimate on the CLI path, the numpy detector inside the PyAV engine
+        self.idle_skip = bool(getattr(args, 'idle_skip', False))
+        self.idle_fps = float(getattr(args, 'idle_fps', IDLE_KEEPALIVE_FPS))
+        self._capture_started = time.monotonic()
+        self._packets_out = 0
+        self.intra_refresh = bool(getattr(args, 'intra_refresh', False))
+        self._latency_probe = bool(getattr(args, 'latency_probe', False))
+        # RTCP PLI/FIR from any viewer of this pipeline, rate-limited and coalesced
+        self.keyframes = KeyframeGate(self._force_keyframe)
+        self._loop = None # Event loop running the capture, for respawns asked from encoder threads
+        self._last_keyframe_at = None
+        self._keyframe_respawn_at = None
+        self.keyframe_respawns = 0
+        # Encoder bitrate (bps): the configured one is the ceiling, --adaptive-bitrate
+        # sessions pull it down and the shared encoder follows the lowest of them
+        self.max_bitrate = self.bitrate = int(getattr(args, 'bitrate', 20000)) * 1000
+        self._session_bitrates = {}
+
+    @staticmethod
+    def pipeline_key(args):
+        """Capture hub key: sessions with the same key share one FFmpeg process."""
+        source = capture_sources.get_source(getattr(args, 'capture_backend', None))
+        return source.key(args, "video") + (args.resolution, getattr(args, 'fps', 60),
+                args.bitrate, getattr(args, 'encoder', 'auto').lower(),
+                getattr(args, 'engine', 'ffmpeg'),
+                bool(getattr(args, 'idle_skip', False)), float(getattr(args, 'idle_fps', IDLE_KEEPALIVE_FPS)),
+                bool(getattr(args, 'intra_refresh', False)), bool(getattr(args, 'latency_probe', False)))
+
+    def reconfigure(self, bitrate=None, gop=None, keyframe=False):
+        """
+        Live encoder control. Only the PyAV engine can apply it without a restart;
+        on the FFmpeg CLI a new bitrate respawns FFmpeg and GOP/keyframe return False.
+        """
+        if bitrate:
+            self.max_bitrate = int(bitrate) # New ceiling for --adaptive-bitrate too
+            self._apply_bitrate(self._bitrate_target(), force=True)
+            if self._engine is None:
+                return not gop and not keyframe
+        if self._engine is None:
+            return False
+        if gop:
+            self._engine.set_gop(gop)
+        if keyframe:
+            self._engine.request_keyframe()
+        return True
+
+    def set_session_bitrate(self, session, bps):
+        """--adaptive-bitrate: one viewer's target (None = viewer gone); the encoder follows the lowest."""
+        if bps is None:
+            self._session_bitrates.pop(session, None)
+        else:
+            self._session_bitrates[session] = int(bps)
+        return self._apply_bitrate(self._bitrate_target())
+
+    def _bitrate_target(self):
+        return min(min(self._session_bitrates.values(), default=self.max_bitrate), self.max_bitrate)
+
+    def _apply_bitrate(self, bps, force=False):
+        if self._engine is not None:
+            self.bitrate = bps
+            self._engine.set_bitrate(bps) # Reopens in place (throttled by the engine)
+            return True
+        if bps == self.bitrate:
+            return False
+        if not force:
+            if abs(bps - self.bitrate) < self.bitrate * CLI_BITRATE_STEP:
+                return False
+            if time.monotonic() - self._capture_started < CLI_RESPAWN_INTERVAL:
+                return False
+        logger.info(f"[VIDEO] Bitrate {self.bitrate // 1000} -> {bps // 1000} kbps")
+        self.bitrate = bps
+        if self._running:
+            # CLI: -b:v is fixed for the life of the process
+            self._fps_history.clear()
+            asyncio.get_event_loop().call_soon(self._start_capture)
+        return True
+
+    def engine_stats(self):
+        return self._engine.stats() if self._engine else None
+
+    def request_keyframe(self):
+        """Viewer lost a picture (PLI/FIR): IDR on the next frame, rate-limited. Thread-safe."""
+        return self.keyframes.request()
+
+    def keyframe_stats(self):
+        stats = self.keyframes.stats()
+        stats["respawns"] = self.keyframe_respawns
+        return stats
+
+    def _gop_seconds(self):
+        if self.intra_refresh:
+            return INTRA_REFRESH_IDR_INTERVAL # The forced IDRs are the only ones
+        return int(getattr(self.args, 'gop', 60)) / max(1, self.fps)
+
+    def _force_keyframe(self):
+        if self._engine is not None:
+            self._engine.request_keyframe()
+            return
+        # FFmpeg CLI: respawn it (first frame is an IDR) unless the GOP brings one sooner
+        now = time.monotonic()
+        if self._last_keyframe_at is not None and self._last_keyframe_at + self._gop_seconds() - now < CLI_KEYFRAME_RESPAWN_INTERVAL:
+            return
+        if self._keyframe_respawn_at is not None and now - self._keyframe_respawn_at < CLI_KEYFRAME_RESPAWN_INTERVAL:
+            return
+        if not self._running or self._loop is None:
+            return
+        self._keyframe_respawn_at = now
+        self.keyframe_respawns += 1
+        logger.info("[VIDEO] Keyframe request: restarting FFmpeg for an immediate IDR")
+        self._fps_history.clear()
+        try:
+            self._loop.call_soon_threadsafe(self._start_capture)
+        except RuntimeError:
+            pass # Event loop closed
+
+    def scale_stats(self):
+        return self.scaler.stats() if self.scaler else None
+
+    def fps_stats(self):
+        return self.fps_governor.stats() if self.fps_governor else None
+
+    def governors(self):
+        return [g for g in (self.scaler, self.fps_governor) if g is not None]
+
+    def idle_stats(self):
+        if not self.idle_skip:
+            return None
+        if self._idle_detector is not None:
+            return self._idle_detector.stats()
+        # CLI: mpdecimate drops inside FFmpeg, skipped = grabbed frames that never came out
+        expected = (time.monotonic() - self._capture_started) * self.fps
+        skipped = max(0, int(expected) - self._packets_out)
+        return {
+            "idle": None,
+            "frames": int(expected),
+            "skipped": skipped,
+            "skipped_fraction": round(skipped / expected, 3) if expected >= 1 else 0.0,
+        }
+
+    def _on_encoded_packet(self, packet_bytes, capture_time=None):
+        super()._on_encoded_packet(packet_bytes, capture_time)
+        self._packets_out += 1
+        if self._last_packet_key:
+            self._last_keyframe_at = time.monotonic()
+            self.keyframes.on_keyframe()
+        else:
+            self.keyframes.poll()
+        if self.scaler is not None or self.fps_governor is not None:
+            self._update_governors()
+
+    def _encoder_load(self):
+        """Fraction of the frame budget the encoder needs (>= 1.0: it can't keep up)."""
+        if self._engine is not None:
+            return self._engine.encode_load()
+        if not self._fps_history or self.idle_skip:
+            return None # mpdecimate output rate says nothing about the encoder
+        # FFmpeg CLI: only the output rate is visible, falling behind the capture rate = overloaded
+        fps = self._fps_history[-1]
+        if fps >= self.fps * 0.97:
+            return 0.5
+        if fps < self.fps * 0.9:
+            return 1.0
+        return 0.75
+
+    def _update_governors(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now - self._last_scale_check < SCALE_CHECK_INTERVAL:
+            return
+        self._last_scale_check = now
+        load = self._encoder_load()
+        restart = False
+        # Resolution gives way first (frames matter more than pixels) and comes back last
+        if self.scaler is not None:
+            self.scaler.report_encoder(load)
+            size = self.scaler.update(now, can_up=self.fps_governor is None or self.fps_governor.rung == 0)
+            if size is not None:
+                self.width, self.height = size
+                if self._engine is not None:
+                    self._engine.set_resolution(*size) # Encoder reopens in place, next frame is an IDR
+                else:
+                    restart = True
+        if self.fps_governor is not None:
+            self.fps_governor.report_encoder(load)
+            fps = self.fps_governor.update(now, can_down=self.scaler is None or self.scaler.at_bottom)
+            if fps is not None:
+                self.fps = fps # PTS come from capture times, so they stay right at any rate
+                if self._engine is not None:
+                    self._engine.set_fps(fps)
+                else:
+                    restart = True
+        if restart:
+            # CLI: respawn FFmpeg with the new settings (outside the reader task being cancelled)
+            self._fps_history.clear()
+            asyncio.get_event_loop().call_soon(self._start_capture)
 
     def _start_capture(self):
-        input_str = ":0.0+0,0"
-        src_w, src_h = "1920", "1080"
-        
+        self._capture_started = time.monotonic()
+        self._packets_out = 0
+        self._last_keyframe_at = None
         try:
-             if self.args.region and "," in self.args.region:
-                  r = self.args.region.split(',')
-                  src_w, src_h = r[2], r[3]
-                  input_str = f":0.0+{r[0]},{r[1]}"
-        except: pass
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+        if getattr(self.args, 'engine', 'ffmpeg') == "pyav":
+            self._idle_detector = StaticSceneDetector(self.idle_fps) if self.idle_skip else None
+            self._start_pyav()
+            return
+        self._idle_detector = None
 
         # OBS-Style Encoder Selection & Tuning
+        import compat # x264 preset (ultrafast, or the benchmark winner with --encoder auto)
         encoder = "libx264"
-        enc_opts = ["-preset", "ultrafast", "-tune", "zerolatency"]
+        enc_opts = ["-preset", compat.ENCODER_CONFIG.get("preset", "ultrafast"), "-tune", "zerolatency"]
         
         # Determine target encoder
         req_enc = getattr(self.args, 'encoder', 'auto').lower()
@@ -401,41 +795,106 @@ class EncodedVideoTrack(BaseCaptureTrack):
                 "-vf", f"scale={self.width}:{self.height},format=yuv420p"
             ]
             logger.info("[VIDEO] Using NVENC (Nvidia)")
+        elif req_enc == "qsv":
+            encoder = "h264_qsv"
+            enc_opts = [
+                "-preset", "veryfast",
+                "-async_depth", "1",
+                "-look_ahead", "0",
+                "-vf", f"scale={self.width}:{self.height},format=nv12"
+            ]
+            logger.info("[VIDEO] Using QSV (Intel)")
+        elif req_enc == "amf":
+            encoder = "h264_amf"
+            enc_opts = [
+                "-usage", "ultralowlatency",
+                "-quality", "speed",
+                "-rc", "cbr",
+                "-vf", f"scale={self.width}:{self.height},format=nv12"
+            ]
+            logger.info("[VIDEO] Using AMF (AMD)")
         else:
             # CPU or fallback
             enc_opts += ["-vf", f"scale={self.width}:{self.height},format=yuv420p"]
             logger.info("[VIDEO] Using Software/CPU (libx264)")
 
+        if self.intra_refresh:
+            refresh = intra_refresh_options(encoder)
+            if refresh is None:
+                logger.warning(f"[VIDEO] {encoder} has no intra refresh, keeping periodic IDRs")
+            else:
+                for key, value in refresh.items():
+                    enc_opts += [f"-{key}", value]
+                enc_opts += ["-force_key_frames", f"expr:gte(t,n_forced*{INTRA_REFRESH_IDR_INTERVAL})"]
+                logger.info(f"[VIDEO] Intra refresh every {getattr(self.args, 'gop', 60)} frames instead of IDRs")
+
+        if self._latency_probe:
+            vf = enc_opts.index("-vf") + 1
+            if "hwupload" in enc_opts[vf]:
+                # drawbox needs software frames: stamp at capture size (blocks follow ih), scale on the GPU
+                enc_opts[vf] = (f"format=yuv420p,{drawbox_filter()},format=nv12,hwupload,"
+                                f"scale_vaapi={self.width}:{self.height}")
+            else:
+                enc_opts[vf] = f"{enc_opts[vf]},{drawbox_filter(self.height)}"
+            logger.info("[VIDEO] Latency probe: stamping a wall-clock marker into every frame")
+
+        fps_mode = []
+        if self.idle_skip:
+            # Duplicate frames are dropped before upload/scale; vfr keeps FFmpeg from re-filling them
+            vf = enc_opts.index("-vf") + 1
+            enc_opts[vf] = f"{mpdecimate_filter(self.fps, self.idle_fps)},{enc_opts[vf]}"
+            fps_mode = ["-fps_mode", "vfr"]
+
         cmd = [
             "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
-            "-f", "x11grab", "-framerate", "60", "-draw_mouse", "0",
-            "-video_size", f"{src_w}x{src_h}", "-i", input_str,
+        ] + self.source.video_input(self.args, self.fps).cli_args() + [
             "-c:v", encoder
         ] + enc_opts + [
-            "-b:v", f"{self.args.bitrate}k",
-            "-maxrate", f"{self.args.bitrate}k",
-            "-bufsize", f"{self.args.bitrate//10}k",
-            "-g", "60", "-f", "h264", "-"
+            "-b:v", f"{self.bitrate // 1000}k",
+            "-maxrate", f"{self.bitrate // 1000}k",
+            "-bufsize", f"{self.bitrate // 10000}k",
+            "-g", str(int(getattr(self.args, 'gop', 60))), "-flush_packets", "1"
+        ] + fps_mode + [
+            "-f", "h264", "-"
         ]
         
         logger.info(f"[VIDEO OBS-STYLE] CMD: {' '.join(cmd)}")
         self._start_ffmpeg(cmd)
 
+    def _start_pyav(self):
+        import compat # Live ENCODER_CONFIG (bitrate / GOP from /api/settings)
+        req_enc = getattr(self.args, 'encoder', 'auto').lower()
+        # VAAPI needs hw frames PyAV cannot upload: x264 unless NVENC/QSV/AMF was asked for
+        codec_name = {"nvenc": "h264_nvenc", "gpu": "h264_nvenc",
+                      "qsv": "h264_qsv", "amf": "h264_amf"}.get(req_enc, "libx264")
+        spec = self.source.video_input(self.args, self.base_fps)
+        engine = PyAVVideoEngine(
+            spec.url, spec.format, spec.options,
+            self.width, self.height, self.base_fps,
+            codec_name=codec_name,
+            bitrate=self.bitrate,
+            gop=int(getattr(self.args, 'gop', 60)),
+            config=compat.ENCODER_CONFIG,
+            idle_detector=self._idle_detector,
+            intra_refresh=self.intra_refresh,
+            latency_probe=self._latency_probe
+        )
+        engine.fps = self.fps # Grab at the base rate, decimate to the governed one (can go back up live)
+        self._start_engine(engine)
+
 class WindowsVideoTrack(BaseCaptureTrack):
     kind = "video"
     def __init__(self, pc_id, args):
         self.args = args
         self.width, self.height = map(int, args.resolution.split('x'))
-        self.fps = 60
+        self.fps = int(getattr(args, 'fps', 60))
         self.frame_size = int(self.width * self.height * 1.5)
-        self._buffers = [bytearray(self.frame_size), bytearray(self.frame_size)]
+        self._frame_pool = FrameBufferPool(self.width, self.height, RAW_FRAME_SLOTS)
+        self._scratch = bytearray(self.frame_size) # Sink for frames dropped while the pool is exhausted
         super().__init__()
-
-    def _get_pts(self):
-        pts = self.frame_count
-        tb = fractions.Fraction(1, self.fps)
-        self.frame_count += 1
-        return pts, tb
+        if getattr(args, 'idle_skip', False):
+            self._idle_detector = StaticSceneDetector(float(getattr(args, 'idle_fps', IDLE_KEEPALIVE_FPS)))
+        self._latency_probe = bool(getattr(args, 'latency_probe', False))
 
     def _start_capture(self):
         # Prefer ddagrab (Desktop Duplication API) for performance, fallback to gdigrab
@@ -444,7 +903,7 @@ class WindowsVideoTrack(BaseCaptureTrack):
         cmd = [
             "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
             "-f", backend,
-            "-framerate", "60",
+            "-framerate", str(self.fps),
             "-i", "desktop",
             "-vf", f"scale={self.width}:{self.height},format=yuv420p",
             "-c:v", "rawvideo", "-f", "rawvideo", "-"
@@ -453,24 +912,144 @@ class WindowsVideoTrack(BaseCaptureTrack):
         logger.info(f"[VIDEO WINDOWS] Backend: {backend} | CMD: {' '.join(cmd)}")
         self._start_ffmpeg(cmd)
 
+def video_profile(args):
+    """(hub key, factory) for the encoded video pipeline of these settings."""
+    snapshot = copy.copy(args) # /api/quality mutates args; warm pipelines must keep theirs
+    return EncodedVideoTrack.pipeline_key(snapshot), lambda: EncodedVideoTrack("pool", snapshot)
+
+def audio_profile(args):
+    """(hub key, factory) for the encoded audio pipeline of these settings."""
+    snapshot = copy.copy(args)
+    return EncodedAudioTrack.pipeline_key(snapshot), lambda: EncodedAudioTrack(snapshot)
+
 class MediaCaptureSystem:
     def __init__(self, pc_id, args):
         self.pc_id = pc_id
         self.args = args
-        if IS_WINDOWS:
+        self.source = capture_sources.get_source(getattr(args, 'capture_backend', None))
+        ok, reason = self.source.available(args)
+        if not ok:
+            logger.warning(f"[{pc_id}] Capture source '{self.source.name}' unavailable: {reason}")
+        if IS_WINDOWS and self.source.desktop:
+            # Windows desktop capture (ddagrab/WASAPI) stays on the raw path
             self.video_track = WindowsVideoTrack(pc_id, args)
             self.audio_track = WindowsAudioTrack(args)
         else:
-            self.video_track = EncodedVideoTrack(pc_id, args)
-            self.audio_track = EncodedAudioTrack(args)
+            # Encoded passthrough is shared: identical settings reuse one FFmpeg per kind,
+            # and a warm one from the capture pool skips the spawn/probe/first-IDR wait
+            self.video_track = capture_hub.hub.subscribe(*video_profile(args))
+            self.audio_track = capture_hub.hub.subscribe(*audio_profile(args))
+            logger.info(f"[{pc_id}] Capture pipelines: video={'hit' if self.video_track.pool_hit else 'miss'} audio={'hit' if self.audio_track.pool_hit else 'miss'}")
+        # One capture clock per session: audio and video PTS share the same zero
+        self.clock = CaptureClock()
+        self.video_track.attach_clock(self.clock)
+        self.audio_track.attach_clock(self.clock)
+        self._fps_sample = (time.monotonic(), 0)
+        # --adaptive-bitrate: this viewer's AIMD controller, steering the (shared) encoder
+        self.rate = None
+        source = self._video_source()
+        if getattr(args, 'adaptive_bitrate', False) and hasattr(source, "set_session_bitrate"):
+            self.rate = BitrateController(source.max_bitrate)
+            self.video_track.on_remb = self.rate.report_remb
     
     def get_video_track(self): return self.video_track
     def get_audio_track(self): return self.audio_track
     
+    def sync_stats(self):
+        """Capture clock metrics: per-track drift/resyncs and the A/V offset."""
+        return self.clock.stats()
+
     async def setup_tracks(self, pc):
         pc.addTrack(self.video_track)
         pc.addTrack(self.audio_track)
 
+    def _video_source(self):
+        """Track owning the video encoder: the shared pipeline's source, or the track itself."""
+        pipeline = getattr(self.video_track, "pipeline", None)
+        return pipeline.source if pipeline is not None else self.video_track
+
+    def _governors(self):
+        governors = getattr(self._video_source(), "governors", None)
+        return governors() if governors else []
+
+    def report_network(self, loss, rtt_ms=None):
+        """RTCP receiver report feedback (loss fraction 0..1, RTT in ms) for --dynamic-scale/--adaptive-fps."""
+        for governor in self._governors():
+            governor.report_network(self.pc_id, loss, rtt_ms)
+        if self.rate is not None:
+            self.rate.report_loss(loss, rtt_ms)
+
+    def report_client_stats(self, data):
+        """Client STATS message: {fps, bitrate: received Mbps (string), latency: RTT ms}."""
+        if self.rate is None:
+            return
+        try:
+            self.rate.report_client(float(data.get("bitrate") or 0), float(data.get("latency") or 0))
+        except (TypeError, ValueError):
+            pass
+
+    def update_bitrate(self):
+        """One --adaptive-bitrate step; returns the session's new target (bps) when it moved."""
+        if self.rate is None:
+            return None
+        source = self._video_source()
+        self.rate.max_bps = source.max_bitrate # /api/settings may have moved the ceiling
+        target = self.rate.update()
+        if target is not None:
+            source.set_session_bitrate(self.pc_id, target)
+        return target
+
+    def bitrate_stats(self):
+        if self.rate is None:
+            return None
+        stats = self.rate.stats()
+        stats["encoder_kbps"] = self._video_source().bitrate // 1000
+        return stats
+
+    def scale_stats(self):
+        scale_stats = getattr(self._video_source(), "scale_stats", None)
+        return scale_stats() if scale_stats else None
+
+    def capture_stats(self):
+        """This session's capture side for /api/sessions: send queues, clock streams and encoder adaptation."""
+        return {
+            "queues": {"video": self.video_track.queue_stats(), "audio": self.audio_track.queue_stats()},
+            "clock": {"video": self.video_track.clock_stats(), "audio": self.audio_track.clock_stats(),
+                      "av_sync_ms": self.sync_stats().get("av_sync_ms")},
+            "scale": self.scale_stats(), # --dynamic-scale ladder of the (shared) encoder
+            "keyframes": self.keyframe_stats(), # PLI/FIR served by the (shared) encoder
+        }
+
+    def keyframe_stats(self):
+        keyframe_stats = getattr(self._video_source(), "keyframe_stats", None)
+        return keyframe_stats() if keyframe_stats else None
+
+    def idle_stats(self):
+        """--idle-skip: fraction of capture frames skipped as static."""
+        idle_stats = getattr(self._video_source(), "idle_stats", None)
+        return idle_stats() if idle_stats else None
+
+    def fps_stats(self):
+        """Video frames this session actually received per second vs the capture target."""
+        now = time.monotonic()
+        count = self.video_track.frame_count
+        last_time, last_count = self._fps_sample
+        self._fps_sample = (now, count)
+        source = self._video_source()
+        stats = {
+            "achieved": round((count - last_count) / (now - last_time), 1) if now > last_time else 0.0,
+            "target": getattr(source, "fps", None),
+            "base": int(getattr(self.args, 'fps', 60)),
+        }
+        fps_governor = getattr(source, "fps_governor", None)
+        if fps_governor is not None:
+            stats["governor"] = fps_governor.stats()
+        return stats
+
     def stop(self):
+        for governor in self._governors():
+            governor.forget(self.pc_id)
+        if self.rate is not None:
+            self._video_source().set_session_bitrate(self.pc_id, None)
         self.video_track.stop()
         self.audio_track.stop()
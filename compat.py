@@ -4,6 +4,7 @@ import aiortc.codecs.vpx
 import aiortc.contrib.media
 import av.audio.resampler
 import aiortc.codecs.opus
+from aiortc.mediastreams import VIDEO_TIME_BASE, convert_timebase
 import av
 import fractions
 import time
@@ -89,7 +90,7 @@ class CodecProxy:
                 })
             elif "x264" in actual_codec:
                 self._obj.options.update({
-                    "preset": "ultrafast",
+                    "preset": ENCODER_CONFIG.get("preset", "ultrafast"),
                     "tune": "zerolatency",
                     "x264-params": f"nal-hrd=cbr:force-cfr=1:vbv-maxrate={int(target_bps/1000)}:vbv-bufsize={int(target_bps/10000)}:scenecut=0:bframes=0:ref=1:mbtree=0:keyint=30",
                     "threads": "auto",
@@ -110,6 +111,15 @@ class CodecProxy:
                     "static-thresh": "0",
                     "threads": "4"
                 })
+            if ENCODER_CONFIG.get("intra_refresh"):
+                from pyav_engine import intra_refresh_options
+                refresh = intra_refresh_options(actual_codec)
+                if refresh:
+                    self._obj.options.update(refresh)
+                    if "x264" in actual_codec:
+                        # Refresh sweep length = keyint: one full GOP instead of the 30-frame default
+                        self._obj.options["x264-params"] = self._obj.options["x264-params"].replace(
+                            "keyint=30", f"keyint={ENCODER_CONFIG.get('gop', 60)}")
             logger.info(f"[NeonCompat] Proxy: Options injected for {actual_codec} at {target_bps/1000:.0f}kbps")
         except Exception as e:
             logger.warning(f"[NeonCompat] Proxy open fail: {e}")
@@ -188,7 +198,26 @@ def patch_encoder_class(cls):
     def patched_encode(self, frame, force_keyframe=False):
         # --- PASSTHROUGH OPTIMIZATION ---
         if hasattr(frame, "_encoded_payload"):
-            return frame._encoded_payload
+            # Already-encoded access unit: only packetize it, keeping the capture-clock PTS
+            if not hasattr(self, "_split_bitstream"):
+                return [], None # H.264 passthrough negotiated as another codec
+            if force_keyframe:
+                # PLI/FIR from this viewer: ask the capture encoder for an IDR (rate-limited there)
+                request_keyframe = getattr(frame, "_request_keyframe", None)
+                if request_keyframe:
+                    request_keyframe()
+            remb = getattr(self, "_remb_bitrate", None)
+            if remb is not None:
+                # REMB from this viewer: the capture encoder is the one that has to follow it
+                report_remb = getattr(frame, "_report_remb", None)
+                if report_remb:
+                    self._remb_bitrate = None
+                    report_remb(remb)
+            timestamp = convert_timebase(frame.pts, frame.time_base, VIDEO_TIME_BASE)
+            packages = []
+            for data in frame._encoded_payload:
+                packages += self._split_bitstream(data)
+            return self._packetize(packages), timestamp
             
         if hasattr(self, "codec"):
             requested_bitrate = ENCODER_CONFIG["bitrate"]
@@ -225,6 +254,14 @@ def patch_encoder_class(cls):
         return orig_encode(self, frame, force_keyframe)
     cls.encode = patched_encode
 
+    # aiortc clamps REMB into its own encoder range (500k-3M for H.264): keep the raw estimate
+    orig_target = getattr(cls, "target_bitrate", None)
+    if isinstance(orig_target, property) and orig_target.fset is not None:
+        def set_target_bitrate(self, bitrate):
+            self._remb_bitrate = bitrate
+            orig_target.fset(self, bitrate)
+        cls.target_bitrate = property(orig_target.fget, set_target_bitrate)
+
     orig_setattr = cls.__setattr__
     def patched_setattr(self, name, value):
         if name == "codec" and value is not None and not isinstance(value, CodecProxy):
@@ -261,8 +298,8 @@ aiortc.contrib.media.av.AudioResampler = SafeResampler
 def patched_opus_encode(self, frame, force_keyframe=False):
     # --- PASSTHROUGH OPTIMIZATION ---
     if hasattr(frame, "_encoded_payload"):
-        # Expecting _encoded_payload to be a list of bytes and a timestamp
-        return frame._encoded_payload
+        # Opus packets from FFmpeg: frame.pts is already in 1/48000 (capture clock)
+        return frame._encoded_payload, frame.pts
         
     frames = []
     if (frame.sample_rate == 48000 and len(frame.layout.channels) in [2, 6] and frame.format.name == 's16'):
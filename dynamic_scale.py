@@ -0,0 +1,194 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("NeonScale")
+
+# Rungs below the configured resolution (heights, 16:9 widths derived from it)
+LADDER_HEIGHTS = (2160, 1440, 1080, 900, 720, 540)
+
+# Frame rates below the configured one (--adaptive-fps)
+FPS_LADDER = (60, 45, 30)
+
+# Encoder load = fraction of the frame budget spent encoding (>= 1.0: can't keep up)
+LOAD_HIGH = 0.9
+LOAD_LOW = 0.6
+# Network feedback from RTCP receiver reports
+LOSS_HIGH = 0.05
+LOSS_LOW = 0.01
+RTT_HIGH_MS = 250
+
+def resolution_ladder(base_w, base_h, heights=LADDER_HEIGHTS):
+    """[(w, h)] from the configured resolution down to the smallest rung."""
+    rungs = [(base_w, base_h)]
+    for h in heights:
+        if h < base_h:
+            w = int(round(base_w * h / base_h / 2)) * 2
+            rungs.append((w, h))
+    return rungs
+
+def fps_ladder(base_fps, rates=FPS_LADDER):
+    """[fps] from the configured frame rate down to the slowest rung."""
+    return [int(base_fps)] + [r for r in rates if r < base_fps]
+
+class LadderGovernor:
+    """
+    Picks a rung of a quality ladder (rung 0 = configured quality) from encoder load
+    and network feedback.
+
+    One rung down once pressure (encoder near its frame budget, or loss/RTT high on
+    any viewer) has lasted down_after seconds; one rung back up once everything has
+    been calm for up_after seconds. Every switch is followed by at least min_hold
+    seconds on the new rung, so a load spike costs quality for a few seconds
+    without flapping.
+    """
+    tag = "LADDER"
+
+    def __init__(self, ladder, down_after=2.0, up_after=10.0, min_hold=5.0,
+                 network_timeout=6.0, clock=time.monotonic):
+        self.ladder = list(ladder)
+        self.rung = 0
+        self.down_after = down_after
+        self.up_after = up_after
+        self.min_hold = min_hold
+        self.network_timeout = network_timeout
+        self._clock = clock
+        self._load = None
+        self._network = {} # session -> (loss, rtt_ms, time)
+        self._pressure_since = None
+        self._calm_since = None
+        self._last_switch = clock()
+        self.switches = 0
+        self.events = deque(maxlen=50)
+
+    @property
+    def current(self):
+        return self.ladder[self.rung]
+
+    @property
+    def at_bottom(self):
+        return self.rung == len(self.ladder) - 1
+
+    def _format(self, value):
+        return str(value)
+
+    def report_encoder(self, load):
+        self._load = load
+
+    def report_network(self, session, loss, rtt_ms=None):
+        self._network[session] = (loss or 0.0, rtt_ms, self._clock())
+
+    def forget(self, session):
+        self._network.pop(session, None)
+
+    def _network_state(self, now):
+        """Worst recent loss/RTT over all viewers of this pipeline."""
+        loss, rtt = 0.0, None
+        for session, (l, r, t) in list(self._network.items()):
+            if now - t > self.network_timeout:
+                del self._network[session]
+                continue
+            loss = max(loss, l)
+            if r is not None:
+                rtt = r if rtt is None else max(rtt, r)
+        return loss, rtt
+
+    def update(self, now=None, can_down=True, can_up=True):
+        """
+        Returns the new rung value when a switch happens, else None. can_down/can_up
+        let a second governor take its turn first; the timers keep running meanwhile.
+        """
+        now = self._clock() if now is None else now
+        loss, rtt = self._network_state(now)
+        load = self._load
+
+        reasons = []
+        if load is not None and load >= LOAD_HIGH:
+            reasons.append(f"encoder load {load:.2f}")
+        if loss >= LOSS_HIGH:
+            reasons.append(f"loss {loss * 100:.1f}%")
+        if rtt is not None and rtt >= RTT_HIGH_MS:
+            reasons.append(f"rtt {rtt:.0f} ms")
+        calm = (load is None or load <= LOAD_LOW) and loss <= LOSS_LOW and (rtt is None or rtt < RTT_HIGH_MS * 0.6)
+
+        if reasons:
+            self._calm_since = None
+            if self._pressure_since is None:
+                self._pressure_since = now
+        else:
+            self._pressure_since = None
+            if calm:
+                if self._calm_since is None:
+                    self._calm_since = now
+            else:
+                self._calm_since = None
+
+        if now - self._last_switch < self.min_hold:
+            return None
+        if self._pressure_since is not None and now - self._pressure_since >= self.down_after:
+            if can_down and not self.at_bottom:
+                return self._switch(self.rung + 1, now, ", ".join(reasons))
+        elif self._calm_since is not None and now - self._calm_since >= self.up_after:
+            if can_up and self.rung > 0:
+                return self._switch(self.rung - 1, now, "headroom")
+        return None
+
+    def _switch(self, rung, now, reason):
+        old = self._format(self.current)
+        self.rung = rung
+        self.switches += 1
+        self._last_switch = now
+        self._pressure_since = None
+        self._calm_since = None
+        new = self._format(self.current)
+        self.events.append({"time": time.time(), "from": old, "to": new, "reason": reason})
+        logger.info(f"[{self.tag}] {old} -> {new} ({reason})")
+        return self.current
+
+    def stats(self):
+        return {
+            "current": self._format(self.current),
+            "rung": self.rung,
+            "ladder": [self._format(r) for r in self.ladder],
+            "encoder_load": None if self._load is None else round(self._load, 2),
+            "switches": self.switches,
+            "events": list(self.events)[-10:],
+        }
+
+class DynamicScaler(LadderGovernor):
+    """--dynamic-scale: steps the capture resolution down the ladder under pressure."""
+    tag = "SCALE"
+
+    def __init__(self, base_w, base_h, **kw):
+        super().__init__(resolution_ladder(base_w, base_h), **kw)
+
+    @property
+    def resolution(self):
+        return self.current
+
+    def _format(self, value):
+        return "%dx%d" % value
+
+    def stats(self):
+        stats = super().stats()
+        stats["resolution"] = stats["current"]
+        return stats
+
+class FpsGovernor(LadderGovernor):
+    """--adaptive-fps: steps the capture/encode frame rate down the ladder under pressure."""
+    tag = "FPS"
+
+    def __init__(self, base_fps, **kw):
+        super().__init__(fps_ladder(base_fps), **kw)
+
+    @property
+    def fps(self):
+        return self.current
+
+    def _format(self, value):
+        return f"{value} fps"
+
+    def stats(self):
+        stats = super().stats()
+        stats["fps"] = self.current
+        return stats
@@ -0,0 +1,346 @@
+import logging
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import hashlib
+import platform
+import fractions
+import statistics
+import subprocess
+import av
+from av.video.frame import PictureType
+
+logger = logging.getLogger("NeonProbe")
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "neon_stream", "encoder_probe.json")
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+# Synthetic clip encoded by every candidate
+PROBE_SIZE = (1280, 720)
+PROBE_FRAMES = 120
+PROBE_FPS = 60
+# CLI candidates also run this many frames alone; that run's time (process start,
+# device and encoder init) is subtracted so only the encoding is compared
+CLI_BASELINE_FRAMES = 10
+
+# encoder name -> --encoder value understood by EncodedVideoTrack
+ENCODER_ARGS = {
+    "libx264": "cpu",
+    "h264_vaapi": "vaapi",
+    "h264_nvenc": "nvenc",
+    "h264_qsv": "qsv",
+    "h264_amf": "amf",
+}
+
+# Low-latency options per candidate (same intent as the capture command lines)
+PROBE_OPTIONS = {
+    "h264_nvenc": {"preset": "p1", "tune": "ull", "zerolatency": "1", "delay": "0", "rc": "cbr"},
+    "h264_qsv": {"preset": "veryfast", "async_depth": "1", "look_ahead": "0"},
+    "h264_amf": {"usage": "ultralowlatency", "quality": "speed", "rc": "cbr"},
+}
+
+def candidates():
+    """Encoder/preset pairs worth probing on this machine (CPU ones always)."""
+    found = [("libx264", preset) for preset in ("ultrafast", "superfast", "veryfast")]
+    if os.name != "nt" and os.path.exists(VAAPI_DEVICE):
+        found.append(("h264_vaapi", None))
+    for name in ("h264_nvenc", "h264_qsv", "h264_amf"):
+        if name in av.codecs_available:
+            found.append((name, PROBE_OPTIONS[name].get("preset") or PROBE_OPTIONS[name].get("quality")))
+    return found
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except Exception:
+        return ""
+
+def fingerprint():
+    """Host + driver identity: the cache is only reused when none of these changed."""
+    cpu = ""
+    for line in _read("/proc/cpuinfo").splitlines():
+        if line.startswith("model name"):
+            cpu = line.split(":", 1)[1].strip()
+            break
+    dri_driver = ""
+    try:
+        dri_driver = os.path.basename(os.readlink("/sys/class/drm/renderD128/device/driver"))
+    except OSError:
+        pass
+    parts = {
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "cpu": cpu or platform.processor(),
+        "av": av.__version__,
+        "libavcodec": ".".join(map(str, av.library_versions.get("libavcodec", ()))),
+        "dri": dri_driver,
+        "libva": os.environ.get("LIBVA_DRIVER_NAME", ""),
+        "nvidia": _read("/proc/driver/nvidia/version").splitlines()[0] if os.path.exists("/proc/driver/nvidia/version") else "",
+        "ffmpeg": shutil.which("ffmpeg") or "",
+        "size": "%dx%d" % PROBE_SIZE,
+    }
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+    return digest, parts
+
+def _synthetic_frames(width, height, count):
+    frames = []
+    container = av.open(f"testsrc2=size={width}x{height}:rate={PROBE_FPS}", format="lavfi")
+    try:
+        for frame in container.decode(video=0):
+            frames.append(frame.reformat(format="yuv420p"))
+            if len(frames) >= count:
+                break
+    finally:
+        container.close()
+    return frames
+
+def _result(name, preset, method):
+    return {
+        "encoder": name, "preset": preset, "arg": ENCODER_ARGS.get(name, "cpu"),
+        "method": method, "ok": False, "fps": 0.0,
+        "latency_ms": None, "latency_p95_ms": None, "error": None,
+    }
+
+def probe_pyav(name, preset, frames):
+    """Encodes the clip in-process; per-frame latency = encode() call to packet out."""
+    result = _result(name, preset, "pyav")
+    width, height = frames[0].width, frames[0].height
+    try:
+        enc = av.CodecContext.create(name, "w")
+        enc.width, enc.height = width, height
+        enc.pix_fmt = "yuv420p"
+        enc.time_base = fractions.Fraction(1, PROBE_FPS)
+        enc.framerate = PROBE_FPS
+        enc.bit_rate = 8000000
+        enc.gop_size = PROBE_FPS
+        options = dict(PROBE_OPTIONS.get(name, {}))
+        if name == "libx264":
+            options.update({"preset": preset, "tune": "zerolatency"})
+        enc.options = options
+        enc.open()
+
+        latencies = []
+        packets = 0
+        start = time.perf_counter()
+        for i, frame in enumerate(frames):
+            frame.pts = i
+            frame.pict_type = PictureType.NONE
+            t0 = time.perf_counter()
+            out = enc.encode(frame)
+            if out:
+                latencies.append((time.perf_counter() - t0) * 1000)
+                packets += len(out)
+        packets += len(enc.encode(None))
+        elapsed = time.perf_counter() - start
+
+        if packets < len(frames) * 0.9:
+            raise RuntimeError(f"only {packets}/{len(frames)} packets")
+        latencies.sort()
+        result.update({
+            "ok": True,
+            "fps": round(len(frames) / elapsed, 1),
+            "latency_ms": round(sum(latencies) / len(latencies), 2),
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        })
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def _source_seconds(width, height, count):
+    """Time libavfilter takes to generate `count` frames of the clip as nv12, what the CLI does before hwupload."""
+    container = av.open(f"testsrc2=size={width}x{height}:rate={PROBE_FPS}", format="lavfi")
+    try:
+        start = time.perf_counter()
+        for i, frame in enumerate(container.decode(video=0)):
+            frame.reformat(format="nv12")
+            if i + 1 >= count:
+                break
+        return time.perf_counter() - start
+    finally:
+        container.close()
+
+def _run_cli(cmd):
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, timeout=30)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode(errors="replace").strip().splitlines()[-1:] or "ffmpeg failed")
+    return elapsed
+
+def encode_rate(frames, elapsed, baseline_frames, baseline_elapsed, source_elapsed=0.0):
+    """
+    Encoder-only frames/s of a CLI run, comparable to the PyAV candidates (which time
+    encode() alone): the short baseline run cancels process start, device and encoder
+    init; source_elapsed is the clip generation of the frames in between.
+    """
+    work = elapsed - baseline_elapsed - source_elapsed
+    if frames <= baseline_frames or work <= 0:
+        raise RuntimeError("could not separate encoding from start-up time")
+    return (frames - baseline_frames) / work
+
+def probe_vaapi_cli(width, height, count):
+    """VAAPI needs hwupload, which PyAV cannot do: time the FFmpeg CLI instead (throughput only)."""
+    result = _result("h264_vaapi", None, "cli")
+    if not shutil.which("ffmpeg"):
+        result["error"] = "ffmpeg not found"
+        return result
+    def cmd(frames):
+        return [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-vaapi_device", VAAPI_DEVICE,
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={PROBE_FPS}",
+            "-frames:v", str(frames), "-vf", "format=nv12,hwupload",
+            "-c:v", "h264_vaapi", "-rc_mode", "CBR", "-b:v", "8M", "-f", "null", "-"
+        ]
+    baseline = max(1, min(CLI_BASELINE_FRAMES, count // 4))
+    try:
+        baseline_elapsed = _run_cli(cmd(baseline))
+        elapsed = _run_cli(cmd(count))
+        fps = encode_rate(count, elapsed, baseline, baseline_elapsed, _source_seconds(width, height, count - baseline))
+        result.update({
+            "ok": True,
+            "fps": round(fps, 1),
+            "latency_ms": round(1000.0 / fps, 2), # Per-frame upload + encode time from throughput, no p95
+        })
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def run_probe(size=PROBE_SIZE, frame_count=PROBE_FRAMES, encoders=None):
+    """Benchmarks every candidate; failures are recorded, never raised."""
+    width, height = size
+    frames = _synthetic_frames(width, height, frame_count)
+    results = []
+    for name, preset in (encoders or candidates()):
+        logger.info(f"[PROBE] {name} {preset or ''}...")
+        if name == "h264_vaapi":
+            results.append(probe_vaapi_cli(width, height, frame_count))
+        else:
+            results.append(probe_pyav(name, preset, frames))
+    return results
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_cache(cache, path=CACHE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.warning(f"[PROBE] Could not write cache {path}: {e}")
+
+def probe(force=False, path=CACHE_PATH, **kwargs):
+    """Cached results for this host/driver fingerprint, probing on first start (or when forced)."""
+    key, parts = fingerprint()
+    cache = load_cache(path)
+    entry = cache.get(key)
+    if entry and not force:
+        return entry["results"]
+    logger.info("[PROBE] Benchmarking encoders (first start on this host/driver)...")
+    results = run_probe(**kwargs)
+    cache[key] = {"created": time.time(), "host": parts, "results": results}
+    save_cache(cache, path)
+    return results
+
+def best_encoder(results):
+    """Fastest working candidate (or None)."""
+    working = [r for r in results if r["ok"]]
+    if not working:
+        return None
+    return max(working, key=lambda r: r["fps"])
+
+def pick_encoder(**kwargs):
+    """
+    (--encoder value, x264 preset) for `auto`: the fastest encoder that works here,
+    CPU as last resort. The preset is the one that won (None unless libx264 did).
+    """
+    try:
+        best = best_encoder(probe(**kwargs))
+    except Exception as e:
+        logger.warning(f"[PROBE] Probe failed ({e}), using CPU")
+        return "cpu", None
+    if best is None:
+        return "cpu", None
+    logger.info(f"[PROBE] Auto encoder: {best['encoder']} {best['preset'] or ''} ({best['fps']} fps)")
+    return best["arg"], best["preset"] if best["encoder"] == "libx264" else None
+
+def format_table(results):
+    best = best_encoder(results)
+    lines = [f"{'Encoder':<12} {'Preset':<10} {'Status':<6} {'FPS':>8} {'Lat ms':>8} {'p95 ms':>8}  Notes"]
+    for r in results:
+        status = "OK" if r["ok"] else "FAIL"
+        fps = f"{r['fps']:.1f}" if r["ok"] else "-"
+        lat = f"{r['latency_ms']:.2f}" if r["latency_ms"] is not None else "-"
+        p95 = f"{r['latency_p95_ms']:.2f}" if r["latency_p95_ms"] is not None else "-"
+        note = "<- auto" if r is best else (r["error"] or "")
+        lines.append(f"{r['encoder']:<12} {(r['preset'] or '-'):<10} {status:<6} {fps:>8} {lat:>8} {p95:>8}  {note}")
+    return "\n".join(lines)
+
+def frame_size_stats(sizes):
+    """Per-frame encoded size spread: what a CBR link sees as bursts."""
+    mean = statistics.fmean(sizes)
+    stdev = statistics.pstdev(sizes)
+    return {
+        "frames": len(sizes),
+        "mean_kb": round(mean / 1024, 2),
+        "stdev_kb": round(stdev / 1024, 2),
+        "cv": round(stdev / mean, 3) if mean else 0.0,
+        "peak_to_mean": round(max(sizes) / mean, 2) if mean else 0.0,
+    }
+
+def measure_frame_sizes(codec_name="libx264", intra_refresh=False, size=PROBE_SIZE, frame_count=PROBE_FRAMES * 2,
+                        gop=PROBE_FPS, bitrate=8000000, frames=None):
+    """
+    Encodes the synthetic clip with the capture engine's options and returns
+    frame_size_stats() of the steady state (the session-start IDR is left out:
+    both modes have it).
+    """
+    from pyav_engine import encoder_options
+    frames = frames or _synthetic_frames(size[0], size[1], frame_count)
+    enc = av.CodecContext.create(codec_name, "w")
+    enc.width, enc.height = frames[0].width, frames[0].height
+    enc.pix_fmt = "yuv420p"
+    enc.time_base = fractions.Fraction(1, PROBE_FPS)
+    enc.framerate = PROBE_FPS
+    enc.bit_rate = bitrate
+    enc.gop_size = gop
+    enc.options = encoder_options(codec_name, bitrate, gop, intra_refresh)
+    enc.open()
+    sizes = []
+    for i, frame in enumerate(frames):
+        frame.pts = i
+        frame.pict_type = PictureType.NONE
+        sizes += [packet.size for packet in enc.encode(frame)]
+    sizes += [packet.size for packet in enc.encode(None)]
+    return frame_size_stats(sizes[1:])
+
+def compare_intra_refresh(codec_name="libx264", **kwargs):
+    """Same clip, periodic IDRs vs intra refresh."""
+    frames = _synthetic_frames(*kwargs.pop("size", PROBE_SIZE), kwargs.pop("frame_count", PROBE_FRAMES * 2))
+    return {
+        "periodic_idr": measure_frame_sizes(codec_name, False, frames=frames, **kwargs),
+        "intra_refresh": measure_frame_sizes(codec_name, True, frames=frames, **kwargs),
+    }
+
+def format_frame_sizes(comparison):
+    lines = [f"{'Mode':<14} {'Frames':>6} {'Mean KB':>8} {'Stdev KB':>9} {'CV':>6} {'Peak/mean':>10}"]
+    for mode, r in comparison.items():
+        lines.append(f"{mode:<14} {r['frames']:>6} {r['mean_kb']:>8.2f} {r['stdev_kb']:>9.2f} {r['cv']:>6.3f} {r['peak_to_mean']:>10.2f}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if "--intra-refresh" in sys.argv:
+        print(format_frame_sizes(compare_intra_refresh()))
+    else:
+        print(format_table(probe(force="--force" in sys.argv)))
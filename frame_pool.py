@@ -0,0 +1,84 @@
+import logging
+import threading
+import weakref
+import numpy as np
+import av
+
+logger = logging.getLogger("NeonFramePool")
+
+class FrameSlot:
+    """One preallocated yuv420p frame buffer (planes stored back to back, as FFmpeg writes them)."""
+    def __init__(self, index, width, height):
+        self.index = index
+        self.array = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        self.buffer = memoryview(self.array).cast("B") # readinto() target
+        self.refs = 0
+
+class FrameBufferPool:
+    """
+    N-slot pool of raw frame buffers with explicit acquire/release reference counts.
+
+    The reader acquires a free slot and reads the pipe straight into it (the only
+    copy); wrap() then builds an av.VideoFrame over that same memory. The slot goes
+    back to the pool only when the last reference to that VideoFrame is gone (the
+    encoder is done with it), so a frame can never be overwritten while aiortc is
+    still encoding it. When every slot is busy, acquire() returns None and the caller
+    drops that capture frame instead of tearing one in flight.
+    """
+    def __init__(self, width, height, slots=4):
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3 // 2
+        self._slots = [FrameSlot(i, width, height) for i in range(max(2, int(slots)))]
+        self._free = list(reversed(self._slots))
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.exhausted = 0
+        self.peak_in_use = 0
+
+    def acquire(self):
+        with self._lock:
+            if not self._free:
+                self.exhausted += 1
+                return None
+            slot = self._free.pop()
+            slot.refs = 1
+            self.acquired += 1
+            in_use = len(self._slots) - len(self._free)
+            if in_use > self.peak_in_use:
+                self.peak_in_use = in_use
+            return slot
+
+    def retain(self, slot):
+        with self._lock:
+            slot.refs += 1
+
+    def release(self, slot):
+        with self._lock:
+            if slot.refs <= 0:
+                logger.warning(f"[POOL] Slot {slot.index} released twice")
+                return
+            slot.refs -= 1
+            if slot.refs == 0:
+                self._free.append(slot)
+
+    def wrap(self, slot):
+        """
+        Zero-copy av.VideoFrame over a slot, taking over the caller's reference.
+        av frames take no weak references, but the numpy view they keep alive does:
+        its finalizer releases the slot when the frame is destroyed.
+        """
+        view = slot.array.view()
+        weakref.finalize(view, self.release, slot)
+        return av.VideoFrame.from_numpy_buffer(view, format="yuv420p")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": len(self._slots),
+                "free": len(self._free),
+                "in_use": len(self._slots) - len(self._free),
+                "peak_in_use": self.peak_in_use,
+                "acquired": self.acquired,
+                "exhausted": self.exhausted,
+            }
@@ -0,0 +1,117 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger("InputManager")
+
+# Virtual pads created at startup (--gamepad-pool); more are created on demand when they run out
+GAMEPAD_POOL_SIZE = 2
+
+class GamepadPool:
+    """
+    Virtual gamepads created ahead of time and handed to sessions as slots.
+
+    A session's local pad index (the client's gamepadIndex) maps to a pool slot on
+    first use or on connect (allocate), so the first press never waits for device
+    creation and two sessions' player 0 never share a device. Freed slots go back
+    to the pool (lowest first) for the next session. `create(slot)` returns a device
+    or None (InputManager.create_gamepad).
+    """
+    def __init__(self, create, size=GAMEPAD_POOL_SIZE, clock=time.perf_counter):
+        self._create = create
+        self.size = max(0, int(size))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.devices = {} # slot -> device
+        self._free = [] # Heap of free slots
+        self._slots = {} # (session, local index) -> slot
+        self._owners = {} # slot -> (session, local index)
+        self.allocations = 0
+        self.releases = 0
+        self.misses = 0 # Allocations that had to create a device on demand
+        self.failures = 0 # Device creations that failed
+        self.create_ms = [] # Creation time of every device
+
+    def start(self):
+        """Creates the pre-allocated devices (blocking: run before serving)."""
+        with self._lock:
+            for slot in range(self.size):
+                self._add(slot)
+        logger.info(f"Gamepad pool ready: {len(self.devices)}/{self.size} virtual pads")
+
+    def slot(self, session_id, index):
+        """Pool slot of a session's pad, allocated on first use. None if no device could be had."""
+        slot = self._slots.get((session_id, index))
+        if slot is None:
+            with self._lock:
+                slot = self._slots.get((session_id, index))
+                if slot is None:
+                    slot = self._take((session_id, index))
+        return slot
+
+    def allocate(self, session_id, pads=1):
+        """Reserves slots for a session's first `pads` local indices (on connect)."""
+        return [self.slot(session_id, index) for index in range(pads)]
+
+    def session_slots(self, session_id):
+        with self._lock:
+            return {index: slot for (session, index), slot in self._slots.items() if session == session_id}
+
+    def release(self, session_id):
+        """Returns a session's slots to the pool. The caller neutralizes the devices first."""
+        freed = []
+        with self._lock:
+            for key in [key for key in self._slots if key[0] == session_id]:
+                slot = self._slots.pop(key)
+                del self._owners[slot]
+                heapq.heappush(self._free, slot)
+                freed.append(slot)
+            self.releases += len(freed)
+        if freed:
+            logger.info(f"Gamepad pool: session {session_id} released slots {sorted(freed)}")
+        return freed
+
+    def stats(self):
+        with self._lock:
+            create_ms = sorted(self.create_ms)
+            return {
+                "size": self.size,
+                "devices": len(self.devices),
+                "in_use": len(self._owners),
+                "free": len(self._free),
+                "allocations": self.allocations,
+                "releases": self.releases,
+                "misses": self.misses,
+                "failures": self.failures,
+                "create_ms_max": create_ms[-1] if create_ms else None,
+                "slots": {slot: {"session": owner[0], "index": owner[1]} for slot, owner in sorted(self._owners.items())},
+            }
+
+    def _add(self, slot):
+        started = self._clock()
+        try:
+            device = self._create(slot)
+        except Exception as e:
+            logger.error(f"Failed to create Virtual Gamepad P{slot + 1}: {e}")
+            device = None
+        if device is None:
+            self.failures += 1
+            return False
+        self.create_ms.append(round((self._clock() - started) * 1000.0, 3))
+        self.devices[slot] = device
+        heapq.heappush(self._free, slot)
+        return True
+
+    def _take(self, key):
+        if not self._free:
+            # Pool exhausted: create one more now (the slow path the pool exists to avoid)
+            self.misses += 1
+            if not self._add(max(self.devices, default=-1) + 1):
+                return None
+        slot = heapq.heappop(self._free)
+        self._slots[key] = slot
+        self._owners[slot] = key
+        self.allocations += 1
+        logger.info(f"Gamepad pool: session {key[0]} pad {key[1]} -> slot {slot} (P{slot + 1})")
+        return slot
@@ -0,0 +1,78 @@
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger("NeonIdle")
+
+# Frames per second still sent while the scene is static (keeps the decoder and RTCP alive)
+IDLE_KEEPALIVE_FPS = 2.0
+# mpdecimate-like thresholds, per 8x8 block of the (subsampled) luma plane:
+# a block "changed" above LO, the frame is new if any block is above HI or more than FRAC changed
+BLOCK = 8
+HI = 64 * 12
+LO = 64 * 5
+FRAC = 0.33
+
+def mpdecimate_filter(fps, keepalive_fps=IDLE_KEEPALIVE_FPS):
+    """FFmpeg filter for the CLI path: same thresholds, at most fps/keepalive_fps frames dropped in a row."""
+    max_drop = max(1, int(fps // max(keepalive_fps, 0.1)) - 1)
+    return f"mpdecimate=hi={HI}:lo={LO}:frac={FRAC}:max={max_drop}"
+
+class StaticSceneDetector:
+    """
+    Vectorized frame-diff idle detector for capture paths that see raw frames.
+
+    check(luma) compares the luma plane with the last frame that was kept and tells
+    the caller to skip it when nothing moved, except for one keep-alive frame every
+    1/keepalive_fps seconds. The diff runs on a 2x subsampled plane (the reference is
+    a small private copy, so pooled capture buffers can be recycled right away).
+    """
+    def __init__(self, keepalive_fps=IDLE_KEEPALIVE_FPS, subsample=2, clock=time.monotonic):
+        self.keepalive_interval = 1.0 / max(keepalive_fps, 0.1)
+        self.subsample = subsample
+        self._clock = clock
+        self._reference = None
+        self._last_kept = 0.0
+        self.idle = False
+        self.frames = 0
+        self.skipped = 0
+
+    def _changed(self, small):
+        ref = self._reference
+        if ref is None or ref.shape != small.shape:
+            return True
+        h = small.shape[0] // BLOCK * BLOCK
+        w = small.shape[1] // BLOCK * BLOCK
+        diff = np.abs(small[:h, :w].astype(np.int16) - ref[:h, :w])
+        blocks = diff.reshape(h // BLOCK, BLOCK, w // BLOCK, BLOCK).sum(axis=(1, 3), dtype=np.int32)
+        if blocks.max(initial=0) > HI:
+            return True
+        return np.count_nonzero(blocks > LO) > FRAC * blocks.size
+
+    def check(self, luma, now=None):
+        """True when this frame can be skipped (static scene, keep-alive not due)."""
+        now = self._clock() if now is None else now
+        self.frames += 1
+        small = luma[::self.subsample, ::self.subsample]
+        if self._changed(small):
+            if self.idle:
+                logger.info("[IDLE] Motion resumed")
+            self.idle = False
+        else:
+            if not self.idle:
+                logger.info("[IDLE] Static scene, dropping to keep-alive rate")
+            self.idle = True
+            if now - self._last_kept < self.keepalive_interval:
+                self.skipped += 1
+                return True
+        self._reference = small.astype(np.int16)
+        self._last_kept = now
+        return False
+
+    def stats(self):
+        return {
+            "idle": self.idle,
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skipped_fraction": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Input path benchmark without /dev/uinput: events/sec through InputManager.
+
+FakeUInput behaves like python-evdev's UInput at the syscall level: write() and
+syn() each cost one write(2) of a struct input_event (to /dev/null), and its fd
+accepts several events per write like the real uinput node. "syscalls" counts
+every os.write made during the run, whichever path issued it. "baseline" replays
+the dispatch InputManager had before the precompiled tables (maps rebuilt and one
+write + syn per event), so the before/after numbers come from the same tree.
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import time
+
+INPUT_EVENT = struct.Struct("llHHi")
+
+class FakeUInput:
+    def __init__(self):
+        self.fd = os.open(os.devnull, os.O_WRONLY)
+        self.writes = 0
+        self.syns = 0
+
+    def write(self, etype, code, value):
+        self.writes += 1
+        os.write(self.fd, INPUT_EVENT.pack(0, 0, etype, code, value))
+
+    def syn(self):
+        self.syns += 1
+        os.write(self.fd, INPUT_EVENT.pack(0, 0, 0, 0, 0))
+
+    def close(self):
+        os.close(self.fd)
+
+def baseline_apply(manager, type_, code, value, gp_index):
+    """InputManager._apply before the precompiled dispatch (evdev branch), kept for comparison."""
+    from evdev import ecodes
+    device = manager._get_gamepad(gp_index)
+    if not device:
+        return
+
+    if type_ == 'BUTTON':
+        btn_map = {
+            'A': ecodes.BTN_A, 'B': ecodes.BTN_B, 'X': ecodes.BTN_X, 'Y': ecodes.BTN_Y,
+            'SELECT': ecodes.BTN_SELECT, 'START': ecodes.BTN_START,
+            'HOME': ecodes.BTN_MODE, 'LB': ecodes.BTN_TL, 'RB': ecodes.BTN_TR,
+            'L3': ecodes.BTN_THUMBL, 'R3': ecodes.BTN_THUMBR,
+            'DPAD_UP': (ecodes.EV_ABS, ecodes.ABS_HAT0Y, -1),
+            'DPAD_DOWN': (ecodes.EV_ABS, ecodes.ABS_HAT0Y, 1),
+            'DPAD_LEFT': (ecodes.EV_ABS, ecodes.ABS_HAT0X, -1),
+            'DPAD_RIGHT': (ecodes.EV_ABS, ecodes.ABS_HAT0X, 1),
+            'LT': (ecodes.EV_ABS, ecodes.ABS_Z, 255),
+            'RT': (ecodes.EV_ABS, ecodes.ABS_RZ, 255)
+        }
+        if code in btn_map:
+            mapped = btn_map[code]
+            if isinstance(mapped, tuple):
+                val = mapped[2] if value else 0
+                device.write(mapped[0], mapped[1], val)
+            else:
+                device.write(ecodes.EV_KEY, mapped, 1 if value else 0)
+            device.syn()
+
+    elif type_ == 'AXIS':
+        axis_map = {
+            'LEFT_X': ecodes.ABS_X, 'LEFT_Y': ecodes.ABS_Y,
+            'RIGHT_X': ecodes.ABS_RX, 'RIGHT_Y': ecodes.ABS_RY
+        }
+        if code in axis_map:
+            device.write(ecodes.EV_ABS, axis_map[code], value)
+            device.syn()
+
+def poll_ticks(ticks, pads=4, seed=1):
+    """Gamepad poll ticks like client.js sends them: a few buttons and both sticks per pad."""
+    rng = random.Random(seed)
+    buttons = ["A", "B", "X", "Y", "LB", "RB", "LT", "RT", "DPAD_UP", "DPAD_LEFT"]
+    axes = ["LEFT_X", "LEFT_Y", "RIGHT_X", "RIGHT_Y"]
+    out = []
+    for _ in range(ticks):
+        tick = []
+        for pad in range(pads):
+            tick.append(("BUTTON", rng.choice(buttons), rng.randint(0, 1), pad))
+            for axis in axes:
+                tick.append(("AXIS", axis, rng.randint(-32768, 32767), pad))
+        out.append(tick)
+    return out
+
+def run(mode, ticks=2000, pads=4):
+    """
+    events/sec for 'baseline' (JSON through the old per-event dispatch), 'json' (one
+    message per event, precompiled dispatch) or 'batch' (binary, one message per tick).
+    """
+    from input_manager import InputManager
+    manager = InputManager()
+    devices = [FakeUInput() for _ in range(pads)]
+    for index, device in enumerate(devices):
+        manager.gamepads[index] = device
+    data = poll_ticks(ticks, pads)
+    if mode == "batch":
+        from input_protocol import encode_batch
+        messages = [encode_batch(tick) for tick in data]
+        handle = manager.handle_batch
+    else:
+        messages = [json.dumps({"type": t, "code": c, "value": v, "gamepadIndex": g})
+                    for tick in data for t, c, v, g in tick]
+        if mode == "baseline":
+            def handle(message):
+                event = json.loads(message)
+                baseline_apply(manager, event.get('type'), event.get('code'), event.get('value'),
+                               event.get('gamepadIndex', 0))
+        else:
+            def handle(message):
+                manager.handle_input(json.loads(message))
+    # Counts every write(2) of the run (FakeUInput's and InputManager's own), restored afterwards
+    real_write, calls = os.write, [0]
+    def counting_write(fd, payload):
+        calls[0] += 1
+        return real_write(fd, payload)
+    os.write = counting_write
+    try:
+        t0 = time.perf_counter()
+        for message in messages:
+            handle(message)
+        elapsed = time.perf_counter() - t0
+    finally:
+        os.write = real_write
+    events = sum(len(tick) for tick in data)
+    for device in devices:
+        device.close()
+    return {"mode": mode, "events": events, "seconds": round(elapsed, 4),
+            "events_per_sec": int(events / elapsed), "us_per_tick": round(elapsed / ticks * 1e6, 1),
+            "syscalls": calls[0]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="InputManager throughput with a fake uinput device")
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--pads", type=int, default=4)
+    opts = parser.parse_args()
+    for mode in ("baseline", "json", "batch"):
+        result = run(mode, opts.ticks, opts.pads)
+        print(f"{mode:>8}: {result['events_per_sec']:>9,} events/s | {result['us_per_tick']:>7} us per poll tick"
+              f" | {result['syscalls']:>6} write(2) calls")
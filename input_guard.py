@@ -0,0 +1,60 @@
+import logging
+import time
+
+logger = logging.getLogger("NeonInput")
+
+# --flood-protect: data channel messages per second per session, and the burst on top.
+# A snapshot client sends ~60-80/s; the JSON fallback one message per event.
+INPUT_RATE_LIMIT = 1000.0
+INPUT_BURST = 250
+DROP_WARN_INTERVAL = 10.0
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` stored."""
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self._clock = clock
+        self._last = clock()
+
+    def take(self, n=1):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+class InputGuard:
+    """
+    Per-session flood protection on the event loop, before json.loads / the input queue.
+    Messages over the bucket are dropped and counted ("input_dropped" session counter).
+    """
+    def __init__(self, session_id="", session=None, rate=INPUT_RATE_LIMIT, burst=INPUT_BURST, clock=time.monotonic):
+        self.session_id = session_id
+        self.session = session
+        self.bucket = TokenBucket(rate, burst, clock)
+        self._clock = clock
+        self.allowed = 0
+        self.dropped = 0
+        self._last_warn = None
+
+    def allow(self):
+        if self.bucket.take():
+            self.allowed += 1
+            return True
+        self.dropped += 1
+        if self.session is not None:
+            self.session.count("input_dropped")
+        now = self._clock()
+        if self._last_warn is None or now - self._last_warn > DROP_WARN_INTERVAL:
+            self._last_warn = now
+            logger.warning(f"[INPUT] [{self.session_id}] Flood protection: {self.dropped} messages dropped "
+                           f"(limit {self.bucket.rate:.0f}/s, burst {self.bucket.burst:.0f})")
+        return False
+
+    def stats(self):
+        return {"allowed": self.allowed, "dropped": self.dropped,
+                "rate_limit": self.bucket.rate, "burst": self.bucket.burst}
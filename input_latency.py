@@ -0,0 +1,136 @@
+import logging
+import time
+from collections import deque
+from input_protocol import SEQ_MOD
+
+logger = logging.getLogger("NeonInput")
+
+# Clock sync over the input data channel: a burst of PINGs at connect, then one every interval
+CLOCK_PING_BURST = 5
+CLOCK_PING_BURST_GAP = 0.1
+CLOCK_PING_INTERVAL = 2.0
+# PONGs kept; the offset comes from the lowest-RTT one (least queueing asymmetry)
+CLOCK_WINDOW = 16
+# Transit below -TRANSIT_TOLERANCE_MS is an offset error, not a sample; small negatives clamp to 0
+TRANSIT_TOLERANCE_MS = 5.0
+MAX_TRANSIT_MS = 10000.0
+
+class ClockOffset:
+    """NTP-style estimate of client clock - server clock (ms) from PING/PONG timestamps."""
+    def __init__(self, window=CLOCK_WINDOW):
+        self._samples = deque(maxlen=window) # (rtt ms, offset ms)
+
+    def add(self, t0, t1, t3, t2=None):
+        """t0 server send, t1/t2 client receive/reply, t3 server receive. Returns the sample's offset."""
+        t2 = t1 if t2 is None else t2
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0:
+            return None
+        offset = ((t1 - t0) + (t2 - t3)) / 2.0
+        self._samples.append((rtt, offset))
+        return offset
+
+    @property
+    def offset_ms(self):
+        return min(self._samples)[1] if self._samples else None
+
+    @property
+    def rtt_ms(self):
+        return min(self._samples)[0] if self._samples else None
+
+class InputLatency:
+    """
+    Input timing of one session: clock offset to the client, sequence tracking and
+    network transit (client poll -> server receipt) of every stamped input message.
+
+    Transit goes to the session's "input_transit_ms" distribution; the input thread
+    adds "input_queue_ms" and "input_write_ms" for the server side of the path.
+    """
+    def __init__(self, session=None, clock=time.time):
+        self.session = session
+        self.clock = ClockOffset()
+        self._clock = clock
+        self._ping_id = 0
+        self.last_seq = None
+        self.received = 0
+        self.unstamped = 0 # Old clients: no sequence/time
+        self.gaps = 0
+        self.late = 0
+        self.duplicates = 0
+        self.stale = False # Last message was a duplicate or arrived after a newer one
+        self.stale_snapshots = 0 # Snapshots dropped for that (the caller counts them)
+        self.guard = None # InputGuard with --flood-protect
+
+    def now_ms(self):
+        return self._clock() * 1000.0
+
+    def ping(self):
+        """PING message for the client; it echoes t0 and adds its own clock as t1."""
+        self._ping_id += 1
+        return {"type": "PING", "id": self._ping_id, "t0": round(self.now_ms(), 3)}
+
+    def pong(self, data, now_ms=None):
+        """Client PONG {id, t0, t1[, t2]}. Returns the sample's offset (None if unusable)."""
+        t3 = self.now_ms() if now_ms is None else now_ms
+        try:
+            t0, t1 = float(data["t0"]), float(data["t1"])
+            t2 = float(data.get("t2", t1))
+        except (KeyError, TypeError, ValueError):
+            return None
+        offset = self.clock.add(t0, t1, t3, t2)
+        if offset is not None and self.session is not None:
+            self.session.record("input_clock_offset_ms", round(self.clock.offset_ms, 2))
+            self.session.record("input_clock_rtt_ms", round(self.clock.rtt_ms, 2))
+        return offset
+
+    def received_input(self, seq, sent_ms, now_ms=None):
+        """A stamped input message arrived. Returns its transit (ms), or None without a clock estimate."""
+        now_ms = self.now_ms() if now_ms is None else now_ms
+        self.received += 1
+        self.stale = False
+        if seq is None or sent_ms is None:
+            self.unstamped += 1
+            return None
+        seq = int(seq) % SEQ_MOD
+        if self.last_seq is not None:
+            step = (seq - self.last_seq) % SEQ_MOD
+            if step == 0:
+                self.duplicates += 1
+                self.stale = True
+            elif step < SEQ_MOD // 2:
+                self.gaps += step - 1
+                self.last_seq = seq
+            else:
+                self.late += 1 # Arrived after a newer one (ordered: false)
+                self.stale = True
+        else:
+            self.last_seq = seq
+        offset = self.clock.offset_ms
+        if offset is None:
+            return None
+        transit = now_ms - (float(sent_ms) - offset)
+        if transit < -TRANSIT_TOLERANCE_MS or transit > MAX_TRANSIT_MS:
+            return None
+        transit = round(max(0.0, transit), 3)
+        if self.session is not None:
+            self.session.record_distribution("input_transit_ms", transit)
+        return transit
+
+    @property
+    def lost(self):
+        """Sequence gaps that were not filled by a late arrival."""
+        return max(0, self.gaps - self.late)
+
+    def stats(self):
+        stats = {
+            "clock": {"offset_ms": self.clock.offset_ms, "rtt_ms": self.clock.rtt_ms},
+            "messages": {"received": self.received, "unstamped": self.unstamped, "lost": self.lost,
+                         "late": self.late, "duplicates": self.duplicates,
+                         "stale_snapshots": self.stale_snapshots},
+        }
+        if self.guard is not None:
+            stats["flood"] = self.guard.stats()
+        if self.session is not None:
+            stats["distributions"] = {name: self.session.distribution(name) for name in
+                                      ("input_transit_ms", "input_queue_ms", "input_write_ms", "input_latency_ms")}
+        return stats
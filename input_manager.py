@@ -1,5 +1,7 @@
 import logging
 import os
+import struct
+from input_protocol import decode_batch, decode_snapshot, TYPES, CODES, TYPE_BUTTON, TYPE_AXIS
 
 IS_WINDOWS = os.name == "nt"
 
@@ -13,10 +15,68 @@ else:
 
 logger = logging.getLogger("InputManager")
 
+# struct input_event: the timeval is ignored by uinput (the kernel stamps events itself)
+INPUT_EVENT = struct.Struct("llHHi")
+SYN_REPORT = INPUT_EVENT.pack(0, 0, 0, 0, 0) # EV_SYN / SYN_REPORT
+
+def evdev_dispatch():
+    """(type, code) -> (event type, event code, value when pressed; None = pass the value through)."""
+    table = {}
+    for code, btn in (('A', ecodes.BTN_A), ('B', ecodes.BTN_B), ('X', ecodes.BTN_X), ('Y', ecodes.BTN_Y),
+                      ('SELECT', ecodes.BTN_SELECT), ('START', ecodes.BTN_START), ('HOME', ecodes.BTN_MODE),
+                      ('LB', ecodes.BTN_TL), ('RB', ecodes.BTN_TR),
+                      ('L3', ecodes.BTN_THUMBL), ('R3', ecodes.BTN_THUMBR)):
+        table[('BUTTON', code)] = (ecodes.EV_KEY, btn, 1)
+    for code, axis, pressed in (('DPAD_UP', ecodes.ABS_HAT0Y, -1), ('DPAD_DOWN', ecodes.ABS_HAT0Y, 1),
+                                ('DPAD_LEFT', ecodes.ABS_HAT0X, -1), ('DPAD_RIGHT', ecodes.ABS_HAT0X, 1),
+                                ('LT', ecodes.ABS_Z, 255), ('RT', ecodes.ABS_RZ, 255)):
+        table[('BUTTON', code)] = (ecodes.EV_ABS, axis, pressed)
+    for code, axis in (('LEFT_X', ecodes.ABS_X), ('LEFT_Y', ecodes.ABS_Y),
+                       ('RIGHT_X', ecodes.ABS_RX), ('RIGHT_Y', ecodes.ABS_RY)):
+        table[('AXIS', code)] = (ecodes.EV_ABS, axis, None)
+    return table
+
+def vgamepad_dispatch():
+    """(type, code) -> ('button', XUSB button) / ('trigger', side) / ('stick', side, 0 = x, 1 = y)."""
+    button = vg.XUSB_BUTTON
+    table = {}
+    for code, btn in (('A', button.XUSB_GAMEPAD_A), ('B', button.XUSB_GAMEPAD_B),
+                      ('X', button.XUSB_GAMEPAD_X), ('Y', button.XUSB_GAMEPAD_Y),
+                      ('SELECT', button.XUSB_GAMEPAD_BACK), ('START', button.XUSB_GAMEPAD_START),
+                      ('HOME', button.XUSB_GAMEPAD_GUIDE),
+                      ('LB', button.XUSB_GAMEPAD_LEFT_SHOULDER), ('RB', button.XUSB_GAMEPAD_RIGHT_SHOULDER),
+                      ('L3', button.XUSB_GAMEPAD_LEFT_THUMB), ('R3', button.XUSB_GAMEPAD_RIGHT_THUMB),
+                      ('DPAD_UP', button.XUSB_GAMEPAD_DPAD_UP), ('DPAD_DOWN', button.XUSB_GAMEPAD_DPAD_DOWN),
+                      ('DPAD_LEFT', button.XUSB_GAMEPAD_DPAD_LEFT), ('DPAD_RIGHT', button.XUSB_GAMEPAD_DPAD_RIGHT)):
+        table[('BUTTON', code)] = ('button', btn)
+    table[('BUTTON', 'LT')] = ('trigger', 'left')
+    table[('BUTTON', 'RT')] = ('trigger', 'right')
+    for code, side, index in (('LEFT_X', 'left', 0), ('LEFT_Y', 'left', 1),
+                              ('RIGHT_X', 'right', 0), ('RIGHT_Y', 'right', 1)):
+        table[('AXIS', code)] = ('stick', side, index)
+    return table
+
 class InputManager:
-    def __init__(self):
-        self.gamepads = {} # Map: index -> virtual_device
-        
+    def __init__(self, pool=None):
+        self.gamepads = {} # Map: index -> virtual_device (pool slot -> device with a GamepadPool)
+        self.pool = None
+        if pool is not None:
+            self.attach_pool(pool)
+        self._sticks = {} # vgamepad: index -> {'left': [x, y], 'right': [x, y]} (it takes both axes per call)
+        self._state = {} # index -> {dispatch action: last value written}, what snapshots diff against
+
+        # Dispatch built once per backend: (type, code) -> action, and the same by wire id for binary batches
+        if not IS_WINDOWS:
+            self._dispatch = evdev_dispatch()
+        else:
+            self._dispatch = vgamepad_dispatch() if vg else {}
+        self._dispatch_ids = {type_id: [self._dispatch.get((TYPES[type_id], code)) for code in codes]
+                              for type_id, codes in CODES.items()}
+        self._axis_actions = {action for action in self._dispatch_ids[TYPE_AXIS] if action is not None}
+        self.coalesced = 0 # Events dropped by apply_messages (superseded axis values, repeated buttons)
+        if IS_WINDOWS:
+            return
+
         # Capabilities template (Xbox Style)
         self.cap_gamepad = {
             ecodes.EV_KEY: [
@@ -35,11 +95,23 @@ class InputManager:
                 (ecodes.ABS_HAT0Y, AbsInfo(value=0, min=-1, max=1, fuzz=0, flat=0, resolution=0)),
             ]
         }
+    def attach_pool(self, pool):
+        """Devices come from a GamepadPool: (session, pad index) -> slot instead of one shared index space."""
+        self.pool = pool
+        self.gamepads = pool.devices
+
     def _get_gamepad(self, index):
         """Returns or creates a virtual gamepad for the given index."""
         if index in self.gamepads:
             return self.gamepads[index]
-        
+        if self.pool is not None:
+            return None # The pool owns device creation
+        device = self.create_gamepad(index)
+        self.gamepads[index] = device
+        return device
+
+    def create_gamepad(self, index):
+        """Creates the virtual gamepad "NeonGamepad P<index+1>" (also the GamepadPool factory)."""
         try:
             device = None
             if not IS_WINDOWS:
@@ -51,92 +123,201 @@ class InputManager:
                     logger.info(f"Virtual Device Created: Gamepad P{index+1} (vgamepad)")
                 else:
                     logger.error("vgamepad not installed.")
-            
-            self.gamepads[index] = device
             return device
         except Exception as e:
             logger.error(f"Failed to create Virtual Gamepad P{index+1}: {e}")
             return None
 
-    def handle_input(self, data):
-        type_ = data.get('type')
-        code = data.get('code')
-        value = data.get('value')
-        gp_index = data.get('gamepadIndex', 0)
+    def handle_input(self, data, session_id=None):
+        """JSON event (text data channel message): {type, code, value, gamepadIndex}."""
+        self._apply(self._event_actions(data, session_id))
 
-        device = self._get_gamepad(gp_index)
-        if not device:
-            return
+    def handle_batch(self, message, session_id=None):
+        """Binary batch (input_protocol): every change of one client poll tick. Returns the event count."""
+        actions = self._batch_actions(message, session_id)
+        self._apply(actions)
+        return len(actions)
+
+    def handle_snapshot(self, message, session_id=None):
+        """
+        Snapshot (input_protocol v3): full state per pad. Only what differs from the
+        device state is written, releases before presses (DPAD up/down share a hat axis).
+        Staleness (sequence) is checked per session by the caller. Returns the events written.
+        """
+        actions = self._snapshot_actions(message, self._state, session_id)
+        self._apply(actions)
+        return len(actions)
+
+    def release_session(self, session_id):
+        """Session gone: its pads go back to neutral (nothing stays held) and their slots to the pool."""
+        self.apply_messages([("release", None, session_id)])
+
+    def apply_messages(self, messages):
+        """
+        Every message queued since the last tick, written as one coalesced batch:
+        only the latest value per axis, every button edge in order, one syn()/update()
+        per device. messages: [(kind, payload, session id)] with kind "batch" / "event" /
+        "snapshot" / "release". Returns (events decoded, events written).
+        """
+        actions = []
+        pending = {} # Snapshots diff against the device state plus what is queued before them
+        released = []
+        for kind, payload, session_id in messages:
+            if kind == "snapshot":
+                decoded = self._snapshot_actions(payload, pending, session_id)
+            elif kind == "batch":
+                decoded = self._batch_actions(payload, session_id)
+            elif kind == "release":
+                decoded = self._release_actions(pending, session_id)
+                released.append(session_id)
+            else:
+                decoded = self._event_actions(payload, session_id)
+            for action, value, gp_index in decoded:
+                if gp_index not in pending:
+                    pending[gp_index] = dict(self._state.get(gp_index, {}))
+                pending[gp_index][action] = value
+            actions += decoded
+        written = self._coalesce(actions) if len(messages) > 1 else actions
+        self.coalesced += len(actions) - len(written)
+        self._apply(written)
+        for session_id in released:
+            slots = self.pool.release(session_id) if self.pool is not None else []
+            for slot in slots:
+                self._state.pop(slot, None)
+                self._sticks.pop(slot, None)
+        return len(actions), len(written)
+
+    def _slot(self, session_id, index):
+        """Device index of a session's pad: its pool slot, or the pad index itself without a pool."""
+        if self.pool is None or session_id is None:
+            return index
+        return self.pool.slot(session_id, index)
+
+    def _release_actions(self, pending, session_id):
+        if self.pool is None:
+            return []
+        actions = []
+        for slot in self.pool.session_slots(session_id).values():
+            state = pending[slot] if slot in pending else self._state.get(slot, {})
+            actions += [(action, 0, slot) for action, value in state.items() if value]
+        return actions
+
+    def _coalesce(self, actions):
+        """Drops superseded axis values (the last one stays, at its position) and repeated button values."""
+        last_axis = {}
+        for index, (action, _, gp_index) in enumerate(actions):
+            if action in self._axis_actions:
+                last_axis[(gp_index, action)] = index
+        out = []
+        buttons = {}
+        for index, (action, value, gp_index) in enumerate(actions):
+            key = (gp_index, action)
+            if key in last_axis:
+                if last_axis[key] == index:
+                    out.append((action, value, gp_index))
+            elif key not in buttons or buttons[key] != value: # A press + release in one tick both stay
+                buttons[key] = value
+                out.append((action, value, gp_index))
+        return out
+
+    def _event_actions(self, data, session_id=None):
+        action = self._dispatch.get((data.get('type'), data.get('code')))
+        if action is None:
+            return []
+        slot = self._slot(session_id, data.get('gamepadIndex', 0))
+        return [] if slot is None else [(action, data.get('value'), slot)]
+
+    def _batch_actions(self, message, session_id=None):
+        table = self._dispatch_ids
+        actions = []
+        slots = {}
+        for type_id, gp_index, code_id, value in decode_batch(message):
+            codes = table.get(type_id)
+            if codes is None or code_id >= len(codes) or codes[code_id] is None:
+                continue # Newer client: unknown type/code
+            if gp_index not in slots:
+                slots[gp_index] = self._slot(session_id, gp_index)
+            if slots[gp_index] is not None:
+                actions.append((codes[code_id], value, slots[gp_index]))
+        return actions
 
-        if type_ == 'BUTTON':
-            btn_map = {
-                'A': ecodes.BTN_A, 'B': ecodes.BTN_B, 'X': ecodes.BTN_X, 'Y': ecodes.BTN_Y,
-                'SELECT': ecodes.BTN_SELECT, 'START': ecodes.BTN_START,
-                'HOME': ecodes.BTN_MODE, 'LB': ecodes.BTN_TL, 'RB': ecodes.BTN_TR,
-                'L3': ecodes.BTN_THUMBL, 'R3': ecodes.BTN_THUMBR,
-                'DPAD_UP': (ecodes.EV_ABS, ecodes.ABS_HAT0Y, -1),
-                'DPAD_DOWN': (ecodes.EV_ABS, ecodes.ABS_HAT0Y, 1),
-                'DPAD_LEFT': (ecodes.EV_ABS, ecodes.ABS_HAT0X, -1),
-                'DPAD_RIGHT': (ecodes.EV_ABS, ecodes.ABS_HAT0X, 1),
-                'LT': (ecodes.EV_ABS, ecodes.ABS_Z, 255),
-                'RT': (ecodes.EV_ABS, ecodes.ABS_RZ, 255)
-            }
-            if code in btn_map:
-                try:
-                    mapped = btn_map[code]
-                    if not IS_WINDOWS:
-                        if isinstance(mapped, tuple):
-                            val = mapped[2] if value else 0
-                            device.write(mapped[0], mapped[1], val)
-                        else:
-                            device.write(ecodes.EV_KEY, mapped, 1 if value else 0)
-                        device.syn()
-                    else:
-                        # vgamepad logic
-                        vg_map = {
-                            'A': vg.XUSB_BUTTON.XUSB_GAMEPAD_A,
-                            'B': vg.XUSB_BUTTON.XUSB_GAMEPAD_B,
-                            'X': vg.XUSB_BUTTON.XUSB_GAMEPAD_X,
-                            'Y': vg.XUSB_BUTTON.XUSB_GAMEPAD_Y,
-                            'SELECT': vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK,
-                            'START': vg.XUSB_BUTTON.XUSB_GAMEPAD_START,
-                            'HOME': vg.XUSB_BUTTON.XUSB_GAMEPAD_GUIDE,
-                            'LB': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
-                            'RB': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
-                            'L3': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB,
-                            'R3': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB,
-                            'DPAD_UP': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP,
-                            'DPAD_DOWN': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN,
-                            'DPAD_LEFT': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT,
-                            'DPAD_RIGHT': vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT,
-                        }
-                        if code in vg_map:
-                            if value: device.press_button(button=vg_map[code])
-                            else: device.release_button(button=vg_map[code])
-                        elif code == 'LT':
-                            device.left_trigger(value=int(value))
-                        elif code == 'RT':
-                            device.right_trigger(value=int(value))
-                        device.update()
-                except Exception as e:
-                    logger.debug(f"Input handling error: {e}")
-
-        elif type_ == 'AXIS':
-            axis_map = {
-                'LEFT_X': ecodes.ABS_X, 'LEFT_Y': ecodes.ABS_Y,
-                'RIGHT_X': ecodes.ABS_RX, 'RIGHT_Y': ecodes.ABS_RY
-            }
-            if code in axis_map:
-                try:
-                    if not IS_WINDOWS:
-                        device.write(ecodes.EV_ABS, axis_map[code], value)
-                        device.syn()
-                    else:
-                        # vgamepad uses -32768 to 32767 for axes, same as we receive
-                        if code == 'LEFT_X': device.left_joystick(x_value=int(value), y_value=None)
-                        elif code == 'LEFT_Y': device.left_joystick(x_value=None, y_value=int(value))
-                        elif code == 'RIGHT_X': device.right_joystick(x_value=int(value), y_value=None)
-                        elif code == 'RIGHT_Y': device.right_joystick(x_value=None, y_value=int(value))
-                        device.update()
-                except Exception as e:
-                    logger.debug(f"Axis handling error: {e}")
+    def _snapshot_actions(self, message, states, session_id=None):
+        _, pads = decode_snapshot(message)
+        buttons = self._dispatch_ids[TYPE_BUTTON]
+        axes = self._dispatch_ids[TYPE_AXIS]
+        actions = []
+        for pad_index, mask, *values in pads:
+            gp_index = self._slot(session_id, pad_index)
+            if gp_index is None:
+                continue
+            state = states[gp_index] if gp_index in states else self._state.get(gp_index, {})
+            presses = []
+            for bit, action in enumerate(buttons):
+                if action is None:
+                    continue
+                value = (mask >> bit) & 1
+                if state.get(action, 0) != value:
+                    (presses if value else actions).append((action, value, gp_index))
+            actions += presses
+            actions += [(action, value, gp_index) for action, value in zip(axes, values)
+                        if action is not None and state.get(action, 0) != value]
+        return actions
+
+    def apply_events(self, events):
+        """[(type, code, value, gamepad index)]: written together, one syn()/update() per device."""
+        dispatch = self._dispatch
+        actions = [(dispatch.get((type_, code)), value, gp_index) for type_, code, value, gp_index in events]
+        self._apply([a for a in actions if a[0] is not None])
+
+    def _apply(self, actions):
+        """(action, value, gamepad index) from the dispatch table, grouped per device."""
+        per_device = {}
+        for action, value, gp_index in actions:
+            per_device.setdefault(gp_index, []).append((action, value))
+        for gp_index, device_actions in per_device.items():
+            self._state.setdefault(gp_index, {}).update(device_actions)
+            device = self._get_gamepad(gp_index)
+            if not device:
+                continue
+            try:
+                if not IS_WINDOWS:
+                    self._write_evdev(device, device_actions)
+                else:
+                    self._write_vgamepad(gp_index, device, device_actions)
+            except Exception as e:
+                logger.debug(f"Input handling error: {e}")
+
+    def _write_evdev(self, device, actions):
+        events = []
+        for (etype, ecode, pressed), value in actions:
+            if pressed is not None:
+                value = pressed if value else 0
+            events.append((etype, ecode, int(value)))
+        fd = getattr(device, "fd", None)
+        if isinstance(fd, int):
+            # uinput takes any number of input_events per write(2): the batch + SYN_REPORT in one syscall
+            os.write(fd, b"".join([INPUT_EVENT.pack(0, 0, *event) for event in events]) + SYN_REPORT)
+        else:
+            for event in events:
+                device.write(*event)
+            device.syn()
+
+    def _write_vgamepad(self, gp_index, device, actions):
+        sticks = self._sticks.setdefault(gp_index, {'left': [0, 0], 'right': [0, 0]})
+        moved = set()
+        for action, value in actions:
+            kind = action[0]
+            if kind == 'button':
+                if value: device.press_button(button=action[1])
+                else: device.release_button(button=action[1])
+            elif kind == 'trigger':
+                trigger = device.left_trigger if action[1] == 'left' else device.right_trigger
+                trigger(value=int(value))
+            else:
+                sticks[action[1]][action[2]] = int(value)
+                moved.add(action[1])
+        if 'left' in moved:
+            device.left_joystick(x_value=sticks['left'][0], y_value=sticks['left'][1])
+        if 'right' in moved:
+            device.right_joystick(x_value=sticks['right'][0], y_value=sticks['right'][1])
+        device.update()
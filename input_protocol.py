@@ -0,0 +1,98 @@
+import struct
+
+# Binary input batch (data channel, binary messages):
+#   header  <BBH   magic 'N', version 1, event count
+#           <BBHHd magic 'N', version 2, event count, sequence, client poll time (ms)
+#   event   <BBBh  type, gamepad index, code, value       (5 bytes, repeated count times)
+# One message carries every state change of a client poll tick. Text messages stay
+# JSON ({type, code, value, gamepadIndex[, seq, t]}) as the fallback / for old clients.
+#
+# Snapshot (version 3, same header as version 2, count = pads):
+#   pad     <BIhhhh gamepad index, button bitmask (bit = BUTTON_CODES index), LEFT_X, LEFT_Y, RIGHT_X, RIGHT_Y
+# The full controller state instead of edges: a lost or reordered snapshot is simply
+# superseded by the next one, so the channel can run with maxRetransmits: 0.
+MAGIC = 0x4E
+VERSION = 2
+VERSION_SNAPSHOT = 3
+HEADER = struct.Struct("<BBH")
+HEADER_V2 = struct.Struct("<BBHHd")
+HEADERS = {1: HEADER, 2: HEADER_V2, VERSION_SNAPSHOT: HEADER_V2}
+EVENT = struct.Struct("<BBBh")
+PAD_STATE = struct.Struct("<BIhhhh")
+RECORDS = {1: EVENT, 2: EVENT, VERSION_SNAPSHOT: PAD_STATE}
+SEQ_MOD = 1 << 16 # Sequence numbers wrap at 16 bits (the client shares them with JSON messages)
+
+TYPE_BUTTON = 1
+TYPE_AXIS = 2
+TYPES = {TYPE_BUTTON: "BUTTON", TYPE_AXIS: "AXIS"}
+
+# Code tables: the index is the wire code. Append only, never reorder (client.js has a copy).
+BUTTON_CODES = ("A", "B", "X", "Y", "LB", "RB", "LT", "RT", "SELECT", "START",
+                "L3", "R3", "DPAD_UP", "DPAD_DOWN", "DPAD_LEFT", "DPAD_RIGHT", "HOME")
+AXIS_CODES = ("LEFT_X", "LEFT_Y", "RIGHT_X", "RIGHT_Y")
+CODES = {TYPE_BUTTON: BUTTON_CODES, TYPE_AXIS: AXIS_CODES}
+CODE_IDS = {TYPE_BUTTON: {c: i for i, c in enumerate(BUTTON_CODES)},
+            TYPE_AXIS: {c: i for i, c in enumerate(AXIS_CODES)}}
+TYPE_IDS = {name: type_id for type_id, name in TYPES.items()}
+
+def encode_batch(events, seq=None, sent_ms=0.0):
+    """[(type name, code name, value, gamepad index)] -> binary message (version 2 when seq is given)."""
+    if seq is None:
+        out = bytearray(HEADER.pack(MAGIC, 1, len(events)))
+    else:
+        out = bytearray(HEADER_V2.pack(MAGIC, 2, len(events), seq % SEQ_MOD, sent_ms))
+    for type_, code, value, gamepad in events:
+        type_id = TYPE_IDS[type_]
+        out += EVENT.pack(type_id, gamepad, CODE_IDS[type_id][code], int(value))
+    return bytes(out)
+
+def decode_header(data):
+    """
+    Binary message -> (header size, event count, sequence, client poll time ms).
+    Version 1 batches have no sequence/time (None). Raises ValueError on a bad header
+    or a truncated batch.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("input batch too short")
+    magic, version = data[0], data[1]
+    header = HEADERS.get(version)
+    if magic != MAGIC or header is None:
+        raise ValueError(f"unsupported input batch (magic {magic:#x}, version {version})")
+    if len(data) < header.size:
+        raise ValueError("input batch too short")
+    if version == 1:
+        _, _, count = header.unpack_from(data)
+        seq = sent_ms = None
+    else:
+        _, _, count, seq, sent_ms = header.unpack_from(data)
+    if len(data) != header.size + count * RECORDS[version].size:
+        raise ValueError(f"input batch size {len(data)} does not match {count} records")
+    return header.size, count, seq, sent_ms
+
+def decode_batch(data):
+    """Binary message -> iterator of (type id, gamepad index, code id, value) tuples. Raises ValueError."""
+    if is_snapshot(data):
+        raise ValueError("input snapshot, not an event batch")
+    size = decode_header(data)[0]
+    return EVENT.iter_unpack(memoryview(data)[size:])
+
+def is_snapshot(data):
+    return len(data) > 1 and data[0] == MAGIC and data[1] == VERSION_SNAPSHOT
+
+def encode_snapshot(pads, seq, sent_ms=0.0):
+    """{gamepad index: (pressed button names, (LEFT_X, LEFT_Y, RIGHT_X, RIGHT_Y))} -> snapshot message."""
+    out = bytearray(HEADER_V2.pack(MAGIC, VERSION_SNAPSHOT, len(pads), seq % SEQ_MOD, sent_ms))
+    ids = CODE_IDS[TYPE_BUTTON]
+    for gamepad, (buttons, axes) in sorted(pads.items()):
+        mask = 0
+        for button in buttons:
+            mask |= 1 << ids[button]
+        out += PAD_STATE.pack(gamepad, mask, *(int(v) for v in axes))
+    return bytes(out)
+
+def decode_snapshot(data):
+    """Snapshot message -> (sequence, iterator of (gamepad index, button mask, lx, ly, rx, ry)). Raises ValueError."""
+    if not is_snapshot(data):
+        raise ValueError("not an input snapshot")
+    size, _, seq, _ = decode_header(data)
+    return seq, PAD_STATE.iter_unpack(memoryview(data)[size:])
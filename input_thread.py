@@ -0,0 +1,236 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from telemetry import quantile, DISTRIBUTION_HISTORY
+
+logger = logging.getLogger("NeonInput")
+
+# Messages waiting for the input thread (a 250 Hz client with 4 pads fills ~1 s of it)
+INPUT_QUEUE_SIZE = 1024
+# Messages applied (and coalesced) together when they piled up while the thread was busy
+INPUT_DRAIN_MAX = 64
+# --input-priority: normal / high (nice -10) / realtime (SCHED_FIFO, falls back to high)
+INPUT_PRIORITIES = ("normal", "high", "realtime")
+INPUT_RT_PRIORITY = 10 # SCHED_FIFO 1-99: above every normal task, below kernel IRQ threads (50)
+INPUT_NICE = -10
+
+BATCH = "batch" # Binary input_protocol batch
+EVENT = "event" # JSON {type, code, value, gamepadIndex}
+SNAPSHOT = "snapshot" # Binary input_protocol full pad state
+RELEASE = "release" # Session closed: neutralize its pads and return them to the GamepadPool
+
+_DOORBELL = (1).to_bytes(8, sys.byteorder) # eventfd takes an 8-byte counter; a pipe takes anything
+
+class SPSCQueue:
+    """
+    Bounded single-producer/single-consumer ring buffer.
+
+    Lock-free: the producer only moves `_tail`, the consumer only `_head`, and a
+    slot is filled before the index store that publishes it (each store is atomic
+    under the GIL). push() returns False when full instead of blocking the producer.
+    """
+    def __init__(self, capacity=INPUT_QUEUE_SIZE):
+        self.capacity = max(1, int(capacity))
+        self._slots = [None] * self.capacity
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def push(self, item):
+        tail = self._tail
+        if tail - self._head >= self.capacity:
+            return False
+        self._slots[tail % self.capacity] = item
+        self._tail = tail + 1
+        return True
+
+    def pop(self):
+        head = self._head
+        if head == self._tail:
+            return None
+        index = head % self.capacity
+        item, self._slots[index] = self._slots[index], None
+        self._head = head + 1
+        return item
+
+class InputThread:
+    """
+    Applies input messages on a dedicated thread, off the asyncio loop.
+
+    The data channel callback only stamps and queues the message (submit), so
+    getStats(), SDP negotiation or a gc.collect() on the loop never delay a button
+    press. Whatever piled up while the thread was busy is applied as one coalesced
+    tick (InputManager.apply_messages). The thread sleeps on an eventfd (pipe
+    elsewhere) that the producer only rings when the consumer is idle. Receipt-to-write
+    latency goes to the session's "input_latency_ms" distribution (split into
+    "input_queue_ms" and "input_write_ms") and to stats().
+    """
+    def __init__(self, manager, priority="high", capacity=INPUT_QUEUE_SIZE, clock=time.perf_counter):
+        self.manager = manager
+        self.priority = priority if priority in INPUT_PRIORITIES else "high"
+        self.queue = SPSCQueue(capacity)
+        self._clock = clock
+        self._thread = None
+        self._running = False
+        self._sleeping = False
+        self._read_fd = self._write_fd = None
+        self.scheduling = "inline" # What the thread actually got: inline / normal / nice -10 / SCHED_FIFO 10
+        self.received = 0
+        self.applied = 0
+        self.dropped = 0
+        self._latency = deque(maxlen=DISTRIBUTION_HISTORY)
+        self._last_drop_warn = 0
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        if hasattr(os, "eventfd"):
+            self._read_fd = self._write_fd = os.eventfd(0, os.EFD_CLOEXEC)
+        else:
+            self._read_fd, self._write_fd = os.pipe()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="NeonInput", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        if not self._running:
+            return
+        self._running = False
+        self._ring()
+        self._thread.join(timeout)
+        for fd in {self._read_fd, self._write_fd}:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._thread = None
+        self.scheduling = "inline"
+
+    def submit(self, kind, payload, session=None):
+        """Queues a message (BATCH bytes / EVENT dict) from the loop. Without the thread it is applied inline."""
+        self.received += 1
+        item = (self._clock(), kind, payload, session)
+        if not self._running:
+            self._apply([item])
+            return True
+        if not self.queue.push(item):
+            self.dropped += 1
+            now = time.time()
+            if now - self._last_drop_warn > 10:
+                self._last_drop_warn = now
+                logger.warning(f"[INPUT] Queue full ({self.queue.capacity}), dropped {self.dropped} messages so far")
+            return False
+        if self._sleeping:
+            self._ring()
+        return True
+
+    def stats(self):
+        latency = sorted(self._latency)
+        return {
+            "running": self._running,
+            "scheduling": self.scheduling,
+            "queued": len(self.queue),
+            "received": self.received,
+            "applied": self.applied,
+            "dropped": self.dropped,
+            "coalesced": getattr(self.manager, "coalesced", 0),
+            "latency_ms": {
+                "count": len(latency),
+                "p50": quantile(latency, 0.5),
+                "p99": quantile(latency, 0.99),
+                "max": latency[-1] if latency else None,
+            },
+        }
+
+    def _ring(self):
+        try:
+            os.write(self._write_fd, _DOORBELL)
+        except (OSError, TypeError):
+            pass
+
+    def _run(self):
+        self.scheduling = self._set_priority()
+        logger.info(f"[INPUT] Input thread started ({self.scheduling})")
+        queue = self.queue
+        while self._running:
+            item = queue.pop()
+            if item is not None:
+                items = [item]
+                while len(items) < INPUT_DRAIN_MAX and (item := queue.pop()) is not None:
+                    items.append(item)
+                self._apply(items)
+                continue
+            # Announce the sleep, then re-check: a push between pop() and here sees _sleeping and rings
+            self._sleeping = True
+            if not len(queue) and self._running:
+                try:
+                    os.read(self._read_fd, 4096)
+                except OSError:
+                    break
+            self._sleeping = False
+        # Leftovers (release events) still reach the device on shutdown
+        leftovers = []
+        while (item := queue.pop()) is not None:
+            leftovers.append(item)
+        if leftovers:
+            self._apply(leftovers)
+
+    def _apply(self, items):
+        """Queued (received, kind, payload, session) items, written as one coalesced tick."""
+        started = self._clock()
+        try:
+            self.manager.apply_messages([(kind, payload, session.session_id if session is not None else None)
+                                         for _, kind, payload, session in items])
+        except Exception as e:
+            logger.error(f"Input Error: {e}")
+        done = self._clock()
+        write_ms = round((done - started) * 1000.0, 3)
+        for received, kind, _, session in items:
+            if kind == RELEASE:
+                continue
+            latency_ms = round((done - received) * 1000.0, 3)
+            self.applied += 1
+            self._latency.append(latency_ms)
+            if session is not None:
+                session.record_distribution("input_queue_ms", round((started - received) * 1000.0, 3))
+                session.record_distribution("input_write_ms", write_ms)
+                session.record_distribution("input_latency_ms", latency_ms)
+
+    def _set_priority(self):
+        """Raises the calling thread's priority as far as permitted. Returns what it got."""
+        if self.priority == "normal":
+            return "normal"
+        if os.name == "nt":
+            try:
+                import ctypes
+                kernel32 = ctypes.windll.kernel32
+                level = 15 if self.priority == "realtime" else 2 # THREAD_PRIORITY_TIME_CRITICAL / HIGHEST
+                if kernel32.SetThreadPriority(kernel32.GetCurrentThread(), level):
+                    return "time critical" if level == 15 else "highest"
+            except Exception as e:
+                logger.info(f"[INPUT] Thread priority not set: {e}")
+            return "normal"
+        if self.priority == "realtime" and hasattr(os, "sched_setscheduler"):
+            try:
+                # pid 0 = the calling thread on Linux
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(INPUT_RT_PRIORITY))
+                return f"SCHED_FIFO {INPUT_RT_PRIORITY}"
+            except OSError as e:
+                logger.info(f"[INPUT] SCHED_FIFO not permitted ({e}), trying nice {INPUT_NICE}")
+        try:
+            tid = threading.get_native_id()
+            if os.getpriority(os.PRIO_PROCESS, tid) > INPUT_NICE:
+                os.setpriority(os.PRIO_PROCESS, tid, INPUT_NICE) # Per-thread on Linux
+            return f"nice {os.getpriority(os.PRIO_PROCESS, tid)}"
+        except (OSError, AttributeError) as e:
+            logger.info(f"[INPUT] Thread priority not raised ({e})")
+            return "normal"
@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("NeonKeyframe")
+
+# At most one forced IDR per interval per pipeline: a lossy viewer sends a PLI every
+# RTT until it decodes again, and several viewers can share one encoder
+KEYFRAME_MIN_INTERVAL = 0.5
+
+class KeyframeGate:
+    """
+    Rate-limited keyframe requests (RTCP PLI/FIR) for one encoder.
+
+    request() may come from any thread (aiortc calls the encoder in an executor).
+    The first request fires right away; requests inside min_interval of the last
+    forced IDR are coalesced into one pending IDR that poll() fires once the
+    interval is over. An IDR the encoder produced on its own (GOP) serves any
+    pending request.
+    """
+    def __init__(self, fire, min_interval=KEYFRAME_MIN_INTERVAL, clock=time.monotonic):
+        self._fire = fire
+        self.min_interval = min_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_forced = None
+        self._pending = False
+        self.requests = 0
+        self.forced = 0
+        self.coalesced = 0
+
+    def request(self):
+        with self._lock:
+            self.requests += 1
+            now = self._clock()
+            if self._last_forced is not None and now - self._last_forced < self.min_interval:
+                if self._pending:
+                    self.coalesced += 1
+                self._pending = True
+                return False
+            self._force(now)
+        return True
+
+    def poll(self):
+        """Fires a deferred request once the interval allows it; call on every packet."""
+        if not self._pending:
+            return False
+        with self._lock:
+            now = self._clock()
+            if not self._pending or now - self._last_forced < self.min_interval:
+                return False
+            self._force(now)
+        return True
+
+    def on_keyframe(self):
+        """The encoder emitted an IDR: nothing is pending anymore."""
+        self._pending = False
+
+    def _force(self, now):
+        self._pending = False
+        self._last_forced = now
+        self.forced += 1
+        self._fire()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "forced": self.forced,
+            "coalesced": self.coalesced,
+            "pending": self._pending,
+        }
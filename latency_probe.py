@@ -0,0 +1,110 @@
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger("NeonProbe")
+
+# --latency-probe marker: one row of square blocks in the top-left corner of every frame,
+# [white reference][black reference][16 bits of the wall-clock ms, MSB first].
+# The client reads it back from the decoded frame and echoes the stamp over the data channel.
+PROBE_BITS = 16
+PROBE_MOD = 1 << PROBE_BITS # Stamps wrap every ~65 s: plenty for a latency
+PROBE_BLOCKS = PROBE_BITS + 2
+PROBE_ROWS = 60 # Block size = frame height / 60 (18 px at 1080p), survives low bitrates and scaling
+WHITE, BLACK = 235, 16 # Limited-range luma
+NEUTRAL = 128
+MAX_LATENCY_MS = 10000 # Anything above is a misread marker
+
+def block_size(height):
+    return max(2, int(height) // PROBE_ROWS)
+
+def stamp_ms(now=None):
+    """Wall-clock milliseconds modulo 2^16 (same clock as FFmpeg's RTCTIME)."""
+    return int((time.time() if now is None else now) * 1000) % PROBE_MOD
+
+def marker_levels(stamp):
+    """Luma of each block, left to right."""
+    bits = [(stamp >> (PROBE_BITS - 1 - i)) & 1 for i in range(PROBE_BITS)]
+    return [WHITE, BLACK] + [WHITE if bit else BLACK for bit in bits]
+
+def stamp_planes(y, u, v, stamp):
+    """Draws the marker into 2D yuv420p plane views (written in place, chroma neutral)."""
+    block = block_size(y.shape[0])
+    for i, level in enumerate(marker_levels(stamp)):
+        y[:block, i * block:(i + 1) * block] = level
+    half = block // 2
+    width = PROBE_BLOCKS * half
+    for plane in (u, v):
+        if plane is not None:
+            plane[:half, :width] = NEUTRAL
+
+def stamp_frame(frame, stamp):
+    """Marker on a yuv420p av.VideoFrame (planes are writable buffers)."""
+    views = []
+    for index, plane in enumerate(frame.planes[:3]):
+        rows = frame.height if index == 0 else frame.height // 2
+        cols = frame.width if index == 0 else frame.width // 2
+        views.append(np.frombuffer(plane, np.uint8).reshape(-1, plane.line_size)[:rows, :cols])
+    stamp_planes(*views, stamp)
+
+def stamp_buffer(array, width, height, stamp):
+    """Marker on a contiguous yuv420p buffer (FrameBufferPool slot array)."""
+    flat = array.reshape(-1)
+    luma = width * height
+    chroma = luma // 4
+    stamp_planes(flat[:luma].reshape(height, width),
+                 flat[luma:luma + chroma].reshape(height // 2, width // 2),
+                 flat[luma + chroma:luma + 2 * chroma].reshape(height // 2, width // 2),
+                 stamp)
+
+def read_marker(luma):
+    """Stamp from a decoded luma plane, None when there is no readable marker (mirrors client.js)."""
+    block = block_size(luma.shape[0])
+    row = luma[block // 2]
+    levels = [int(row[i * block + block // 2]) for i in range(PROBE_BLOCKS)]
+    white, black = levels[0], levels[1]
+    if white - black < 80:
+        return None
+    threshold = (white + black) / 2
+    stamp = 0
+    for level in levels[2:]:
+        stamp = (stamp << 1) | (level > threshold)
+    return stamp
+
+def drawbox_filter(height=None):
+    """
+    FFmpeg CLI equivalent: wall-clock PTS (RTCTIME, in us) and one drawbox per block,
+    the bit blocks enabled by the frame's own timestamp. Without a height the blocks
+    follow the input (ih / PROBE_ROWS), for a marker drawn before a later scale.
+    """
+    if height is None:
+        expr = f"max(2,trunc(ih/{PROBE_ROWS}))" # block_size() as an FFmpeg expression
+        block, at = f"'{expr}'", lambda i: f"'{i}*{expr}'"
+    else:
+        block = block_size(height)
+        at = lambda i: i * block
+    boxes = [f"drawbox=x=0:y=0:w={block}:h={block}:color=white:t=fill",
+             f"drawbox=x={at(1)}:y=0:w={block}:h={block}:color=black:t=fill"]
+    for i in range(PROBE_BITS):
+        weight = 1 << (PROBE_BITS - 1 - i)
+        x = at(i + 2)
+        boxes.append(f"drawbox=x={x}:y=0:w={block}:h={block}:color=black:t=fill")
+        boxes.append(f"drawbox=x={x}:y=0:w={block}:h={block}:color=white:t=fill"
+                     f":enable='eq(mod(floor(t*1000/{weight}),2),1)'")
+    return ",".join(["settb=AVTB", "setpts=RTCTIME"] + boxes)
+
+def glass_to_glass_ms(stamp, now=None, uplink_ms=0.0, display_ms=0.0):
+    """
+    Capture-to-display latency from a stamp echoed by the client: server time since the
+    stamp, minus the echo's trip back (half the RTT), plus the client's wait until the
+    frame was actually on screen. None for implausible values.
+    """
+    try:
+        stamp = int(stamp)
+    except (TypeError, ValueError):
+        return None
+    elapsed = (stamp_ms(now) - stamp) % PROBE_MOD
+    latency = elapsed - float(uplink_ms or 0) + float(display_ms or 0)
+    if latency < 0 or latency > MAX_LATENCY_MS:
+        return None
+    return round(latency, 1)
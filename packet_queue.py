@@ -0,0 +1,228 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("NeonQueue")
+
+# H.264 NAL unit types we care about
+NAL_SLICE = 1
+NAL_IDR = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+# Default bound for the passthrough video queue (~100 ms at 60 fps)
+VIDEO_QUEUE_DEPTH = 6
+
+def iter_nal_headers(data):
+    """Yields the first byte of every NAL unit in an Annex-B access unit."""
+    n = len(data)
+    i = data.find(b"\x00\x00\x01")
+    while 0 <= i and i + 3 < n:
+        yield data[i + 3]
+        i = data.find(b"\x00\x00\x01", i + 3)
+
+def classify_access_unit(data):
+    """
+    Returns (is_keyframe, is_disposable) for an Annex-B access unit.
+    Keyframe = contains an IDR slice. Disposable = its slices have nal_ref_idc 0,
+    so no later frame references it and it can be dropped on its own.
+    """
+    keyframe = False
+    has_slice = False
+    referenced = False
+    for header in iter_nal_headers(data):
+        nal_type = header & 0x1F
+        if nal_type == NAL_IDR:
+            keyframe = True
+        if nal_type in (NAL_SLICE, NAL_IDR):
+            has_slice = True
+            if header & 0x60:
+                referenced = True
+    return keyframe, has_slice and not referenced
+
+class VideoPacketQueue:
+    """
+    Bounded GOP-aware queue for encoded H.264 access units.
+
+    Overflow never drops a single referenced P-frame (that would corrupt every frame
+    until the next IDR). Instead it drops disposable frames first, then the whole
+    dependent run back to the newest queued keyframe; if there is none, the queue is
+    flushed and new packets are discarded until the encoder sends the next IDR.
+    Not thread-safe: callers hold their own lock.
+    """
+    def __init__(self, max_depth=VIDEO_QUEUE_DEPTH):
+        self.max_depth = max(1, int(max_depth))
+        self._queue = deque() # (data, is_keyframe, is_disposable, arrival_time)
+        self._waiting_key = True
+        self.last_arrival = None # Arrival time of the last popped unit (capture clock)
+        self.pushed = 0
+        self.popped = 0
+        self.dropped_packets = 0
+        self.dropped_gops = 0
+        self.max_depth_seen = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def waiting_keyframe(self):
+        return self._waiting_key
+
+    def push(self, data, keyframe=None, now=None, disposable=None):
+        """
+        Queues an access unit. Returns False if it was discarded. Callers that already
+        classified it pass keyframe and disposable; keyframe=None classifies it here.
+        """
+        if keyframe is None:
+            keyframe, disposable = classify_access_unit(data)
+        disposable = bool(disposable)
+        self.pushed += 1
+
+        if self._waiting_key:
+            if not keyframe:
+                self.dropped_packets += 1
+                return False
+            self._waiting_key = False
+
+        if len(self._queue) >= self.max_depth:
+            self._make_room(keyframe)
+            if self._waiting_key and not keyframe:
+                self.dropped_packets += 1
+                return False
+
+        self._queue.append((data, keyframe, disposable, time.monotonic() if now is None else now))
+        if len(self._queue) > self.max_depth_seen:
+            self.max_depth_seen = len(self._queue)
+        return True
+
+    def _make_room(self, incoming_keyframe):
+        if incoming_keyframe:
+            # A fresh IDR makes everything queued before it redundant
+            self._drop(len(self._queue))
+            return
+
+        for i, (_, _, disposable, _) in enumerate(self._queue):
+            if disposable:
+                del self._queue[i]
+                self.dropped_packets += 1
+                return
+
+        last_key = None
+        for i, (_, keyframe, _, _) in enumerate(self._queue):
+            if keyframe:
+                last_key = i
+        if last_key:
+            # Skip straight to the newest GOP already in the queue
+            self._drop(last_key)
+        else:
+            # Only one GOP queued (or it is already being sent): nothing decodable to keep
+            self._drop(len(self._queue))
+            self._waiting_key = True
+
+    def _drop(self, count):
+        if count <= 0:
+            return
+        for _ in range(count):
+            self._queue.popleft()
+        self.dropped_packets += count
+        self.dropped_gops += 1
+
+    def pop(self):
+        if not self._queue:
+            return None
+        self.popped += 1
+        data, _, _, self.last_arrival = self._queue.popleft()
+        return data
+
+    def clear(self):
+        self._queue.clear()
+        self._waiting_key = True
+
+    def stats(self):
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "max_depth_seen": self.max_depth_seen,
+            "pushed": self.pushed,
+            "popped": self.popped,
+            "dropped_packets": self.dropped_packets,
+            "dropped_gops": self.dropped_gops,
+            "waiting_keyframe": self._waiting_key,
+        }
+
+class AudioPacketQueue:
+    """
+    Latency-targeted jitter queue for fixed-duration audio packets (Opus or PCM).
+
+    The queue lets up to target_ms of audio build up to absorb pipe/scheduler jitter.
+    Once the queued duration drifts more than CATCHUP_SLACK_FRAMES above target it
+    drops the oldest packets back down to target, so lag can never accumulate over a
+    long session. Not thread-safe: callers hold their own lock.
+    """
+    CATCHUP_SLACK_FRAMES = 2
+
+    def __init__(self, frame_ms=20, target_ms=40, max_ms=1000):
+        self.frame_ms = frame_ms
+        self.target_frames = max(1, round(target_ms / frame_ms))
+        self.max_frames = max(self.target_frames + self.CATCHUP_SLACK_FRAMES, round(max_ms / frame_ms))
+        self._queue = deque() # (data, arrival_time)
+        self.pushed = 0
+        self.popped = 0
+        self.dropped_packets = 0
+        self.catchups = 0
+        self.max_depth_seen = 0
+        self.last_arrival = None # Arrival time of the last popped packet (capture clock)
+        self._age_ms_avg = 0.0
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def target_ms(self):
+        return self.target_frames * self.frame_ms
+
+    def excess(self, depth):
+        """How many of depth queued packets must be dropped to get back to target."""
+        if depth > self.target_frames + self.CATCHUP_SLACK_FRAMES or depth > self.max_frames:
+            return depth - self.target_frames
+        return 0
+
+    def push(self, data, now=None):
+        self._queue.append((data, time.monotonic() if now is None else now))
+        self.pushed += 1
+        if len(self._queue) > self.max_depth_seen:
+            self.max_depth_seen = len(self._queue)
+        drop = self.excess(len(self._queue))
+        if drop:
+            for _ in range(drop):
+                self._queue.popleft()
+            self.dropped_packets += drop
+            self.catchups += 1
+
+    def pop(self, now=None):
+        if not self._queue:
+            return None
+        data, arrival = self._queue.popleft()
+        self.last_arrival = arrival
+        self.popped += 1
+        age_ms = ((time.monotonic() if now is None else now) - arrival) * 1000
+        self._age_ms_avg = age_ms if self.popped == 1 else self._age_ms_avg * 0.95 + age_ms * 0.05
+        return data
+
+    def clear(self):
+        self._queue.clear()
+
+    def stats(self):
+        return {
+            "depth": len(self._queue),
+            "latency_ms": len(self._queue) * self.frame_ms,
+            "target_ms": self.target_ms,
+            "avg_queue_age_ms": round(self._age_ms_avg, 1),
+            "max_depth_seen": self.max_depth_seen,
+            "pushed": self.pushed,
+            "popped": self.popped,
+            "dropped_packets": self.dropped_packets,
+            "catchups": self.catchups,
+        }
@@ -0,0 +1,173 @@
+import logging
+
+logger = logging.getLogger("NeonPipe")
+
+START_CODE = b"\x00\x00\x01"
+VCL_TYPES = (1, 5)
+# Non-VCL NAL types that open a new access unit once the current one holds a slice
+AU_PREFIX_TYPES = (6, 7, 8, 9, 14, 15, 16, 17, 18)
+
+class AnnexBSplitter:
+    """
+    Incremental H.264 Annex-B to access-unit splitter for FFmpeg pipe reads.
+
+    Start codes are located with bytes.find() over the read chunks themselves and the
+    unfinished access unit is kept as a list of memoryviews, so nothing is copied while
+    scanning. An access unit that arrives as exactly one pipe read (the normal case with
+    -flush_packets 1) is handed out as that very bytes object; one spanning several
+    reads is joined once. An access unit is only known to be complete when the next one
+    starts (same rule as FFmpeg's h264 parser).
+    """
+    def __init__(self):
+        self._frags = []   # [(abs_offset, memoryview)] covering [_au_start, _end)
+        self._end = 0      # absolute stream offset of the end of the data fed so far
+        self._au_start = 0 # absolute stream offset where the unfinished access unit begins
+        self._pending = [] # start codes whose NAL header bytes have not arrived yet
+        self._in_vcl = False
+        self.access_units = 0
+        self.bytes_copied = 0
+
+    def feed(self, chunk):
+        """Feeds one pipe read; returns the list of completed access units (bytes)."""
+        if not chunk:
+            return []
+        base = self._end
+        mv = memoryview(chunk)
+        starts = self._pending
+        self._pending = []
+
+        # Start codes straddling the previous read: scan a tiny stitched window
+        if self._frags:
+            window_start = max(self._au_start, base - 3)
+            window = self._range(window_start, base) + bytes(mv[:3])
+            i = window.find(START_CODE)
+            while 0 <= i and window_start + i < base:
+                # Codes fully inside the previous read were already found there
+                if window_start + i > base - 3 and window_start + i not in starts:
+                    starts.append(window_start + i)
+                i = window.find(START_CODE, i + 1)
+            starts.sort()
+
+        i = chunk.find(START_CODE)
+        while i >= 0:
+            starts.append(base + i)
+            i = chunk.find(START_CODE, i + 3)
+
+        self._frags.append((base, mv))
+        self._end = base + len(chunk)
+
+        units = []
+        for idx, sc in enumerate(starts):
+            if sc + 4 >= self._end:
+                # NAL header (and first slice byte) not here yet
+                self._pending = starts[idx:]
+                break
+            header = self._byte(sc + 3)
+            nal_type = header & 0x1F
+            if nal_type in VCL_TYPES:
+                # first_mb_in_slice == 0 <=> its ue(v) code is the single bit '1'
+                starts_au = self._in_vcl and self._byte(sc + 4) & 0x80
+            else:
+                starts_au = self._in_vcl and nal_type in AU_PREFIX_TYPES
+            if starts_au:
+                cut = sc
+                if sc - 1 > self._au_start and self._byte(sc - 1) == 0:
+                    cut = sc - 1 # 4-byte start code belongs to the next unit
+                units.append(self._take(cut))
+                self._in_vcl = False
+            if nal_type in VCL_TYPES:
+                self._in_vcl = True
+        return units
+
+    def flush(self):
+        """Returns the trailing access unit at end of stream (or None)."""
+        if self._end <= self._au_start:
+            return None
+        self._pending = []
+        self._in_vcl = False
+        return self._take(self._end)
+
+    def _byte(self, pos):
+        for off, frag in reversed(self._frags):
+            if pos >= off:
+                return frag[pos - off]
+        raise IndexError(pos)
+
+    def _range(self, start, end):
+        out = b""
+        for off, frag in self._frags:
+            lo, hi = max(start, off), min(end, off + len(frag))
+            if lo < hi:
+                out += bytes(frag[lo - off:hi - off])
+        return out
+
+    def _take(self, cut):
+        pieces = []
+        keep = []
+        for off, frag in self._frags:
+            frag_end = off + len(frag)
+            if off < cut:
+                pieces.append(frag[:cut - off] if frag_end > cut else frag)
+            if frag_end > cut:
+                keep.append((cut, frag[cut - off:]) if off < cut else (off, frag))
+        self._frags = keep
+        self._au_start = cut
+        self.access_units += 1
+
+        if len(pieces) == 1 and pieces[0].nbytes == len(pieces[0].obj):
+            return pieces[0].obj # Whole pipe read: zero-copy
+        unit = b"".join(pieces)
+        self.bytes_copied += len(unit)
+        return unit
+
+class OggPacketSplitter:
+    """
+    Incremental Ogg page parser yielding codec packets (Opus frames) from an FFmpeg pipe.
+    The OpusHead/OpusTags header packets are skipped. Pages are parsed in place through
+    a memoryview; each packet costs one copy (they are tiny, ~20 ms of Opus).
+    """
+    def __init__(self):
+        self._buf = bytearray()
+        self._carry = b"" # Packet continued on the next page
+        self.packets = 0
+
+    def feed(self, chunk):
+        self._buf += chunk
+        buf = self._buf
+        out = []
+        pos = 0
+        mv = memoryview(buf)
+        try:
+            while len(buf) - pos >= 27:
+                if mv[pos:pos + 4] != b"OggS":
+                    nxt = buf.find(b"OggS", pos + 1)
+                    if nxt < 0:
+                        pos = max(pos, len(buf) - 3)
+                        break
+                    logger.warning(f"[OGG] Resync: skipped {nxt - pos} bytes")
+                    pos = nxt
+                    continue
+                nsegs = buf[pos + 26]
+                body = pos + 27 + nsegs
+                if len(buf) < body:
+                    break
+                lacing = bytes(mv[pos + 27:body])
+                if len(buf) < body + sum(lacing):
+                    break
+                start = cur = body
+                for lace in lacing:
+                    cur += lace
+                    if lace < 255:
+                        packet = self._carry + bytes(mv[start:cur]) if self._carry else bytes(mv[start:cur])
+                        self._carry = b""
+                        start = cur
+                        if not (packet.startswith(b"OpusHead") or packet.startswith(b"OpusTags")):
+                            out.append(packet)
+                            self.packets += 1
+                if start < cur:
+                    self._carry += bytes(mv[start:cur])
+                pos = cur
+        finally:
+            mv.release()
+        del self._buf[:pos]
+        return out
@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+import fractions
+import numpy as np
+import av
+from av.video.frame import PictureType
+from latency_probe import stamp_frame, stamp_ms
+
+logger = logging.getLogger("NeonEngine")
+
+# Encoder reopen (bitrate/GOP change) is throttled: every reopen starts with an IDR
+MIN_REOPEN_INTERVAL = 1.0
+# Bitrate changes smaller than this fraction are not worth an IDR
+MIN_BITRATE_CHANGE = 0.05
+# stop() waits this long for the thread to finish its current frame and close the input
+STOP_TIMEOUT = 1.0
+
+def intra_refresh_options(codec_name):
+    """
+    Encoder options for periodic intra refresh (a column of intra blocks sweeping the
+    picture once per GOP instead of a full IDR), or None if the encoder has none.
+    """
+    if "nvenc" in codec_name:
+        return {"intra-refresh": "1"}
+    if "qsv" in codec_name:
+        return {"int_ref_type": "vertical", "int_ref_cycle_size": "8"}
+    if "amf" in codec_name:
+        return {"intra_refresh_mb": "255"}
+    if "x264" in codec_name:
+        return {"intra-refresh": "1"}
+    return None # h264_vaapi: not exposed by FFmpeg
+
+def encoder_options(codec_name, bitrate, gop, intra_refresh=False, preset=None):
+    """Low-latency CBR-like options per encoder, mirroring the FFmpeg CLI path (preset: libx264 only)."""
+    options = _encoder_options(codec_name, bitrate, preset)
+    if intra_refresh:
+        options.update(intra_refresh_options(codec_name) or {})
+    return options
+
+def _encoder_options(codec_name, bitrate, preset=None):
+    kbps = max(1, int(bitrate // 1000))
+    if "nvenc" in codec_name:
+        return {
+            "preset": "p1", "tune": "ull", "zerolatency": "1", "delay": "0",
+            "rc": "cbr", "forced-idr": "1",
+            "maxrate": f"{kbps}k", "bufsize": f"{max(1, kbps // 10)}k",
+        }
+    if "qsv" in codec_name:
+        return {
+            "preset": "veryfast", "async_depth": "1", "look_ahead": "0", "forced_idr": "1",
+            "maxrate": f"{kbps}k", "bufsize": f"{max(1, kbps // 10)}k",
+        }
+    if "amf" in codec_name:
+        return {
+            "usage": "ultralowlatency", "quality": "speed", "rc": "cbr",
+            "maxrate": f"{kbps}k", "bufsize": f"{max(1, kbps // 10)}k",
+        }
+    return {
+        "preset": preset or "ultrafast", "tune": "zerolatency", "forced-idr": "1",
+        "maxrate": f"{kbps}k", "bufsize": f"{max(1, kbps // 10)}k",
+        "x264-params": "scenecut=0:bframes=0:repeat-headers=1",
+    }
+
+class PyAVVideoEngine:
+    """
+    In-process capture + H.264 encode with PyAV (x11grab or any lavfi/file input).
+
+    Runs on its own thread (off the event loop) and hands Annex-B access units to
+    on_packet(data, capture_time). Unlike the FFmpeg CLI pipe, the encoder can be
+    steered while running: keyframe requests apply to the very next frame; bitrate,
+    GOP and resolution changes reopen the encoder in place (PyAV keeps rc_max_rate
+    read-only, so x264's VBV cannot be retargeted on an open context). No process restart,
+    no pipe copy.
+    """
+    def __init__(self, input_url, input_format, input_options, width, height, fps,
+                 codec_name="libx264", bitrate=5000000, gop=60, on_packet=None, config=None,
+                 idle_detector=None, intra_refresh=False, latency_probe=False):
+        self.input_url = input_url
+        self.input_format = input_format
+        self.input_options = dict(input_options or {})
+        self.width = width
+        self.height = height
+        self.fps = fps # Encode rate; the input keeps grabbing at input_fps and is decimated
+        self.input_fps = fps
+        self.codec_name = codec_name
+        self.bitrate = int(bitrate)
+        self.gop = int(gop)
+        self.on_packet = on_packet
+        self.config = config # Live dict (compat.ENCODER_CONFIG) watched for "bitrate"/"gop"
+        self.idle_detector = idle_detector # StaticSceneDetector: static frames are never encoded
+        self.intra_refresh = intra_refresh and intra_refresh_options(codec_name) is not None
+        self.latency_probe = latency_probe # Stamp the glass-to-glass marker into every encoded frame
+        self._config_seen = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._force_key = False
+        self._running = False
+        self._thread = None
+        self._encoder = None
+        self._last_open = 0.0
+        self._next_due = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.packets = 0
+        self.keyframes = 0
+        self.reopens = 0
+        self.encode_ms_avg = 0.0
+        self.error = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="NeonPyAVEngine")
+        self._thread.start()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        # The thread notices on the next frame; closing the container from here would race it
+        self._running = False
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout) # No packet from this engine once stop() returns
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_bitrate(self, bps):
+        with self._lock:
+            self._pending["bitrate"] = int(bps)
+
+    def set_gop(self, frames):
+        with self._lock:
+            self._pending["gop"] = max(1, int(frames))
+
+    def set_fps(self, fps):
+        with self._lock:
+            self._pending["fps"] = max(1, min(int(fps), self.input_fps))
+
+    def set_resolution(self, width, height):
+        with self._lock:
+            self._pending["size"] = (int(width), int(height))
+
+    def request_keyframe(self):
+        self._force_key = True
+
+    def encode_load(self):
+        """Fraction of the frame budget spent in the encoder (>= 1.0: falling behind)."""
+        return self.encode_ms_avg * self.fps / 1000.0
+
+    def stats(self):
+        return {
+            "engine": "pyav",
+            "codec": self.codec_name,
+            "bitrate": self.bitrate,
+            "gop": self.gop,
+            "intra_refresh": self.intra_refresh,
+            "resolution": f"{self.width}x{self.height}",
+            "fps": self.fps,
+            "skipped": self.skipped,
+            "frames": self.frames,
+            "packets": self.packets,
+            "keyframes": self.keyframes,
+            "reopens": self.reopens,
+            "encode_ms_avg": round(self.encode_ms_avg, 2),
+        }
+
+    def _open_encoder(self):
+        try:
+            enc = self._create_encoder(self.codec_name)
+        except Exception as e:
+            if self.codec_name == "libx264":
+                raise
+            logger.warning(f"[ENGINE] {self.codec_name} unavailable ({e}), falling back to libx264")
+            self.codec_name = "libx264"
+            enc = self._create_encoder(self.codec_name)
+        self._encoder = enc
+        self._last_open = time.monotonic()
+        logger.info(f"[ENGINE] {self.codec_name} {self.width}x{self.height}@{self.fps} | {self.bitrate // 1000} kbps | GOP {self.gop}")
+
+    def _create_encoder(self, codec_name):
+        enc = av.CodecContext.create(codec_name, "w")
+        enc.width = self.width
+        enc.height = self.height
+        enc.pix_fmt = "yuv420p"
+        enc.time_base = fractions.Fraction(1, self.fps)
+        enc.framerate = self.fps
+        enc.bit_rate = self.bitrate
+        enc.gop_size = self.gop
+        enc.options = encoder_options(codec_name, self.bitrate, self.gop, self.intra_refresh,
+                                      preset=(self.config or {}).get("preset"))
+        enc.open()
+        return enc
+
+    def _watch_config(self):
+        if not self.config:
+            return
+        for key in ("bitrate", "gop"):
+            value = self.config.get(key)
+            if value is None or self._config_seen.get(key) == value:
+                continue
+            first = key not in self._config_seen
+            self._config_seen[key] = value
+            if not first:
+                with self._lock:
+                    self._pending[key] = int(value)
+
+    def _apply_pending(self):
+        self._watch_config()
+        with self._lock:
+            if not self._pending or time.monotonic() - self._last_open < MIN_REOPEN_INTERVAL:
+                return
+            pending, self._pending = self._pending, {}
+
+        reopen = False
+        bitrate = pending.get("bitrate")
+        if bitrate and abs(bitrate - self.bitrate) > self.bitrate * MIN_BITRATE_CHANGE:
+            self.bitrate = bitrate
+            reopen = True
+        gop = pending.get("gop")
+        if gop and gop != self.gop:
+            self.gop = gop
+            reopen = True
+        fps = pending.get("fps")
+        if fps and fps != self.fps:
+            self.fps = fps # Reopen: time base and per-frame rate control budget change
+            reopen = True
+        size = pending.get("size")
+        if size and size != (self.width, self.height):
+            self.width, self.height = size
+            reopen = True
+        if reopen:
+            self.reopens += 1
+            self._open_encoder() # Old context is just dropped: zerolatency holds no frames
+
+    def _decimate(self, capture_time):
+        """True when this input frame is dropped to bring input_fps down to fps."""
+        if self.fps >= self.input_fps:
+            return False
+        # Half an input frame of slack so capture jitter doesn't skip a frame that is due
+        if capture_time < self._next_due - 0.5 / self.input_fps:
+            return True
+        interval = 1.0 / self.fps
+        self._next_due = max(self._next_due + interval, capture_time)
+        return False
+
+    def _run(self):
+        container = None
+        try:
+            container = av.open(self.input_url, format=self.input_format, options=self.input_options)
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            self._open_encoder()
+
+            for frame in container.decode(stream):
+                if not self._running:
+                    break
+                capture_time = time.monotonic()
+                self._apply_pending()
+                if self._decimate(capture_time):
+                    self.skipped += 1
+                    continue
+
+                frame = frame.reformat(width=self.width, height=self.height, format="yuv420p")
+                if self.idle_detector is not None:
+                    plane = frame.planes[0]
+                    luma = np.frombuffer(plane, np.uint8).reshape(-1, plane.line_size)[:self.height, :self.width]
+                    if self.idle_detector.check(luma, capture_time):
+                        continue
+                if self.latency_probe:
+                    stamp_frame(frame, stamp_ms()) # After the idle check: the marker changes every frame
+                frame.pts = self.frames
+                frame.time_base = self._encoder.time_base
+                if self._force_key:
+                    self._force_key = False
+                    frame.pict_type = PictureType.I
+                else:
+                    frame.pict_type = PictureType.NONE
+                self.frames += 1
+
+                t0 = time.perf_counter()
+                packets = self._encoder.encode(frame)
+                encode_ms = (time.perf_counter() - t0) * 1000
+                self.encode_ms_avg = encode_ms if self.frames == 1 else self.encode_ms_avg * 0.95 + encode_ms * 0.05
+
+                for packet in packets:
+                    self.packets += 1
+                    if packet.is_keyframe:
+                        self.keyframes += 1
+                    if self.on_packet:
+                        self.on_packet(bytes(packet), capture_time)
+        except Exception as e:
+            self.error = str(e)
+            if self._running:
+                logger.error(f"[ENGINE] Capture/encode loop failed: {e}")
+        finally:
+            self._running = False
+            if container:
+                try: container.close()
+                except: pass
@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("NeonRate")
+
+# Floor of the adaptive range: below this a 1080p stream is mush anyway, --dynamic-scale should act
+MIN_BITRATE_BPS = 500000
+RATE_CONTROL_INTERVAL = 1.0 # One AIMD step per second (about one RTCP RR from browsers)
+
+# Loss-based controller (GCC, draft-ietf-rmcat-gcc section 6)
+LOSS_DECREASE = 0.10 # Above: back off by half the loss
+LOSS_INCREASE = 0.02 # Below: probe upwards
+INCREASE_PER_SECOND = 1.08
+# Delay-based stand-in: RTT rising this far over its minimum means queues are building up
+RTT_RISE_MS = 100
+OVERUSE_BACKOFF = 0.85 # Of the rate the client actually receives
+RECEIVE_HEADROOM = 1.5 # Increases never go past this multiple of the received rate
+MIN_CHANGE = 0.05 # Smaller retunes are not worth an encoder reopen
+
+class BitrateController:
+    """
+    Per-session AIMD rate control (--adaptive-bitrate).
+
+    Fed with RTCP receiver reports (loss fraction, RTT), REMB from the browser and the
+    client's STATS messages (received Mbps, RTT). Every update() takes one step:
+
+    * loss over 10%: target *= 1 - loss / 2
+    * loss between 2% and 10%: hold
+    * loss under 2%: target grows 8% per second, never past 1.5x what the client
+      actually receives (no point probing far above a link that isn't even full)
+    * RTT more than 100 ms over the lowest seen: target = 0.85x the received rate
+      (bufferbloat shows up as delay long before loss)
+    * REMB is a hard cap
+
+    The target stays between min_bps and max_bps (the configured bitrate).
+    """
+    def __init__(self, max_bps, min_bps=MIN_BITRATE_BPS, start_bps=None,
+                 feedback_timeout=5.0, clock=time.monotonic):
+        self.max_bps = int(max_bps)
+        self.min_bps = min(int(min_bps), self.max_bps)
+        self.target = int(start_bps or max_bps)
+        self.applied = self.target # Last target handed to the encoder
+        self.feedback_timeout = feedback_timeout
+        self._clock = clock
+        self._loss = None # (fraction, time)
+        self._rtt = None # (ms, time)
+        self._rtt_min = None
+        self._remb = None # (bps, time)
+        self._received = None # (bps, time), from the client STATS
+        self._last_update = None
+        self.state = "hold"
+        self.decreases = 0
+        self.increases = 0
+        self.events = deque(maxlen=50)
+
+    def report_loss(self, fraction, rtt_ms=None):
+        now = self._clock()
+        self._loss = (max(0.0, float(fraction or 0.0)), now)
+        if rtt_ms is not None:
+            self._report_rtt(rtt_ms, now)
+
+    def report_remb(self, bps):
+        """Receiver estimated maximum bitrate (may come from the encoder thread)."""
+        self._remb = (int(bps), self._clock())
+
+    def report_client(self, received_mbps=None, rtt_ms=None):
+        now = self._clock()
+        if received_mbps:
+            self._received = (float(received_mbps) * 1e6, now)
+        if rtt_ms:
+            self._report_rtt(rtt_ms, now)
+
+    def _report_rtt(self, rtt_ms, now):
+        rtt_ms = float(rtt_ms)
+        self._rtt = (rtt_ms, now)
+        if self._rtt_min is None or rtt_ms < self._rtt_min:
+            self._rtt_min = rtt_ms
+
+    def _fresh(self, sample, now):
+        if sample is None or now - sample[1] > self.feedback_timeout:
+            return None
+        return sample[0]
+
+    def update(self, now=None):
+        """One control step; returns the new target (bps) when it moved enough to retune, else None."""
+        now = self._clock() if now is None else now
+        dt = 1.0 if self._last_update is None else min(max(now - self._last_update, 0.0), 5.0)
+        self._last_update = now
+        loss = self._fresh(self._loss, now)
+        rtt = self._fresh(self._rtt, now)
+        remb = self._fresh(self._remb, now)
+        received = self._fresh(self._received, now)
+
+        target = self.target
+        reason = None
+        if loss is not None and loss > LOSS_DECREASE:
+            target = target * (1.0 - 0.5 * loss)
+            self.state, reason = "decrease", f"loss {loss * 100:.1f}%"
+        elif rtt is not None and self._rtt_min is not None and rtt - self._rtt_min > RTT_RISE_MS:
+            target = min(target, OVERUSE_BACKOFF * (received or target))
+            self.state, reason = "decrease", f"rtt {rtt:.0f} ms (min {self._rtt_min:.0f})"
+        elif loss is not None and loss >= LOSS_INCREASE:
+            self.state = "hold"
+        else:
+            grown = target * INCREASE_PER_SECOND ** dt
+            if received is not None:
+                grown = min(grown, max(target, RECEIVE_HEADROOM * received))
+            target = grown
+            self.state = "increase"
+        if remb is not None and target > remb:
+            target = remb
+            reason = reason or f"remb {remb / 1000:.0f} kbps"
+
+        target = int(max(self.min_bps, min(target, self.max_bps)))
+        if target < self.target:
+            self.decreases += 1
+        elif target > self.target:
+            self.increases += 1
+        self.target = target
+
+        if abs(target - self.applied) < self.applied * MIN_CHANGE:
+            return None
+        self.events.append({"time": time.time(), "from": self.applied, "to": target, "reason": reason or self.state})
+        logger.info(f"[RATE] {self.applied // 1000} -> {target // 1000} kbps ({reason or self.state})")
+        self.applied = target
+        return target
+
+    def stats(self):
+        now = self._clock()
+        loss = self._fresh(self._loss, now)
+        received = self._fresh(self._received, now)
+        remb = self._fresh(self._remb, now)
+        return {
+            "target_kbps": self.target // 1000,
+            "applied_kbps": self.applied // 1000,
+            "max_kbps": self.max_bps // 1000,
+            "state": self.state,
+            "loss": None if loss is None else round(loss, 3),
+            "rtt_ms": self._fresh(self._rtt, now),
+            "rtt_min_ms": self._rtt_min,
+            "received_kbps": None if received is None else int(received // 1000),
+            "remb_kbps": None if remb is None else remb // 1000,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "events": list(self.events)[-10:],
+        }
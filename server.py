@@ -5,6 +5,7 @@ import time
 import json
 import logging
 import uuid
+import copy
 import signal
 if os.name != "nt":
     import resource
@@ -23,8 +24,20 @@ def get_resource_path(relative_path):
 
 # Import local modules
 import compat # Apply monkeypatches
-from capture_system import MediaCaptureSystem
+from capture_system import MediaCaptureSystem, video_profile, audio_profile, IS_WINDOWS
+from capture_pool import CapturePool
+import encoder_probe
+import capture_hub
+import capture_sources
+from rate_control import RATE_CONTROL_INTERVAL
+import telemetry
+import latency_probe
 from input_manager import InputManager
+import input_thread
+import input_protocol
+from input_latency import InputLatency, CLOCK_PING_BURST, CLOCK_PING_BURST_GAP, CLOCK_PING_INTERVAL
+from input_guard import InputGuard, INPUT_RATE_LIMIT
+from gamepad_pool import GamepadPool, GAMEPAD_POOL_SIZE
 from game_library import GameLibrary
 
 def set_ram_limit(megabytes):
@@ -84,8 +97,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("NeonServer")
 
 ROOT = get_resource_path(".")
+MONITOR_INTERVAL = 5.0 # Seconds between monitor_pc's per-session log lines
 pcs = set()
 input_mgr = InputManager()
+# Input is applied on its own thread; started in main() (until then submit() applies inline)
+input_worker = input_thread.InputThread(input_mgr)
+input_latency = {} # pc_id -> InputLatency (clock sync + transit), /api/sessions/{id}/input
 game_library = GameLibrary()
 
 @web.middleware
@@ -97,6 +114,56 @@ async def request_logger(request, handler):
         logger.error("Error in handler %s: %s", request.path, e)
         raise
 
+def make_message_handler(pc, session, latency, guard=None):
+    """Data channel "message" handler of one session (binary input, PONG, STATS, PROBE, JSON input)."""
+    def on_message(message):
+        if guard is not None and not guard.allow():
+            return # --flood-protect: over this session's bucket, dropped before any parsing
+        try:
+            if isinstance(message, bytes):
+                try:
+                    _, _, seq, sent_ms = input_protocol.decode_header(message)
+                except ValueError as e:
+                    # Malformed: dropped here, before latency.stale (still the previous message's) is read
+                    logger.debug(f"[INPUT] Malformed binary message dropped: {e}")
+                    return
+                latency.received_input(seq, sent_ms)
+                if input_protocol.is_snapshot(message):
+                    # Full pad state: a stale one (reordered/duplicate) is superseded, never applied
+                    if latency.stale:
+                        latency.stale_snapshots += 1
+                        return
+                    input_worker.submit(input_thread.SNAPSHOT, message, session)
+                    return
+                input_worker.submit(input_thread.BATCH, message, session) # One per client poll tick
+                return
+            data = json.loads(message)
+            if data.get("type") == "PONG":
+                latency.pong(data)
+            elif data.get("type") == "STATS":
+                # Client-side quality stats into the session's telemetry (/api/sessions, /metrics)
+                session.record_client(data)
+                if hasattr(pc, "_capture_sys"):
+                    pc._capture_sys.report_client_stats(data) # Received rate + RTT for --adaptive-bitrate
+            elif data.get("type") == "PROBE":
+                # --latency-probe: marker stamp read back from a displayed frame
+                rtt = session.last("client_rtt_ms") or session.last("rr_rtt_ms") or 0
+                g2g_ms = latency_probe.glass_to_glass_ms(data.get("stamp"), uplink_ms=rtt / 2,
+                                                         display_ms=data.get("display_ms"))
+                if g2g_ms is not None:
+                    session.record_distribution("g2g_latency_ms", g2g_ms)
+                # logger.info(...) # Reduce stats noise
+            else:
+                # JSON fallback (old clients / codes missing from the binary table)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[INPUT DEBUG] Recv: {data}")
+                latency.received_input(data.get("seq"), data.get("t"))
+                input_worker.submit(input_thread.EVENT, data, session)
+        except Exception as e:
+            logger.error(f"Input Error: {e}")
+
+    return on_message
+
 async def offer(request):
     params = await request.json()
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
@@ -104,47 +171,99 @@ async def offer(request):
     pc = RTCPeerConnection()
     pc_id = str(uuid.uuid4())[:8]
     pcs.add(pc)
+    session = telemetry.store.open(pc_id)
+    latency = input_latency[pc_id] = InputLatency(session)
+    guard = InputGuard(pc_id, session, rate=args.input_rate_limit) if args.flood_protect else None
+    latency.guard = guard
+    if input_mgr.pool is not None:
+        input_mgr.pool.allocate(pc_id) # Player 1's pad is ready before the first press
 
     logger.info("[%s] Connection started", pc_id)
 
     @pc.on("datachannel")
     def on_datachannel(channel):
-        @channel.on("message")
-        def on_message(message):
-            try:
-                data = json.loads(message)
-                if data.get("type") == "STATS":
-                    # Log client-side latency and quality stats
-                    audio = data.get("audio", {})
-                    # logger.info(...) # Reduce stats noise
-                else:
-                    logger.info(f"[INPUT DEBUG] Recv: {data}")
-                    input_mgr.handle_input(data)
-            except Exception as e:
-                logger.error(f"Input Error: {e}")
+        channel.on("message", make_message_handler(pc, session, latency, guard))
+
+        async def clock_sync():
+            """PING the client (it answers PONG with its clock) for the input transit offset."""
+            sent = 0
+            while channel.readyState != "closed" and pc.connectionState not in ['closed', 'failed']:
+                if channel.readyState == "open":
+                    channel.send(json.dumps(latency.ping()))
+                    sent += 1
+                await asyncio.sleep(CLOCK_PING_BURST_GAP if sent < CLOCK_PING_BURST else CLOCK_PING_INTERVAL)
+
+        asyncio.create_task(clock_sync())
 
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
         logger.info("[%s] Connection state is %s", pc_id, pc.connectionState)
         if pc.connectionState in ["failed", "closed"]:
             if hasattr(pc, "_capture_sys"):
-                pc._capture_sys.cleanup()
+                pc._capture_sys.stop() # Releases this viewer's hub subscriptions
             await pc.close()
             pcs.discard(pc)
+            telemetry.store.close(pc_id)
+            input_latency.pop(pc_id, None)
+            if input_mgr.pool is not None and not input_worker.submit(input_thread.RELEASE, None, session):
+                input_mgr.pool.release(pc_id) # Queue full: free the slots without the neutral write
             logger.info("[%s] Connection closed", pc_id)
 
-    # Performance monitoring task
+    # Performance monitoring task: one getStats pass per interval feeds telemetry, the
+    # governors and (--adaptive-bitrate, every second) the AIMD step; logs every MONITOR_INTERVAL
     async def monitor_pc():
+        interval = RATE_CONTROL_INTERVAL if args.adaptive_bitrate else MONITOR_INTERVAL
+        log_every = max(1, round(MONITOR_INTERVAL / interval))
+        tick = 0
         while pc.connectionState not in ['closed', 'failed']:
             try:
-                await asyncio.sleep(5)
+                await asyncio.sleep(interval)
+                tick += 1
+                log = tick % log_every == 0
                 for sender in pc.getSenders():
                     if sender.track:
                         stats = await sender.getStats()
                         for stat in stats.values():
                             if stat.type == 'outbound-rtp':
-                                logger.info("[%s] RTP Stats (%s): Packets Sent: %d, Bytes: %d", 
-                                            pc_id, sender.track.kind, stat.packetsSent, stat.bytesSent)
+                                if log:
+                                    logger.info("[%s] RTP Stats (%s): Packets Sent: %d, Bytes: %d", 
+                                                pc_id, sender.track.kind, stat.packetsSent, stat.bytesSent)
+                                session.record_outbound(sender.track.kind, stat.packetsSent, stat.bytesSent)
+                            elif stat.type == 'remote-inbound-rtp' and sender.track.kind == "video" and hasattr(pc, "_capture_sys"):
+                                # RTCP RR: fraction_lost is 8-bit fixed point, RTT in seconds
+                                rtt = stat.roundTripTime * 1000 if stat.roundTripTime is not None else None
+                                pc._capture_sys.report_network(stat.fractionLost / 256.0, rtt)
+                                session.record_receiver_report(stat.fractionLost / 256.0, rtt)
+                if hasattr(pc, "_capture_sys") and args.adaptive_bitrate:
+                    pc._capture_sys.update_bitrate() # Latest RTCP RR + client stats, one AIMD step
+                if hasattr(pc, "_capture_sys") and log:
+                    sync = pc._capture_sys.sync_stats()
+                    if "av_sync_ms" in sync:
+                        streams = sync["streams"]
+                        logger.info("[%s] A/V Sync: %+.1f ms | Audio drift %+.1f ms (%d resyncs) | Video max gap %.1f ms",
+                                    pc_id, sync["av_sync_ms"], streams["audio"]["drift_ms"],
+                                    streams["audio"]["resyncs"], streams["video"]["max_interval_ms"])
+                    fps = pc._capture_sys.fps_stats()
+                    logger.info("[%s] Video FPS: %.1f achieved / %s target (base %d)",
+                                pc_id, fps["achieved"], fps["target"], fps["base"])
+                    idle = pc._capture_sys.idle_stats()
+                    if idle:
+                        logger.info("[%s] Idle skip: %.1f%% of frames skipped", pc_id, idle["skipped_fraction"] * 100)
+                    rate = pc._capture_sys.bitrate_stats()
+                    session.record_capture(fps, rate)
+                    transit = session.distribution("input_transit_ms")
+                    applied = session.distribution("input_latency_ms")
+                    if transit and applied:
+                        logger.info("[%s] Input: transit p50 %.1f ms / p99 %.1f ms | server p50 %.2f ms / p99 %.2f ms | lost %d",
+                                    pc_id, transit["p50"], transit["p99"], applied["p50"], applied["p99"], latency.lost)
+                    g2g = session.distribution("g2g_latency_ms")
+                    if g2g:
+                        logger.info("[%s] Glass-to-glass: p50 %.0f ms | p90 %.0f ms | p99 %.0f ms (%d frames)",
+                                    pc_id, g2g["p50"], g2g["p90"], g2g["p99"], g2g["count"])
+                    if rate:
+                        logger.info("[%s] Bitrate: %d kbps target / %d kbps encoder (%s, loss %s, received %s kbps)",
+                                    pc_id, rate["target_kbps"], rate["encoder_kbps"], rate["state"],
+                                    rate["loss"], rate["received_kbps"])
             except Exception as e:
                 logger.error("[%s] Stats error: %s", pc_id, e)
                 break
@@ -152,7 +271,13 @@ async def offer(request):
     asyncio.create_task(monitor_pc())
 
     # Initialize Capture System (Audio + Video Together)
-    capture_sys = MediaCaptureSystem(pc_id, args)
+    session_args = args
+    if "idle_skip" in params:
+        # Per-session override (e.g. on for launcher/desktop sessions, off for games)
+        session_args = copy.copy(args)
+        session_args.idle_skip = bool(params["idle_skip"])
+    capture_sys = MediaCaptureSystem(pc_id, session_args)
+    pc._capture_sys = capture_sys
     await capture_sys.setup_tracks(pc)
     
     logger.info("[%s] Sistema de Captura AV Assíncrono Pronto", pc_id)
@@ -163,7 +288,8 @@ async def offer(request):
 
     return web.Response(
         content_type="application/json",
-        text=json.dumps({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}),
+        text=json.dumps({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type,
+                         "probe": bool(args.latency_probe)}),
     )
 
 async def index(request):
@@ -205,6 +331,11 @@ async def on_shutdown(app):
     coros = [pc.close() for pc in pcs]
     await asyncio.gather(*coros)
     pcs.clear()
+    input_worker.stop()
+    # Warm pool pipelines have no peer connection to close them
+    if capture_hub.hub.pool:
+        capture_hub.hub.pool.stop()
+    capture_hub.hub.stop_all()
 
 def cleanup_orphan_processes():
     """Kills any leftover neon_video FFmpeg processes from previous runs."""
@@ -220,6 +351,14 @@ def cleanup_orphan_processes():
     except Exception as e:
         logger.warning(f"Failed to cleanup orphan processes: {e}")
 
+# /api/quality presets: (resolution, bitrate kbps)
+QUALITY_PRESETS = {
+    "720p": ("1280x720", 25000),  # High quality 720p (25 Mbps) - Unlocked Network
+    "1080p": ("1920x1080", 20000),
+    "2k": ("2560x1440", 35000),
+    "4k": ("3840x2160", 55000),
+}
+
 def main():
     parser = argparse.ArgumentParser(description="Neon Stream Server")
     parser.add_argument("--port", type=int, default=8080)
@@ -227,27 +366,40 @@ def main():
     parser.add_argument("--fps", type=int, default=60)
     parser.add_argument("--bitrate", type=int, default=20000) # kbps
     parser.add_argument("--bitrate-auto", action="store_true")
-    parser.add_argument("--encoder", default="auto")
+    parser.add_argument("--encoder", default="auto") # auto = fastest working encoder from the probe cache
+    parser.add_argument("--probe-encoders", action="store_true") # Benchmark encoders, print the table and exit
     parser.add_argument("--codec", default="h264")
     parser.add_argument("--audio-bitrate", type=int, default=128)
+    parser.add_argument("--audio-latency", default="low") # low/normal/high: audio queue target
+    parser.add_argument("--buffer-audio", default="0") # ms, overrides --audio-latency when > 0
     parser.add_argument("--region", default="full")
+    parser.add_argument("--engine", default="ffmpeg") # ffmpeg (CLI pipe) / pyav (in-process, live bitrate/GOP)
+    parser.add_argument("--gop", default="60") # Keyframe interval (frames), live with --engine pyav
+    parser.add_argument("--intra-refresh", action="store_true") # Sweep intra blocks over each GOP instead of full IDRs
+    parser.add_argument("--capture-pool", type=int, default=0) # Idle capture pipelines kept warm per kind (0 = off: nothing captured without a viewer)
+    parser.add_argument("--pool-profiles", default="") # Extra qualities to pre-spawn, e.g. "720p,1080p"
+    parser.add_argument("--dynamic-scale", action="store_true") # Step resolution down/up with encoder load and packet loss
+    parser.add_argument("--adaptive-fps", action="store_true") # Step frame rate (60/45/30) down/up the same way
+    parser.add_argument("--idle-skip", action="store_true") # Skip static frames (offer "idle_skip" overrides per session)
+    parser.add_argument("--idle-fps", type=float, default=2.0) # Keep-alive frame rate while the scene is static
+    parser.add_argument("--capture-backend", default="x11") # x11 / synthetic (lavfi testsrc2 + sine) / file
+    parser.add_argument("--capture-file", default=None) # Video file looped by --capture-backend file
+    parser.add_argument("--latency-probe", action="store_true") # Stamp a timecode into frames, client reports glass-to-glass latency
+    parser.add_argument("--adaptive-bitrate", action="store_true") # Per-session AIMD on RTCP/REMB/client stats, --bitrate is the ceiling
+    parser.add_argument("--input-priority", default="high", choices=input_thread.INPUT_PRIORITIES) # Input thread: normal / high (nice) / realtime (SCHED_FIFO)
+    parser.add_argument("--flood-protect", action="store_true") # Per-session token bucket on data channel messages
+    parser.add_argument("--gamepad-pool", type=int, default=GAMEPAD_POOL_SIZE) # Virtual pads pre-created for sessions (0 = lazy, shared indices)
+    parser.add_argument("--input-rate-limit", type=float, default=INPUT_RATE_LIMIT) # Messages/s per session with --flood-protect
     # Ignored legacy args for compatibility with GUI
-    parser.add_argument("--capture-backend", default="x11")
-    parser.add_argument("--gop", default="60")
     parser.add_argument("--h264-profile", default="baseline")
     parser.add_argument("--bframes", default="0")
     parser.add_argument("--latency-preset", default="ultrafast")
     parser.add_argument("--buffer-video", default="0")
-    parser.add_argument("--audio-latency", default="low")
-    parser.add_argument("--buffer-audio", default="0")
     parser.add_argument("--monitor", default="primary")
     parser.add_argument("--process-priority", default="normal")
     parser.add_argument("--echo-cancel", action="store_true")
     parser.add_argument("--frame-drop", action="store_true")
     parser.add_argument("--capture-cursor", action="store_true")
-    parser.add_argument("--dynamic-scale", action="store_true")
-    parser.add_argument("--adaptive-bitrate", action="store_true")
-    parser.add_argument("--adaptive-fps", action="store_true")
     parser.add_argument("--bad-connection-mode", action="store_true")
     parser.add_argument("--audio-gpu", action="store_true")
     parser.add_argument("--cpu-affinity", default="all")
@@ -259,6 +411,11 @@ def main():
     global args # Keep args global for access in other functions
     args = parser.parse_args()
 
+    if args.probe_encoders:
+        logging.getLogger("NeonProbe").setLevel(logging.INFO)
+        print(encoder_probe.format_table(encoder_probe.probe(force=True)))
+        return
+
     # --- CLEAN SLATE ---
     cleanup_orphan_processes()
 
@@ -308,6 +465,15 @@ def main():
         except Exception as e:
             logger.warning("Could not set CPU affinity: %s", e)
 
+    source = capture_sources.get_source(args.capture_backend)
+    ok, reason = source.available(args)
+    logger.info(f"Capture source: {source.name}" + ("" if ok else f" (UNAVAILABLE: {reason})"))
+
+    # Resolve --encoder auto from the (cached) encoder benchmark
+    probe_preset = None
+    if args.encoder.lower() == "auto":
+        args.encoder, probe_preset = encoder_probe.pick_encoder()
+
     # Apply settings to Compat layer
     import compat
     compat.ENCODER_CONFIG["bitrate"] = args.bitrate * 1000 # Convert kbps to bps
@@ -317,6 +483,8 @@ def main():
     compat.ENCODER_CONFIG["adaptive_bitrate"] = args.adaptive_bitrate
     compat.ENCODER_CONFIG["adaptive_fps"] = args.adaptive_fps
     compat.ENCODER_CONFIG["bad_connection_mode"] = args.bad_connection_mode
+    compat.ENCODER_CONFIG["gop"] = int(args.gop)
+    compat.ENCODER_CONFIG["intra_refresh"] = args.intra_refresh
     
     if args.encoder == "vaapi":
         compat.ENCODER_CONFIG["name"] = "h264_vaapi"
@@ -328,13 +496,9 @@ def main():
         compat.ENCODER_CONFIG["name"] = "h264_qsv"
     else:
         compat.ENCODER_CONFIG["name"] = "libx264"
-        # Mapeia presets do GUI para presets reais do x264
-        preset_map = {
-            "ultra_baixa": "ultrafast",
-            "baixa": "superfast",
-            "balanceada": "veryfast"
-        }
-        compat.ENCODER_CONFIG["preset"] = preset_map.get(args.latency_preset.lower(), "ultrafast")
+        # ultrafast unless --encoder auto benchmarked a slower preset that still keeps up
+        # (--latency-preset stays a legacy GUI arg)
+        compat.ENCODER_CONFIG["preset"] = probe_preset or "ultrafast"
         compat.ENCODER_CONFIG["tune"] = "zerolatency"
 
     logger.info("Starting Neon Server on port %d...", args.port)
@@ -343,11 +507,36 @@ def main():
     app = web.Application()
     app.middlewares.append(request_logger)
     app.on_shutdown.append(on_shutdown)
+
+    if args.gamepad_pool > 0:
+        pool = GamepadPool(input_mgr.create_gamepad, size=args.gamepad_pool)
+        pool.start()
+        input_mgr.attach_pool(pool)
+    input_worker.priority = args.input_priority
+    input_worker.start()
     
     # Start memory monitoring
     async def start_monitors(app):
         asyncio.create_task(monitor_memory(args.mem_limit))
     app.on_startup.append(start_monitors)
+
+    # Pre-spawn capture pipelines so /offer finds them running
+    async def start_capture_pool(app):
+        if IS_WINDOWS or args.capture_pool <= 0:
+            return
+        pool = CapturePool(capture_hub.hub, size=args.capture_pool)
+        pool.pin("video", *video_profile(args))
+        pool.pin("audio", *audio_profile(args))
+        for quality in filter(None, (q.strip().lower() for q in args.pool_profiles.split(","))):
+            if quality not in QUALITY_PRESETS:
+                logger.warning("Unknown pool profile: %s", quality)
+                continue
+            profile_args = copy.copy(args)
+            profile_args.resolution, profile_args.bitrate = QUALITY_PRESETS[quality]
+            pool.pin("video", *video_profile(profile_args))
+        pool.start()
+        logger.info("Capture pool started (%d per kind)", args.capture_pool)
+    app.on_startup.append(start_capture_pool)
     
     app.router.add_get("/", index)
     app.router.add_get("/client.js", javascript)
@@ -359,35 +548,72 @@ def main():
     async def set_settings(request):
         try:
             data = await request.json()
+            response = {"status": "ok"}
             if "bitrate" in data:
                 new_bitrate = int(data["bitrate"]) * 1000 # kbps to bps
-                # Update global config which the encoder monkeypatch reads
+                # Update global config which the encoder monkeypatch and the PyAV engine read
                 compat.ENCODER_CONFIG["bitrate"] = new_bitrate
+                # Running capture encoders too (the FFmpeg CLI is respawned)
+                for src in capture_hub.hub.sources("video"):
+                    src.reconfigure(bitrate=new_bitrate)
                 logger.info("Dynamic Bitrate Update: %d bps", new_bitrate)
-                return web.json_response({"status": "ok", "bitrate": new_bitrate})
+                response["bitrate"] = new_bitrate
+            if "gop" in data:
+                compat.ENCODER_CONFIG["gop"] = max(1, int(data["gop"]))
+                logger.info("Dynamic GOP Update: %d frames", compat.ENCODER_CONFIG["gop"])
+                response["gop"] = compat.ENCODER_CONFIG["gop"]
+            if data.get("keyframe"):
+                applied = [src.reconfigure(keyframe=True) for src in capture_hub.hub.sources("video")]
+                response["keyframe"] = any(applied)
+            return web.json_response(response)
         except Exception as e:
             return web.json_response({"status": "error", "message": str(e)}, status=500)
             
     app.router.add_post("/api/settings", set_settings)
+
+    async def get_sessions(request):
+        # ?points=N trims every series to its last N samples
+        try:
+            points = int(request.query.get("points", 0)) or None
+        except ValueError:
+            points = None
+        response = telemetry.store.to_json(points)
+        captures = {pc._capture_sys.pc_id: pc._capture_sys for pc in list(pcs) if hasattr(pc, "_capture_sys")}
+        for session in response["sessions"]:
+            capture_sys = captures.get(session["session"])
+            if capture_sys is not None:
+                session["capture"] = capture_sys.capture_stats()
+        response["pipelines"] = capture_hub.hub.stats() # Shared pipelines and every subscriber's queue
+        if capture_hub.hub.pool is not None:
+            response["capture_pool"] = capture_hub.hub.pool.stats() # Warm pipelines, session hits/misses
+        response["input"] = input_worker.stats()
+        if input_mgr.pool is not None:
+            response["input"]["gamepads"] = input_mgr.pool.stats()
+        return web.json_response(response)
+
+    async def metrics(request):
+        return web.Response(body=telemetry.store.prometheus().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def get_session_input(request):
+        latency = input_latency.get(request.match_info["session_id"])
+        if latency is None:
+            return web.json_response({"status": "error", "message": "unknown session"}, status=404)
+        stats = latency.stats()
+        if input_mgr.pool is not None:
+            stats["gamepads"] = input_mgr.pool.session_slots(request.match_info["session_id"])
+        return web.json_response(stats)
+
+    app.router.add_get("/api/sessions", get_sessions)
+    app.router.add_get("/api/sessions/{session_id}/input", get_session_input)
+    app.router.add_get("/metrics", metrics)
     
     async def set_quality(request):
         try:
             data = await request.json()
             quality = data.get("quality", "1080p")
             # Atualizar args globalmente para novas conexões
-            if quality == "720p":
-                args.resolution = "1280x720"
-                args.resolution = "1280x720"
-                args.bitrate = 25000  # High quality 720p (25 Mbps) - Unlocked Network
-            elif quality == "2k":
-                args.resolution = "2560x1440"
-                args.bitrate = 35000
-            elif quality == "4k":
-                args.resolution = "3840x2160"
-                args.bitrate = 55000
-            else:  # 1080p
-                args.resolution = "1920x1080"
-                args.bitrate = 20000
+            args.resolution, args.bitrate = QUALITY_PRESETS.get(quality, QUALITY_PRESETS["1080p"])
                 
             # Sync to encoder config
             compat.ENCODER_CONFIG["bitrate"] = args.bitrate * 1000
@@ -580,6 +580,7 @@ class ServerGUI:
         if v["dynamic_scale"].get(): cmd.append("--dynamic-scale")
         if v["adaptive_fps"].get(): cmd.append("--adaptive-fps")
         if v["adaptive_bitrate"].get(): cmd.append("--adaptive-bitrate")
+        if v["flood_protect"].get(): cmd.append("--flood-protect")
         if v["audio_gpu"].get(): cmd.append("--audio-gpu")
         
         if v["debug_mode"].get(): cmd.append("--debug")
@@ -199,6 +199,96 @@ class WebGLRenderer {
 // Initialize FSR Renderer
 const fsrRenderer = new WebGLRenderer(video, fsrCanvas);
 
+// ==========================================
+// Glass-to-glass latency probe (server --latency-probe)
+// ==========================================
+// The server stamps a row of blocks in the top-left corner of every frame:
+// [white][black][16 bits of its wall-clock ms, MSB first], block = frame height / 60.
+// Each displayed frame is read back through the WebGL context and the stamp is
+// echoed to the server, which turns it into a latency (see latency_probe.py).
+class LatencyProbe {
+    constructor(renderer, videoElement) {
+        this.gl = renderer.gl;
+        this.video = videoElement;
+        this.running = false;
+        this.lastStamp = null;
+        this.frames = 0;
+        this.misses = 0;
+        if (!this.gl) return;
+        const gl = this.gl;
+        this.texture = gl.createTexture();
+        gl.bindTexture(gl.TEXTURE_2D, this.texture);
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MIN_FILTER, gl.NEAREST);
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_MAG_FILTER, gl.NEAREST);
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_S, gl.CLAMP_TO_EDGE);
+        gl.texParameteri(gl.TEXTURE_2D, gl.TEXTURE_WRAP_T, gl.CLAMP_TO_EDGE);
+        this.framebuffer = gl.createFramebuffer();
+    }
+
+    start() {
+        if (!this.gl || this.running || !this.video.requestVideoFrameCallback) {
+            if (!this.video.requestVideoFrameCallback) console.warn('Latency probe: requestVideoFrameCallback not supported');
+            return;
+        }
+        this.running = true;
+        console.log('⏱️ Latency probe enabled');
+        this.video.requestVideoFrameCallback((now, meta) => this.onFrame(now, meta));
+    }
+
+    onFrame(now, meta) {
+        if (!this.running) return;
+        const stamp = this.read();
+        if (stamp === null) {
+            this.misses++;
+        } else if (stamp !== this.lastStamp) {
+            this.lastStamp = stamp;
+            this.frames++;
+            if (dc && dc.readyState === 'open') {
+                // Time left until this frame is actually on screen
+                const displayMs = Math.max(0, (meta.expectedDisplayTime || now) - performance.now());
+                dc.send(JSON.stringify({ type: 'PROBE', stamp, display_ms: Math.round(displayMs * 10) / 10 }));
+            }
+        }
+        this.video.requestVideoFrameCallback((n, m) => this.onFrame(n, m));
+    }
+
+    read() {
+        const gl = this.gl;
+        const width = this.video.videoWidth;
+        const height = this.video.videoHeight;
+        if (!width || !height) return null;
+        const block = Math.max(2, Math.floor(height / 60));
+        const blocks = 18;
+        if (blocks * block > width) return null;
+
+        gl.bindTexture(gl.TEXTURE_2D, this.texture);
+        gl.texImage2D(gl.TEXTURE_2D, 0, gl.RGBA, gl.RGBA, gl.UNSIGNED_BYTE, this.video);
+        gl.bindFramebuffer(gl.FRAMEBUFFER, this.framebuffer);
+        gl.framebufferTexture2D(gl.FRAMEBUFFER, gl.COLOR_ATTACHMENT0, gl.TEXTURE_2D, this.texture, 0);
+        // Texture row 0 is the top of the video frame
+        const pixels = new Uint8Array(blocks * block * 4);
+        gl.readPixels(0, Math.floor(block / 2), blocks * block, 1, gl.RGBA, gl.UNSIGNED_BYTE, pixels);
+        gl.bindFramebuffer(gl.FRAMEBUFFER, null);
+
+        const levels = [];
+        for (let i = 0; i < blocks; i++) {
+            const p = (i * block + Math.floor(block / 2)) * 4;
+            levels.push(0.299 * pixels[p] + 0.587 * pixels[p + 1] + 0.114 * pixels[p + 2]);
+        }
+        const white = levels[0];
+        const black = levels[1];
+        if (white - black < 80) return null; // No marker (probe off or frame not decoded yet)
+        const threshold = (white + black) / 2;
+        let stamp = 0;
+        for (let i = 2; i < blocks; i++) {
+            stamp = (stamp << 1) | (levels[i] > threshold ? 1 : 0);
+        }
+        return stamp;
+    }
+}
+
+const latencyProbe = new LatencyProbe(fsrRenderer, video);
+
 const statVideoLatency = document.getElementById('stat-video-latency');
 const statAudioLatency = document.getElementById('stat-audio-latency');
 const statFPS = document.getElementById('stat-fps');
@@ -233,7 +323,8 @@ async function startStream() {
         pc = new RTCPeerConnection(CONFIG);
 
         // Data Channel for Input
-        dc = pc.createDataChannel('input', { ordered: false });
+        // Snapshots supersede each other, so nothing is worth retransmitting
+        dc = pc.createDataChannel('input', INPUT_MODE === 'snapshot' ? { ordered: false, maxRetransmits: 0 } : { ordered: false });
         setupDataChannel(dc);
 
         // Video and Audio Receiving
@@ -309,7 +400,8 @@ async function startStream() {
         if (!response.ok) throw new Error('Falha na resposta do servidor');
 
         const answer = await response.json();
-        await pc.setRemoteDescription(new RTCSessionDescription(answer));
+        await pc.setRemoteDescription(new RTCSessionDescription({ sdp: answer.sdp, type: answer.type }));
+        if (answer.probe) latencyProbe.start();
 
     } catch (e) {
         console.error("WebRTC Start Error:", e);
@@ -320,12 +412,144 @@ async function startStream() {
 function setupDataChannel(channel) {
     channel.onopen = () => console.log('Data Channel Aberto');
     channel.onclose = () => console.log('Data Channel Fechado');
+    channel.onmessage = (evt) => {
+        if (typeof evt.data !== 'string') return;
+        let msg;
+        try { msg = JSON.parse(evt.data); } catch (e) { return; }
+        if (msg.type === 'PING') {
+            // Clock sync for input latency: echo the server time with ours
+            const now = inputClock();
+            channel.send(JSON.stringify({ type: 'PONG', id: msg.id, t0: msg.t0, t1: now, t2: inputClock() }));
+        }
+    };
 }
 
+// Binary input batches (input_protocol.py): header <BBHHd magic 'N', version, count,
+// sequence, poll time ms>, then <BBBh type, gamepad, code, value> per event. Code
+// tables: index = wire code, same order as the server (append only).
+const INPUT_MAGIC = 0x4E;
+const INPUT_VERSION = 2;
+const INPUT_HEADER_SIZE = 14;
+const INPUT_TYPES = { BUTTON: 1, AXIS: 2 };
+const INPUT_CODES = {
+    BUTTON: ['A', 'B', 'X', 'Y', 'LB', 'RB', 'LT', 'RT', 'SELECT', 'START',
+        'L3', 'R3', 'DPAD_UP', 'DPAD_DOWN', 'DPAD_LEFT', 'DPAD_RIGHT', 'HOME'],
+    AXIS: ['LEFT_X', 'LEFT_Y', 'RIGHT_X', 'RIGHT_Y']
+};
+const INPUT_CODE_IDS = {};
+for (const type in INPUT_CODES) {
+    INPUT_CODE_IDS[type] = {};
+    INPUT_CODES[type].forEach((code, i) => INPUT_CODE_IDS[type][code] = i);
+}
+let binaryInput = true; // false = one JSON message per event (old protocol)
+// 'snapshot': full pad state + sequence per message, loss tolerant (default).
+// 'delta' (?input=delta): edge-triggered event batches.
+const INPUT_MODE = new URLSearchParams(location.search).get('input') === 'delta' ? 'delta' : 'snapshot';
+const INPUT_SNAPSHOT_VERSION = 3;
+const INPUT_PAD_SIZE = 13; // <BIhhhh gamepad, button mask, LEFT_X, LEFT_Y, RIGHT_X, RIGHT_Y>
+const SNAPSHOT_REFRESH_MS = 50; // Resend while a pad is off neutral...
+const SNAPSHOT_REPEATS = 3; // ...and a few times after the last change, so a lost release heals
+const inputPads = {}; // gamepad index -> { buttons: mask, axes: [lx, ly, rx, ry] }
+let snapshotRepeats = 0;
+let snapshotTimer = null;
+let pendingInput = [];
+let pendingInputTime = 0;
+let inputFlushScheduled = false;
+let inputSeq = 0; // Shared by binary and JSON input messages, wraps at 16 bits
+let inputPollTime = null; // Set by GamepadManager.pollStatus before getGamepads()
+
+// Wall clock in ms with sub-ms precision (the server estimates the offset via PING/PONG)
+function inputClock() {
+    return performance.timeOrigin + performance.now();
+}
+
+function nextInputSeq() {
+    const seq = inputSeq;
+    inputSeq = (inputSeq + 1) & 0xFFFF;
+    return seq;
+}
+
+// Events queued in the same task (a gamepad poll tick, a joystick move) go out as one message
 function sendInput(type, code, value, gamepadIndex = 0) {
-    if (dc && dc.readyState === 'open') {
-        dc.send(JSON.stringify({ type, code, value, gamepadIndex }));
+    if (!dc || dc.readyState !== 'open') return;
+    const codeId = INPUT_CODE_IDS[type] ? INPUT_CODE_IDS[type][code] : undefined;
+    if (!binaryInput || codeId === undefined) {
+        const t = inputPollTime !== null ? inputPollTime : inputClock();
+        dc.send(JSON.stringify({ type, code, value, gamepadIndex, seq: nextInputSeq(), t }));
+        return;
+    }
+    if (!inputFlushScheduled) pendingInputTime = inputPollTime !== null ? inputPollTime : inputClock();
+    if (INPUT_MODE === 'snapshot') {
+        const pad = inputPads[gamepadIndex] || (inputPads[gamepadIndex] = { buttons: 0, axes: [0, 0, 0, 0] });
+        if (type === 'BUTTON') pad.buttons = value ? (pad.buttons | (1 << codeId)) >>> 0 : (pad.buttons & ~(1 << codeId)) >>> 0;
+        else pad.axes[codeId] = Math.max(-32768, Math.min(32767, value));
+    } else {
+        pendingInput.push(INPUT_TYPES[type], gamepadIndex, codeId, value);
+    }
+    if (!inputFlushScheduled) {
+        inputFlushScheduled = true;
+        queueMicrotask(INPUT_MODE === 'snapshot' ? flushSnapshot : flushInput);
+    }
+}
+
+function sendSnapshot(time) {
+    const pads = Object.keys(inputPads);
+    const view = new DataView(new ArrayBuffer(INPUT_HEADER_SIZE + pads.length * INPUT_PAD_SIZE));
+    view.setUint8(0, INPUT_MAGIC);
+    view.setUint8(1, INPUT_SNAPSHOT_VERSION);
+    view.setUint16(2, pads.length, true);
+    view.setUint16(4, nextInputSeq(), true);
+    view.setFloat64(6, time, true);
+    pads.forEach((index, i) => {
+        const pad = inputPads[index];
+        const offset = INPUT_HEADER_SIZE + i * INPUT_PAD_SIZE;
+        view.setUint8(offset, Number(index));
+        view.setUint32(offset + 1, pad.buttons, true);
+        pad.axes.forEach((value, a) => view.setInt16(offset + 5 + a * 2, value, true));
+    });
+    dc.send(view.buffer);
+}
+
+function flushSnapshot() {
+    inputFlushScheduled = false;
+    if (!dc || dc.readyState !== 'open') return;
+    sendSnapshot(pendingInputTime);
+    snapshotRepeats = SNAPSHOT_REPEATS;
+    if (!snapshotTimer) snapshotTimer = setInterval(refreshSnapshot, SNAPSHOT_REFRESH_MS);
+}
+
+function refreshSnapshot() {
+    const held = Object.values(inputPads).some(pad => pad.buttons || pad.axes.some(v => v));
+    if (!dc || dc.readyState !== 'open' || (!held && snapshotRepeats <= 0)) {
+        clearInterval(snapshotTimer);
+        snapshotTimer = null;
+        return;
+    }
+    snapshotRepeats--;
+    sendSnapshot(inputClock());
+}
+
+function flushInput() {
+    inputFlushScheduled = false;
+    const count = pendingInput.length / 4;
+    if (!count || !dc || dc.readyState !== 'open') {
+        pendingInput = [];
+        return;
     }
+    const view = new DataView(new ArrayBuffer(INPUT_HEADER_SIZE + count * 5));
+    view.setUint8(0, INPUT_MAGIC);
+    view.setUint8(1, INPUT_VERSION);
+    view.setUint16(2, count, true);
+    view.setUint16(4, nextInputSeq(), true);
+    view.setFloat64(6, pendingInputTime, true);
+    for (let i = 0, offset = INPUT_HEADER_SIZE; i < pendingInput.length; i += 4, offset += 5) {
+        view.setUint8(offset, pendingInput[i]);
+        view.setUint8(offset + 1, pendingInput[i + 1]);
+        view.setUint8(offset + 2, pendingInput[i + 2]);
+        view.setInt16(offset + 3, Math.max(-32768, Math.min(32767, pendingInput[i + 3])), true);
+    }
+    pendingInput = [];
+    dc.send(view.buffer);
 }
 
 
@@ -592,9 +816,19 @@ function startStatsInterval() {
         let currentFPS = 0;
         let currentLatency = 0;
         let audioDebugInfo = {};
+        let videoInfo = {};
 
         stats.forEach(report => {
             if (report.type === 'inbound-rtp' && report.kind === 'video') {
+                // Cumulative counters: the server turns them into per-interval loss / buffer delay
+                videoInfo = {
+                    jitter: report.jitter || 0,
+                    packetsReceived: report.packetsReceived || 0,
+                    packetsLost: report.packetsLost || 0,
+                    framesDropped: report.framesDropped || 0,
+                    jitterBufferDelay: report.jitterBufferDelay || 0,
+                    jitterBufferEmittedCount: report.jitterBufferEmittedCount || 0
+                };
                 if (report.framesPerSecond) {
                     currentFPS = Math.round(report.framesPerSecond);
                     statFPS.innerText = `FPS: ${currentFPS}`;
@@ -689,6 +923,7 @@ function startStatsInterval() {
                 fps: currentFPS,
                 bitrate: currentBitrate.toFixed(2),
                 latency: currentLatency,
+                video: videoInfo,
                 audio: audioDebugInfo
             }));
         }
@@ -1841,6 +2076,7 @@ class GamepadManager {
     pollStatus() {
         if (Object.keys(this.activeGamepads).length === 0) return;
 
+        inputPollTime = inputClock(); // Stamps every input message of this tick
         const navigatorGamepads = navigator.getGamepads ? navigator.getGamepads() : [];
 
         // Treat each connected gamepad as a player
@@ -1891,6 +2127,7 @@ class GamepadManager {
 
             playerIndex++;
         }
+        inputPollTime = null;
     }
 }
 
@@ -0,0 +1,296 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("NeonTelemetry")
+
+# Samples kept per series: 5 minutes of the client's 1 Hz STATS
+TELEMETRY_HISTORY = 300
+# Samples kept per distribution (--latency-probe sends one per displayed frame)
+DISTRIBUTION_HISTORY = 3600
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Series exported as Prometheus gauges (latest value), with their help text
+METRICS = {
+    "client_fps": "Frames per second decoded by the client",
+    "client_bitrate_mbps": "Video bitrate received by the client (Mbps)",
+    "client_rtt_ms": "ICE candidate pair RTT seen by the client (ms)",
+    "client_jitter_ms": "Video RTP interarrival jitter seen by the client (ms)",
+    "client_loss": "Video packet loss fraction seen by the client over the last interval",
+    "client_jitter_buffer_ms": "Average video jitter buffer delay over the last interval (ms)",
+    "client_frames_dropped": "Video frames dropped by the client over the last interval",
+    "audio_jitter_ms": "Audio RTP interarrival jitter seen by the client (ms)",
+    "rr_loss": "Video loss fraction from the last RTCP receiver report",
+    "rr_rtt_ms": "Video RTT from the last RTCP receiver report (ms)",
+    "video_send_kbps": "Outbound video RTP rate (kbps)",
+    "audio_send_kbps": "Outbound audio RTP rate (kbps)",
+    "capture_fps": "Video frames per second delivered to this session",
+    "capture_target_fps": "Capture/encode frame rate target",
+    "bitrate_target_kbps": "Adaptive bitrate target (kbps)",
+    "input_clock_offset_ms": "Client clock minus server clock, from data channel PING/PONG (ms)",
+    "input_clock_rtt_ms": "Lowest data channel PING/PONG round trip in the clock window (ms)",
+}
+
+# Per-sample distributions, exported as Prometheus summaries
+DISTRIBUTIONS = {
+    "g2g_latency_ms": "Glass-to-glass (capture to display) latency from --latency-probe (ms)",
+    "input_latency_ms": "Input message receipt to virtual device write, on the input thread (ms)",
+    "input_transit_ms": "Input network transit, client gamepad poll to server receipt (ms)",
+    "input_queue_ms": "Input message wait in the input thread queue (ms)",
+    "input_write_ms": "Input message apply time, decode to virtual device write (ms)",
+}
+
+# Per-session event counters, exported as Prometheus counters (neon_session_<name>_total)
+COUNTERS = {
+    "input_dropped": "Input data channel messages dropped by --flood-protect",
+}
+
+def quantile(values, q):
+    """Nearest-rank quantile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+def _number(value, scale=1.0):
+    try:
+        return float(value) * scale
+    except (TypeError, ValueError):
+        return None
+
+class SessionTelemetry:
+    """
+    Bounded time series for one peer connection.
+
+    Each series is a ring buffer of (unix time, value). Client numbers come from the
+    STATS data-channel message (1 Hz); server numbers from monitor_pc.
+    """
+    def __init__(self, session_id, history=TELEMETRY_HISTORY, clock=time.time, **labels):
+        self.session_id = session_id
+        self.labels = labels
+        self.history = history
+        self.started = clock()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.series = {}
+        self.distributions = {}
+        self.counters = {} # Cumulative totals (RTP packets/bytes sent) for Prometheus counters
+        self._last_client = None # Previous cumulative client counters, for per-interval deltas
+        self._last_outbound = {}
+
+    def record(self, name, value, t=None):
+        if value is None:
+            return
+        t = self._clock() if t is None else t
+        with self._lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = deque(maxlen=self.history)
+            series.append((t, value))
+
+    def record_distribution(self, name, value, t=None):
+        """One sample of a distribution (e.g. a per-frame latency); also kept as a time series."""
+        with self._lock:
+            samples = self.distributions.get(name)
+            if samples is None:
+                samples = self.distributions[name] = deque(maxlen=DISTRIBUTION_HISTORY)
+            samples.append(value)
+        self.record(name, value, t)
+
+    def distribution(self, name):
+        with self._lock:
+            values = sorted(self.distributions.get(name, ()))
+        if not values:
+            return None
+        stats = {"count": len(values), "min": values[0], "mean": round(sum(values) / len(values), 2), "max": values[-1]}
+        for q in QUANTILES:
+            stats[f"p{int(q * 100)}"] = quantile(values, q)
+        return stats
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def last(self, name):
+        with self._lock:
+            series = self.series.get(name)
+            return series[-1][1] if series else None
+
+    def record_client(self, data, t=None):
+        """Client STATS message: {fps, bitrate: Mbps string, latency: RTT ms, video: {...}, audio: {...}}."""
+        t = self._clock() if t is None else t
+        self.record("client_fps", _number(data.get("fps")), t)
+        self.record("client_bitrate_mbps", _number(data.get("bitrate")), t)
+        self.record("client_rtt_ms", _number(data.get("latency")), t)
+        video = data.get("video") or {}
+        audio = data.get("audio") or {}
+        # RTCStats jitter is in seconds
+        self.record("client_jitter_ms", _number(video.get("jitter"), 1000.0), t)
+        self.record("audio_jitter_ms", _number(audio.get("jitter"), 1000.0), t)
+        if not video:
+            return
+        current = {key: _number(video.get(key)) or 0.0 for key in
+                   ("packetsReceived", "packetsLost", "framesDropped", "jitterBufferDelay", "jitterBufferEmittedCount")}
+        last, self._last_client = self._last_client, current
+        if last is None:
+            return
+        delta = {key: current[key] - last[key] for key in current}
+        if any(value < 0 for value in delta.values()):
+            return # Client reconnected / counters reset
+        expected = delta["packetsReceived"] + delta["packetsLost"]
+        if expected > 0:
+            self.record("client_loss", round(delta["packetsLost"] / expected, 4), t)
+        if delta["jitterBufferEmittedCount"] > 0:
+            self.record("client_jitter_buffer_ms",
+                        round(delta["jitterBufferDelay"] / delta["jitterBufferEmittedCount"] * 1000.0, 1), t)
+        self.record("client_frames_dropped", delta["framesDropped"], t)
+
+    def record_outbound(self, kind, packets_sent, bytes_sent, t=None):
+        """Outbound RTP counters of one sender; the rate comes from the previous sample."""
+        t = self._clock() if t is None else t
+        with self._lock:
+            self.counters[f"{kind}_packets_sent"] = packets_sent
+            self.counters[f"{kind}_bytes_sent"] = bytes_sent
+            last, self._last_outbound[kind] = self._last_outbound.get(kind), (t, bytes_sent)
+        if last is not None and t > last[0] and bytes_sent >= last[1]:
+            self.record(f"{kind}_send_kbps", round((bytes_sent - last[1]) * 8 / (t - last[0]) / 1000.0, 1), t)
+
+    def record_receiver_report(self, loss, rtt_ms, t=None):
+        t = self._clock() if t is None else t
+        self.record("rr_loss", round(loss, 4), t)
+        self.record("rr_rtt_ms", None if rtt_ms is None else round(rtt_ms, 1), t)
+
+    def record_capture(self, fps_stats, bitrate_stats=None, t=None):
+        """MediaCaptureSystem.fps_stats() / bitrate_stats() snapshots."""
+        t = self._clock() if t is None else t
+        self.record("capture_fps", fps_stats.get("achieved"), t)
+        self.record("capture_target_fps", fps_stats.get("target"), t)
+        if bitrate_stats:
+            self.record("bitrate_target_kbps", bitrate_stats.get("target_kbps"), t)
+
+    def latest(self):
+        with self._lock:
+            return {name: series[-1][1] for name, series in self.series.items() if series}
+
+    def to_dict(self, points=None):
+        """JSON view: latest values, window summary and (the last `points` of) every series."""
+        with self._lock:
+            series = {name: list(values)[-points:] if points else list(values)
+                      for name, values in self.series.items()}
+            counters = dict(self.counters)
+            names = list(self.distributions)
+        summary = {}
+        for name, values in series.items():
+            numbers = [v for _, v in values]
+            if numbers:
+                summary[name] = {"min": min(numbers), "avg": round(sum(numbers) / len(numbers), 2), "max": max(numbers)}
+        return {
+            "session": self.session_id,
+            "labels": self.labels,
+            "started": self.started,
+            "uptime": round(self._clock() - self.started, 1),
+            "latest": {name: values[-1][1] for name, values in series.items() if values},
+            "summary": summary,
+            "counters": counters,
+            "distributions": {name: self.distribution(name) for name in names},
+            "series": {name: [[round(t, 3), v] for t, v in values] for name, values in series.items()},
+        }
+
+class TelemetryStore:
+    """Telemetry of the live sessions, keyed by peer connection id."""
+    def __init__(self, history=TELEMETRY_HISTORY):
+        self.history = history
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def open(self, session_id, **labels):
+        session = SessionTelemetry(session_id, history=self.history, **labels)
+        with self._lock:
+            self._sessions[session_id] = session
+        return session
+
+    def close(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def to_json(self, points=None):
+        return {"sessions": [session.to_dict(points) for session in self.sessions()]}
+
+    def prometheus(self):
+        """Prometheus text exposition (version 0.0.4) of the latest values."""
+        sessions = self.sessions()
+        lines = [
+            "# HELP neon_sessions_active Peer connections with telemetry",
+            "# TYPE neon_sessions_active gauge",
+            f"neon_sessions_active {len(sessions)}",
+        ]
+        latest = [(session, session.latest()) for session in sessions]
+        for name, help_text in METRICS.items():
+            samples = [(session, values[name]) for session, values in latest if name in values]
+            if not samples:
+                continue
+            lines.append(f"# HELP neon_session_{name} {help_text}")
+            lines.append(f"# TYPE neon_session_{name} gauge")
+            for session, value in samples:
+                lines.append(f"neon_session_{name}{{{_labels(session)}}} {value}")
+        for name, help_text in DISTRIBUTIONS.items():
+            samples = []
+            for session in sessions:
+                with session._lock:
+                    values = sorted(session.distributions.get(name, ()))
+                if not values:
+                    continue
+                labels = _labels(session)
+                for q in QUANTILES:
+                    samples.append(f'neon_session_{name}{{{labels},quantile="{q}"}} {quantile(values, q)}')
+                samples.append(f"neon_session_{name}_sum{{{labels}}} {sum(values)}")
+                samples.append(f"neon_session_{name}_count{{{labels}}} {len(values)}")
+            if samples:
+                lines.append(f"# HELP neon_session_{name} {help_text}")
+                lines.append(f"# TYPE neon_session_{name} summary")
+                lines += samples
+        for name, help_text in COUNTERS.items():
+            samples = []
+            for session in sessions:
+                with session._lock:
+                    value = session.counters.get(name)
+                if value is not None:
+                    samples.append(f"neon_session_{name}_total{{{_labels(session)}}} {value}")
+            if samples:
+                lines.append(f"# HELP neon_session_{name}_total {help_text}")
+                lines.append(f"# TYPE neon_session_{name}_total counter")
+                lines += samples
+        for counter, help_text in (("packets_sent", "RTP packets sent"), ("bytes_sent", "RTP bytes sent")):
+            samples = []
+            for session in sessions:
+                with session._lock:
+                    counters = dict(session.counters)
+                for kind in ("video", "audio"):
+                    value = counters.get(f"{kind}_{counter}")
+                    if value is not None:
+                        samples.append(f'neon_rtp_{counter}_total{{{_labels(session)},kind="{kind}"}} {value}')
+            if samples:
+                lines.append(f"# HELP neon_rtp_{counter}_total {help_text}")
+                lines.append(f"# TYPE neon_rtp_{counter}_total counter")
+                lines += samples
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(session):
+    labels = {"session": session.session_id}
+    labels.update(session.labels)
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+# Process-wide store (server.py records into it, /api/sessions and /metrics read it)
+store = TelemetryStore()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Testes do relógio de captura: PTS por tempo de captura, continuidade do áudio e sincronia A/V.
+"""
+from capture_clock import CaptureClock, ClockStream
+
+def test_video_pts_follow_capture_time():
+    clock = CaptureClock()
+    video = clock.stream("video", 90000)
+    # 60 fps with one frame lost between the 2nd and 3rd packet
+    times = [100.0, 100.0 + 1 / 60, 100.0 + 3 / 60, 100.0 + 4 / 60]
+    pts = [video.stamp(t)[0] for t in times]
+    assert pts == [0, 1500, 4500, 6000]
+    assert video.stats()["max_interval_ms"] == 33.3
+
+def test_video_pts_strictly_increasing():
+    clock = CaptureClock()
+    video = clock.stream("video", 90000)
+    # Two access units from the same pipe read share one capture time
+    assert [video.stamp(5.0)[0], video.stamp(5.0)[0]] == [0, 1]
+    assert video.clamped == 1
+
+def test_audio_absorbs_arrival_jitter():
+    clock = CaptureClock()
+    audio = clock.stream("audio", 48000, frame_ticks=960)
+    times = [0.0, 0.030, 0.035, 0.060, 0.085]
+    pts = [audio.stamp(t)[0] for t in times]
+    assert pts == [0, 960, 1920, 2880, 3840]
+    assert audio.resyncs == 0
+
+def test_audio_reanchors_after_gap():
+    clock = CaptureClock()
+    audio = clock.stream("audio", 48000, frame_ticks=960)
+    audio.stamp(0.0)
+    audio.stamp(0.02)
+    # 500 ms of packets lost upstream: sample count would lag behind the video forever
+    pts, _ = audio.stamp(0.52)
+    assert pts == 24960
+    assert audio.resyncs == 1
+
+def test_shared_epoch_and_av_sync():
+    clock = CaptureClock()
+    video = clock.stream("video", 90000)
+    audio = clock.stream("audio", 48000, frame_ticks=960)
+    video.stamp(50.0)
+    assert audio.stamp(50.1)[0] == 4800 # same zero as the video
+    video.stamp(50.2)
+    audio.stamp(50.16) # arrived 40 ms late: stays sample-continuous, inside the resync window
+    stats = clock.stats()
+    assert stats["streams"]["audio"]["drift_ms"] == -40.0
+    assert stats["streams"]["video"]["drift_ms"] == 0.0
+    assert stats["av_sync_ms"] == -40.0
+
+def test_stream_is_shared_per_kind():
+    clock = CaptureClock()
+    assert clock.stream("video", 90000) is clock.stream("video", 90000)
+    assert isinstance(clock.stream("audio", 48000, 960), ClockStream)
+
+if __name__ == "__main__":
+    test_video_pts_follow_capture_time()
+    test_video_pts_strictly_increasing()
+    test_audio_absorbs_arrival_jitter()
+    test_audio_reanchors_after_gap()
+    test_shared_epoch_and_av_sync()
+    test_stream_is_shared_per_kind()
+    print("✅ Relógio de captura OK")
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Testes do CaptureHub: fan-out de um pipeline para vários assinantes (sem FFmpeg).
+"""
+import asyncio
+from capture_hub import CaptureHub, VIDEO_RING_SIZE
+from packet_queue import VIDEO_QUEUE_DEPTH, AudioPacketQueue
+from capture_clock import CaptureClock
+
+class FakeFrame:
+    def __init__(self, data):
+        self.data = data
+        self.pts = None
+        self.time_base = None
+
+class FakeSource:
+    """Stands in for EncodedVideoTrack/EncodedAudioTrack."""
+    def __init__(self, kind="video"):
+        self.kind = kind
+        self.clock_rate = 90000 if kind == "video" else 48000
+        self.frame_ticks = None if kind == "video" else 960
+        self._pipeline = None
+        self._audio_queue = AudioPacketQueue(frame_ms=20, target_ms=40)
+        self.checks = 0
+        self.stopped = False
+
+    def _check_process(self):
+        self.checks += 1
+
+    def _make_frame(self, data):
+        return FakeFrame(data)
+
+
+    def stop(self):
+        self.stopped = True
+
+def test_same_key_shares_one_source():
+    hub = CaptureHub()
+    created = []
+    def factory():
+        created.append(FakeSource())
+        return created[-1]
+
+    async def run():
+        a = hub.subscribe(("x11grab", "720p"), factory)
+        b = hub.subscribe(("x11grab", "720p"), factory)
+        c = hub.subscribe(("x11grab", "1080p"), factory)
+        return a, b, c
+
+    a, b, c = asyncio.run(run())
+    assert len(created) == 2
+    assert a.pipeline is b.pipeline
+    assert c.pipeline is not a.pipeline
+
+def test_subscribers_have_independent_cursors():
+    hub = CaptureHub()
+
+    async def run():
+        a = hub.subscribe("k", FakeSource)
+        b = hub.subscribe("k", FakeSource)
+        pipeline = a.pipeline
+        clock_a, clock_b = CaptureClock(), CaptureClock()
+        a.attach_clock(clock_a)
+        b.attach_clock(clock_b)
+        pipeline.publish(b"idr", is_keyframe=True, capture_time=10.0)
+        pipeline.publish(b"p1", capture_time=10.5)
+        pipeline.publish(b"p2", capture_time=11.0)
+
+        got_a = [(await a.recv()).data for _ in range(3)]
+        got_b = [(await b.recv()).data for _ in range(2)]
+        # Same capture times, but each session's clock has its own stamps
+        assert (await b.recv()).pts == 90000
+        assert clock_a.stats()["streams"]["video"]["frames"] == 3
+        return got_a, got_b
+
+    got_a, got_b = asyncio.run(run())
+    assert got_a == [b"idr", b"p1", b"p2"]
+    assert got_b == [b"idr", b"p1"]
+
+def test_late_video_subscriber_starts_at_keyframe():
+    hub = CaptureHub()
+
+    async def run():
+        first = hub.subscribe("k", FakeSource)
+        pipeline = first.pipeline
+        pipeline.publish(b"p-orphan")
+        pipeline.publish(b"idr", is_keyframe=True)
+        pipeline.publish(b"p1")
+        late = hub.subscribe("k", FakeSource)
+        return [(await late.recv()).data for _ in range(2)]
+
+    assert asyncio.run(run()) == [b"idr", b"p1"]
+
+def test_subscriber_without_keyframe_requests_one():
+    hub = CaptureHub()
+    requests = []
+
+    class KeyedSource(FakeSource):
+        def request_keyframe(self):
+            requests.append(1)
+
+    async def run():
+        sub = hub.subscribe("k", KeyedSource)
+        pipeline = sub.pipeline
+        pipeline.publish(b"p-refresh-1") # Intra refresh: no IDR in the ring
+        pipeline.publish(b"p-refresh-2")
+        assert pipeline.read(sub) is None and requests == [1]
+        pipeline.publish(b"idr", is_keyframe=True)
+        return (await sub.recv()).data
+
+    assert asyncio.run(run()) == b"idr"
+    assert requests == [1]
+
+def test_late_subscriber_starts_near_the_head():
+    """Warm/shared pipeline deep into a GOP: the late viewer waits for a fresh IDR, no stale burst."""
+    hub = CaptureHub()
+    requests = []
+    gop = 60
+
+    class KeyedSource(FakeSource):
+        def request_keyframe(self):
+            requests.append(1)
+
+    async def run():
+        first = hub.subscribe("k", KeyedSource)
+        pipeline = first.pipeline
+        pipeline.publish(b"idr0", is_keyframe=True)
+        for i in range(gop - 1):
+            pipeline.publish(f"p{i}".encode())
+        late = hub.subscribe("k", KeyedSource)
+        assert pipeline.read(late) is None and requests == [1]
+        pipeline.publish(b"p-before-idr") # Published before the requested IDR: skipped
+        pipeline.publish(b"idr1", is_keyframe=True)
+        head = pipeline._next_seq
+        first_frame = (await late.recv()).data
+        return first_frame, head - (late._cursor - 1)
+
+    first_frame, behind = asyncio.run(run())
+    assert first_frame == b"idr1"
+    assert behind <= gop
+    assert requests == [1]
+
+def test_lagging_subscriber_resyncs_to_keyframe():
+    hub = CaptureHub()
+
+    async def run():
+        sub = hub.subscribe("k", FakeSource)
+        pipeline = sub.pipeline
+        pipeline.publish(b"idr0", is_keyframe=True)
+        assert (await sub.recv()).data == b"idr0"
+        for i in range(VIDEO_RING_SIZE + 5):
+            pipeline.publish(f"p{i}".encode())
+        pipeline.publish(b"idr1", is_keyframe=True)
+        return (await sub.recv()).data
+
+    assert asyncio.run(run()) == b"idr1"
+
+def test_slow_video_subscriber_skips_to_newest_gop():
+    hub = CaptureHub()
+
+    async def run():
+        sub = hub.subscribe("k", FakeSource)
+        pipeline = sub.pipeline
+        pipeline.publish(b"idr0", is_keyframe=True)
+        assert (await sub.recv()).data == b"idr0"
+        for i in range(VIDEO_QUEUE_DEPTH + 2):
+            pipeline.publish(f"p{i}".encode())
+        pipeline.publish(b"idr1", is_keyframe=True)
+        pipeline.publish(b"p-next")
+        data = [(await sub.recv()).data for _ in range(2)]
+        return data, sub.queue_stats()
+
+    data, stats = asyncio.run(run())
+    assert data == [b"idr1", b"p-next"]
+    assert stats["dropped_packets"] == VIDEO_QUEUE_DEPTH + 2
+    assert stats["dropped_gops"] == 1
+
+def test_slow_audio_subscriber_catches_up_to_target():
+    hub = CaptureHub()
+
+    async def run():
+        sub = hub.subscribe("a", lambda: FakeSource("audio"))
+        pipeline = sub.pipeline
+        pipeline.publish(b"a0")
+        assert (await sub.recv()).data == b"a0"
+        for i in range(1, 11):
+            pipeline.publish(f"a{i}".encode())
+        first = (await sub.recv()).data
+        return first, sub.queue_stats()
+
+    first, stats = asyncio.run(run())
+    # target 40 ms = 2 frames: only the newest two of ten stay queued
+    assert first == b"a9"
+    assert stats["dropped_packets"] == 8
+    assert stats["latency_ms"] == 20
+
+def test_last_unsubscribe_stops_source():
+    hub = CaptureHub()
+
+    async def run():
+        a = hub.subscribe("k", FakeSource)
+        b = hub.subscribe("k", FakeSource)
+        source = a.pipeline.source
+        a.stop()
+        assert not source.stopped
+        b.stop()
+        return source
+
+    source = asyncio.run(run())
+    assert source.stopped
+    assert hub.stats() == []
+
+def test_session_capture_stats_report_subscriber_queues():
+    from capture_system import MediaCaptureSystem
+    hub = CaptureHub()
+
+    async def run():
+        session = MediaCaptureSystem.__new__(MediaCaptureSystem) # No capture: just the reporting
+        session.video_track = hub.subscribe("k", FakeSource)
+        session.audio_track = hub.subscribe("a", lambda: FakeSource("audio"))
+        session.clock = CaptureClock()
+        session.video_track.attach_clock(session.clock)
+        session.audio_track.attach_clock(session.clock)
+        pipeline = session.video_track.pipeline
+        pipeline.publish(b"idr0", is_keyframe=True)
+        await session.video_track.recv()
+        pipeline.publish(b"p0")
+        pipeline.publish(b"p1")
+        return session.capture_stats()
+
+    stats = asyncio.run(run())
+    assert stats["queues"]["video"] == {"depth": 2, "dropped_packets": 0, "dropped_gops": 0}
+    assert stats["queues"]["audio"]["depth"] == 0 and stats["queues"]["audio"]["target_ms"] == 40
+    assert [p["queues"] for p in hub.stats()] == [[stats["queues"]["video"]], [stats["queues"]["audio"]]]
+    assert stats["clock"]["video"]["frames"] == 1 and stats["clock"]["audio"] is not None
+    assert stats["clock"]["av_sync_ms"] is None # No audio stamped yet
+    assert stats["scale"] is None and stats["keyframes"] is None # FakeSource: no encoder control
+
+if __name__ == "__main__":
+    test_same_key_shares_one_source()
+    test_subscribers_have_independent_cursors()
+    test_late_video_subscriber_starts_at_keyframe()
+    test_late_subscriber_starts_near_the_head()
+    test_subscriber_without_keyframe_requests_one()
+    test_lagging_subscriber_resyncs_to_keyframe()
+    test_slow_video_subscriber_skips_to_newest_gop()
+    test_slow_audio_subscriber_catches_up_to_target()
+    test_last_unsubscribe_stops_source()
+    test_session_capture_stats_report_subscriber_queues()
+    print("✅ CaptureHub OK")
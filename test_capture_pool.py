@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Testes do pool de captura: pipelines pré-aquecidos, reconexão instantânea e métricas hit/miss.
+"""
+import asyncio
+from capture_hub import CaptureHub
+from capture_pool import CapturePool
+
+class FakeSource:
+    """Stands in for EncodedVideoTrack: counts starts instead of spawning FFmpeg."""
+    def __init__(self, kind="video"):
+        self.kind = kind
+        self.clock_rate = 90000
+        self.frame_ticks = None
+        self._pipeline = None
+        self.starts = 0
+        self.alive = False
+        self.stopped = False
+
+    def is_capturing(self):
+        return self.alive
+
+    def _check_process(self):
+        if not self.alive:
+            self.alive = True
+            self.starts += 1
+
+    def _make_frame(self, data):
+        return type("Frame", (), {"data": data, "pts": None, "time_base": None})()
+
+    def stop(self):
+        self.alive = False
+        self.stopped = True
+
+def test_pinned_profile_is_prespawned_and_hit():
+    hub = CaptureHub()
+    pool = CapturePool(hub, size=1)
+    pool.pin("video", "1080p", FakeSource)
+    pool.refill()
+    pipeline = hub.idle_pipelines()[0]
+    assert pipeline.source.starts == 1 and pool.stats()["warm"] == 1
+
+    async def run():
+        # The warm ring already holds a keyframe: the first frame is immediate
+        pipeline.publish(b"idr", is_keyframe=True)
+        sub = hub.subscribe("1080p", FakeSource)
+        return sub, (await sub.recv()).data
+
+    sub, data = asyncio.run(run())
+    assert data == b"idr" and sub.pool_hit
+    assert pool.stats()["hits"] == 1 and pool.stats()["misses"] == 0
+
+def test_reconnect_keeps_pipeline_warm():
+    hub = CaptureHub()
+    pool = CapturePool(hub, size=1)
+
+    async def run():
+        first = hub.subscribe("720p", FakeSource)
+        source = first.pipeline.source
+        first.stop() # Quality toggle closes the connection...
+        assert not source.stopped
+        second = hub.subscribe("720p", FakeSource) # ...and reopens it
+        return source, second
+
+    source, second = asyncio.run(run())
+    assert second.pipeline.source is source and second.pool_hit
+    assert pool.stats()["misses"] == 1 and pool.stats()["hits"] == 1
+
+def test_least_recent_profile_is_evicted():
+    hub = CaptureHub()
+    pool = CapturePool(hub, size=1)
+
+    async def run():
+        a = hub.subscribe("720p", FakeSource)
+        a.stop()
+        b = hub.subscribe("1080p", FakeSource)
+        b.stop()
+        return a.pipeline.source, b.pipeline.source
+
+    old, recent = asyncio.run(run())
+    pool.refill()
+    assert old.stopped and not recent.stopped
+    assert [p.key for p in hub.idle_pipelines()] == ["1080p"]
+    assert pool.stats()["evicted"] == 1
+
+def test_dead_warm_pipeline_is_respawned():
+    hub = CaptureHub()
+    pool = CapturePool(hub, size=1)
+    pool.pin("video", "1080p", FakeSource)
+    pool.refill()
+    source = hub.idle_pipelines()[0].source
+    source.alive = False # FFmpeg died while idle
+    pool.refill()
+    assert source.starts == 2 and pool.stats()["respawned"] == 1
+
+def test_size_zero_disables_pool():
+    hub = CaptureHub()
+    pool = CapturePool(hub, size=0)
+    pool.pin("video", "1080p", FakeSource)
+    pool.refill()
+    assert hub.idle_pipelines() == []
+
+    async def run():
+        sub = hub.subscribe("1080p", FakeSource)
+        sub.stop()
+        return sub.pipeline.source
+
+    assert asyncio.run(run()).stopped
+
+if __name__ == "__main__":
+    test_pinned_profile_is_prespawned_and_hit()
+    test_reconnect_keeps_pipeline_warm()
+    test_least_recent_profile_is_evicted()
+    test_dead_warm_pipeline_is_respawned()
+    test_size_zero_disables_pool()
+    print("✅ Pool de captura OK")
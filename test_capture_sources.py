@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Testes do registro de fontes de captura: x11grab, lavfi sintético e arquivo, rodando sem X nem Pulse.
+"""
+import os
+import asyncio
+import tempfile
+import fractions
+from types import SimpleNamespace
+import av
+import capture_sources
+from capture_sources import get_source
+
+def make_args(**kw):
+    defaults = dict(resolution="320x240", region="full", bitrate=500, fps=30, capture_backend="synthetic",
+                    capture_file=None, engine="pyav", encoder="cpu", gop=30)
+    defaults.update(kw)
+    return SimpleNamespace(**defaults)
+
+def read_frames(spec, count, kind="video"):
+    with av.open(spec.url, format=spec.format, options=spec.options) as container:
+        stream = container.streams.video[0] if kind == "video" else container.streams.audio[0]
+        frames = []
+        for frame in container.decode(stream):
+            frames.append(frame)
+            if len(frames) >= count:
+                return frames
+    return frames
+
+def test_registry_and_aliases():
+    assert capture_sources.available_sources() == ["file", "synthetic", "x11"]
+    assert get_source("lavfi") is get_source("synthetic")
+    assert get_source("pipewire").name == "x11" # GUI choices without their own source
+    assert get_source("bogus").name == "x11"
+    assert get_source(None).desktop
+
+def test_x11_keeps_original_command_layout():
+    spec = get_source("x11").video_input(make_args(region="100,50,1280,720"), 60)
+    assert spec.cli_args() == ["-f", "x11grab", "-framerate", "60", "-video_size", "1280x720",
+                               "-draw_mouse", "0", "-i", ":0.0+100,50"]
+    audio = get_source("x11").audio_input(make_args(ultra_low_latency=True), "sink.monitor")
+    assert audio.cli_args() == ["-f", "pulse", "-i", "sink.monitor"] and audio.env == {"PULSE_LATENCY_MSEC": "1"}
+
+def test_synthetic_source_is_headless():
+    source = get_source("synthetic")
+    args = make_args()
+    assert source.available(args) == (True, None)
+    frames = read_frames(source.video_input(args, 30), 3)
+    assert (frames[0].width, frames[0].height) == (320, 240)
+    audio = read_frames(source.audio_input(args), 2, kind="audio")
+    assert audio[0].sample_rate == 48000
+
+def _write_clip(path, frames=10):
+    with av.open(path, "w") as out:
+        stream = out.add_stream("mpeg4", rate=30)
+        stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+        for i in range(frames):
+            frame = av.VideoFrame(64, 48, "yuv420p")
+            frame.pts, frame.time_base = i, fractions.Fraction(1, 30)
+            for packet in stream.encode(frame):
+                out.mux(packet)
+        for packet in stream.encode():
+            out.mux(packet)
+
+def test_file_source_loops_with_escaped_path():
+    path = os.path.join(tempfile.mkdtemp(), "clip: it's, [a] test.mp4")
+    _write_clip(path)
+    source = get_source("file")
+    args = make_args(capture_backend="file", capture_file=path)
+    assert source.available(args) == (True, None)
+    assert not source.available(make_args(capture_backend="file", capture_file="/nope.mp4"))[0]
+    frames = read_frames(source.video_input(args, 30), 25) # 10-frame clip: loops
+    assert len(frames) == 25
+    pts = [f.pts for f in frames]
+    assert pts == sorted(pts) and len(set(pts)) == 25 # Monotonic across loop boundaries
+    assert source.audio_input(args).url.startswith("anullsrc") # No audio stream: silence
+
+def test_hub_key_follows_source():
+    from capture_system import EncodedVideoTrack, EncodedAudioTrack
+    x11 = EncodedVideoTrack.pipeline_key(make_args(capture_backend="x11"))
+    synthetic = EncodedVideoTrack.pipeline_key(make_args())
+    assert x11[:2] == ("x11grab", "full") and synthetic[0] == "synthetic" and x11 != synthetic
+    assert EncodedAudioTrack.pipeline_key(make_args(capture_backend="x11"))[0] == "pulse"
+
+def test_encoded_track_streams_from_synthetic_source():
+    from capture_system import EncodedVideoTrack
+    from packet_queue import classify_access_unit
+    async def main():
+        track = EncodedVideoTrack("test", make_args())
+        track._start_capture()
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                if track._video_queue.stats()["depth"] >= 3:
+                    break
+            first = track._video_queue.pop()
+        finally:
+            track.stop()
+        return first
+    first = asyncio.run(main())
+    assert first is not None and classify_access_unit(first)[0]
+
+if __name__ == "__main__":
+    test_registry_and_aliases()
+    test_x11_keeps_original_command_layout()
+    test_synthetic_source_is_headless()
+    test_file_source_loops_with_escaped_path()
+    test_hub_key_follows_source()
+    test_encoded_track_streams_from_synthetic_source()
+    print("✅ Fontes de captura OK")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Testes do --dynamic-scale e --adaptive-fps: escadas de resolução/FPS, histerese e feedback de rede por sessão.
+"""
+from types import SimpleNamespace
+from dynamic_scale import DynamicScaler, FpsGovernor, resolution_ladder, fps_ladder
+from test_fakes import FakeClock
+
+def make_scaler(**kw):
+    clock = FakeClock()
+    return DynamicScaler(1920, 1080, clock=clock, **kw), clock
+
+def run(scaler, clock, seconds, step=0.5):
+    """Advances the clock calling update() like the capture track does; returns the switches."""
+    switches = []
+    end = clock.now + seconds
+    while clock.now < end:
+        clock.now += step
+        size = scaler.update()
+        if size:
+            switches.append(size)
+    return switches
+
+def test_ladder():
+    assert resolution_ladder(1920, 1080) == [(1920, 1080), (1600, 900), (1280, 720), (960, 540)]
+    assert resolution_ladder(1366, 768)[-1] == (960, 540)
+    assert all(w % 2 == 0 for w, _ in resolution_ladder(1366, 768))
+
+def test_steps_down_under_sustained_load_and_holds():
+    scaler, clock = make_scaler()
+    clock.now = 10.0 # Past the initial hold
+    scaler.report_encoder(0.95)
+    assert run(scaler, clock, 1.5) == [] # A short spike is absorbed
+    assert run(scaler, clock, 1.0) == [(1600, 900)]
+    # Still overloaded: one rung per min_hold, never two at once
+    assert run(scaler, clock, 4.0) == []
+    assert run(scaler, clock, 3.0) == [(1280, 720)]
+    assert scaler.stats()["switches"] == 2
+    assert "encoder load" in scaler.events[-1]["reason"]
+
+def test_steps_back_up_after_calm():
+    scaler, clock = make_scaler()
+    clock.now = 10.0
+    scaler.report_encoder(1.2)
+    run(scaler, clock, 2.5)
+    assert scaler.resolution == (1600, 900)
+    scaler.report_encoder(0.75) # Between thresholds: neither pressure nor calm
+    assert run(scaler, clock, 20.0) == []
+    scaler.report_encoder(0.3)
+    assert run(scaler, clock, 9.0) == []
+    assert run(scaler, clock, 2.0) == [(1920, 1080)]
+    assert scaler.events[-1]["reason"] == "headroom"
+    assert run(scaler, clock, 30.0) == [] # Already at the top rung
+
+def test_worst_viewer_drives_network_pressure():
+    scaler, clock = make_scaler()
+    clock.now = 10.0
+    scaler.report_encoder(0.2)
+    for _ in range(6):
+        scaler.report_network("good", 0.0, 20)
+        scaler.report_network("lossy", 0.12, 40)
+        run(scaler, clock, 0.5)
+    assert scaler.resolution == (1600, 900)
+    assert "loss 12.0%" in scaler.events[-1]["reason"]
+
+def test_stale_network_reports_expire():
+    scaler, clock = make_scaler(network_timeout=3.0)
+    clock.now = 10.0
+    scaler.report_network("gone", 0.5, 900)
+    run(scaler, clock, 3.5)
+    assert scaler.resolution == (1600, 900) # Pressure while the report was fresh
+    assert run(scaler, clock, 10.0 + 5.0) == [(1920, 1080)] # Expired: calm again
+    scaler.report_network("left", 0.5, 900)
+    scaler.forget("left")
+    assert run(scaler, clock, 10.0) == []
+
+def test_pyav_track_switches_in_place():
+    from capture_system import EncodedVideoTrack
+    args = SimpleNamespace(resolution="1920x1080", dynamic_scale=True)
+    track = EncodedVideoTrack("test", args)
+    applied = []
+    track._engine = SimpleNamespace(encode_load=lambda: 1.5, set_resolution=lambda w, h: applied.append((w, h)))
+    track.scaler._last_switch = -100.0
+    track.scaler._pressure_since = -100.0
+    track._update_governors()
+    assert applied == [(1600, 900)] and (track.width, track.height) == (1600, 900)
+    assert track.scale_stats()["resolution"] == "1600x900"
+    track._engine = None
+    assert EncodedVideoTrack("test", SimpleNamespace(resolution="1280x720")).scaler is None
+
+def test_fps_ladder():
+    assert fps_ladder(60) == [60, 45, 30]
+    assert fps_ladder(144) == [144, 60, 45, 30]
+    assert fps_ladder(30) == [30]
+    governor = FpsGovernor(60, clock=FakeClock())
+    assert governor.stats()["fps"] == 60 and governor.stats()["ladder"] == ["60 fps", "45 fps", "30 fps"]
+
+def test_resolution_gives_way_before_frame_rate():
+    from capture_system import EncodedVideoTrack
+    track = EncodedVideoTrack("test", SimpleNamespace(resolution="1280x720", dynamic_scale=True, adaptive_fps=True))
+    calls = []
+    load = [1.5]
+    track._engine = SimpleNamespace(encode_load=lambda: load[0],
+                                    set_resolution=lambda w, h: calls.append((w, h)),
+                                    set_fps=lambda fps: calls.append(fps))
+    clock = FakeClock()
+    clock.now = 100.0
+    for governor in track.governors():
+        governor._clock = clock
+        governor._last_switch = 0.0
+    def tick(seconds):
+        end = clock.now + seconds
+        while clock.now < end:
+            clock.now += 0.5
+            track._update_governors(clock.now)
+
+    tick(20)
+    # 720p -> 540p first, only then 60 -> 45 -> 30 fps
+    assert calls == [(960, 540), 45, 30]
+    assert track.fps == 30 and (track.width, track.height) == (960, 540)
+    load[0] = 0.1
+    calls.clear()
+    tick(60)
+    # Frame rate comes back before resolution
+    assert calls == [45, 60, (1280, 720)]
+    assert track.fps == 60
+    track._engine = None
+
+def test_session_fps_report():
+    import time
+    from capture_system import MediaCaptureSystem
+    session = MediaCaptureSystem.__new__(MediaCaptureSystem) # No capture: just the reporting
+    session.pc_id, session.args = "test", SimpleNamespace(fps=60)
+    session.video_track = SimpleNamespace(frame_count=90, fps=45, fps_governor=None)
+    session._fps_sample = (time.monotonic() - 2.0, 0)
+    stats = session.fps_stats()
+    assert 44 <= stats["achieved"] <= 45 and stats["target"] == 45 and stats["base"] == 60
+    assert "governor" not in stats
+
+if __name__ == "__main__":
+    test_ladder()
+    test_steps_down_under_sustained_load_and_holds()
+    test_steps_back_up_after_calm()
+    test_worst_viewer_drives_network_pressure()
+    test_stale_network_reports_expire()
+    test_pyav_track_switches_in_place()
+    test_fps_ladder()
+    test_resolution_gives_way_before_frame_rate()
+    test_session_fps_report()
+    print("✅ Dynamic scale / adaptive FPS OK")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Testes do probe de encoders: benchmark com clipe lavfi, cache em disco e escolha do `--encoder auto`.
+"""
+import os
+import json
+import tempfile
+import encoder_probe
+
+SMALL = {"size": (320, 240), "frame_count": 20}
+
+def test_cpu_candidates_always_present():
+    names = [name for name, _ in encoder_probe.candidates()]
+    assert names[:3] == ["libx264"] * 3
+
+def test_broken_encoder_fails_cleanly():
+    results = encoder_probe.run_probe(encoders=[("libx264", "ultrafast"), ("h264_nonexistent", None)], **SMALL)
+    ok, broken = results
+    assert ok["ok"] and ok["fps"] > 0 and ok["latency_ms"] is not None and ok["arg"] == "cpu"
+    assert not broken["ok"] and broken["error"]
+    assert encoder_probe.best_encoder(results) is ok
+
+def test_results_are_cached_per_fingerprint():
+    path = os.path.join(tempfile.mkdtemp(), "probe.json")
+    encoders = [("libx264", "ultrafast")]
+    first = encoder_probe.probe(path=path, encoders=encoders, **SMALL)
+    with open(path) as f:
+        cache = json.load(f)
+    key, _ = encoder_probe.fingerprint()
+    assert list(cache) == [key]
+
+    # A cache hit must not re-run the benchmark
+    cache[key]["results"][0]["fps"] = 12345.0
+    with open(path, "w") as f:
+        json.dump(cache, f)
+    assert encoder_probe.probe(path=path, encoders=encoders, **SMALL)[0]["fps"] == 12345.0
+    assert encoder_probe.probe(path=path, force=True, encoders=encoders, **SMALL)[0]["fps"] != 12345.0
+    assert first[0]["ok"]
+
+def test_pick_fastest_working_encoder():
+    results = [
+        dict(encoder_probe._result("libx264", "ultrafast", "pyav"), ok=True, fps=200.0),
+        dict(encoder_probe._result("h264_vaapi", None, "cli"), ok=True, fps=450.0),
+        dict(encoder_probe._result("h264_nvenc", "p1", "pyav"), ok=False, error="no device"),
+    ]
+    assert encoder_probe.best_encoder(results)["arg"] == "vaapi"
+    table = encoder_probe.format_table(results)
+    assert "<- auto" in table.splitlines()[2] and "no device" in table
+
+def test_no_working_encoder_falls_back_to_cpu():
+    path = os.path.join(tempfile.mkdtemp(), "probe.json")
+    assert encoder_probe.pick_encoder(path=path, encoders=[("h264_nonexistent", None)], **SMALL) == ("cpu", None)
+
+def test_auto_keeps_the_winning_x264_preset():
+    path = os.path.join(tempfile.mkdtemp(), "probe.json")
+    assert encoder_probe.pick_encoder(path=path, encoders=[("libx264", "superfast")], **SMALL) == ("cpu", "superfast")
+    from pyav_engine import encoder_options
+    assert encoder_options("libx264", 1000000, 60, preset="superfast")["preset"] == "superfast"
+    assert encoder_options("libx264", 1000000, 60)["preset"] == "ultrafast"
+
+def test_cli_rate_leaves_out_start_up_and_source():
+    # 400 ms process/VAAPI start, 1 ms per frame of testsrc2, 2 ms per frame of upload + encode
+    run = lambda frames: 0.4 + frames * 0.003
+    assert round(encoder_probe.encode_rate(120, run(120), 10, run(10), 110 * 0.001)) == 500
+    assert round(120 / run(120)) == 158 # What the whole-run wall time used to report
+
+def test_vaapi_probe_times_two_runs():
+    runs = []
+    def fake_run(cmd):
+        frames = int(cmd[cmd.index("-frames:v") + 1])
+        runs.append(frames)
+        return 0.4 + frames * 0.003
+    saved = encoder_probe.shutil.which, encoder_probe._run_cli, encoder_probe._source_seconds
+    encoder_probe.shutil.which = lambda name: "/usr/bin/ffmpeg"
+    encoder_probe._run_cli = fake_run
+    encoder_probe._source_seconds = lambda width, height, frames: frames * 0.001
+    try:
+        result = encoder_probe.probe_vaapi_cli(320, 240, 120)
+    finally:
+        encoder_probe.shutil.which, encoder_probe._run_cli, encoder_probe._source_seconds = saved
+    assert runs == [encoder_probe.CLI_BASELINE_FRAMES, 120]
+    assert result["ok"] and result["fps"] == 500.0 and result["latency_ms"] == 2.0
+
+def test_intra_refresh_flattens_frame_sizes():
+    comparison = encoder_probe.compare_intra_refresh(size=(320, 240), frame_count=90, gop=30, bitrate=1000000)
+    idr, refresh = comparison["periodic_idr"], comparison["intra_refresh"]
+    assert idr["frames"] == refresh["frames"] == 89
+    assert refresh["cv"] < idr["cv"] and refresh["peak_to_mean"] < idr["peak_to_mean"]
+    assert "intra_refresh" in encoder_probe.format_frame_sizes(comparison)
+
+if __name__ == "__main__":
+    test_cpu_candidates_always_present()
+    test_broken_encoder_fails_cleanly()
+    test_results_are_cached_per_fingerprint()
+    test_pick_fastest_working_encoder()
+    test_no_working_encoder_falls_back_to_cpu()
+    test_auto_keeps_the_winning_x264_preset()
+    test_cli_rate_leaves_out_start_up_and_source()
+    test_vaapi_probe_times_two_runs()
+    test_intra_refresh_flattens_frame_sizes()
+    print("✅ Probe de encoders OK")
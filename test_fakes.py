@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Dublês compartilhados pelos testes: relógio manual, gamepad que só grava as escritas e backend do GamepadPool (sem /dev/uinput).
+"""
+import time
+from input_manager import InputManager
+
+class FakeClock:
+    """Manual clock for the clock= parameters: tests move `now` themselves."""
+    def __init__(self, now=0.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+class FakeDevice:
+    """Records what would be written to the uinput device."""
+    def __init__(self, name=""):
+        self.name = name
+        self.writes = []
+        self.syns = 0
+    def write(self, etype, code, value):
+        self.writes.append((etype, code, value))
+    def syn(self):
+        self.syns += 1
+
+def make_manager(pads=1):
+    """InputManager whose first `pads` gamepads are FakeDevices."""
+    manager = InputManager()
+    devices = [FakeDevice() for _ in range(pads)]
+    for index, device in enumerate(devices):
+        manager.gamepads[index] = device
+    return manager, devices
+
+class FakeBackend:
+    """Device factory for GamepadPool: FakeDevices, optional creation delay / failure."""
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.created = []
+
+    def create(self, slot):
+        if self.delay:
+            time.sleep(self.delay) # Stands in for the OS enumerating the device
+        if self.fail:
+            return None
+        device = FakeDevice(f"NeonGamepad P{slot + 1}")
+        self.created.append(device)
+        return device
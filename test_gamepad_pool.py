@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Testes do pool de gamepads virtuais: pré-criação, slots por sessão, liberação neutra e métricas (backend falso, sem /dev/uinput).
+"""
+import time
+from evdev import ecodes
+from gamepad_pool import GamepadPool
+from input_manager import InputManager
+from input_protocol import encode_batch, encode_snapshot
+from input_thread import InputThread, BATCH, RELEASE
+from telemetry import TelemetryStore
+from test_fakes import FakeBackend
+
+def make_pool(size=2, **backend_args):
+    backend = FakeBackend(**backend_args)
+    pool = GamepadPool(backend.create, size=size)
+    pool.start()
+    return pool, backend
+
+def test_devices_created_up_front():
+    pool, backend = make_pool(size=3, delay=0.01)
+    assert len(backend.created) == 3 and pool.stats()["free"] == 3
+    started = time.perf_counter()
+    assert pool.allocate("s1") == [0]
+    assert time.perf_counter() - started < 0.01 # No creation on the connect / first press path
+    assert backend.created[0].name == "NeonGamepad P1"
+    assert pool.stats()["create_ms_max"] >= 10.0
+
+def test_sessions_never_share_player_one():
+    pool, backend = make_pool()
+    manager = InputManager(pool=pool)
+    manager.handle_batch(encode_batch([("BUTTON", "A", 1, 0)]), session_id="s1")
+    manager.handle_batch(encode_batch([("BUTTON", "B", 1, 0)]), session_id="s2")
+    first, second = backend.created
+    assert first.writes == [(ecodes.EV_KEY, ecodes.BTN_A, 1)]
+    assert second.writes == [(ecodes.EV_KEY, ecodes.BTN_B, 1)]
+    assert pool.session_slots("s1") == {0: 0} and pool.session_slots("s2") == {0: 1}
+    # A session's second pad: next free device, created on demand once the pool runs out
+    manager.handle_input({"type": "BUTTON", "code": "Y", "value": 1, "gamepadIndex": 1}, session_id="s1")
+    stats = pool.stats()
+    assert pool.session_slots("s1") == {0: 0, 1: 2} and stats["misses"] == 1 and stats["devices"] == 3
+    assert backend.created[2].writes == [(ecodes.EV_KEY, ecodes.BTN_Y, 1)]
+
+def test_release_neutralizes_and_recycles():
+    pool, backend = make_pool()
+    manager = InputManager(pool=pool)
+    manager.handle_snapshot(encode_snapshot({0: (["A", "DPAD_LEFT"], (1000, 0, 0, 0))}, seq=1), session_id="s1")
+    device = backend.created[0]
+    device.writes.clear()
+    manager.release_session("s1")
+    assert sorted(device.writes) == sorted([(ecodes.EV_KEY, ecodes.BTN_A, 0), (ecodes.EV_ABS, ecodes.ABS_HAT0X, 0),
+                                            (ecodes.EV_ABS, ecodes.ABS_X, 0)])
+    assert device.syns == 2 # One batch for the snapshot, one for the release
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["free"] == 2 and stats["releases"] == 1 and stats["slots"] == {}
+    # The next session gets the same (lowest, now neutral) device; no stale state to diff against
+    manager.handle_snapshot(encode_snapshot({0: (["A"], (0, 0, 0, 0))}, seq=1), session_id="s2")
+    assert pool.session_slots("s2") == {0: 0} and device.writes[-1] == (ecodes.EV_KEY, ecodes.BTN_A, 1)
+
+def test_failed_backend_drops_input_without_raising():
+    pool, backend = make_pool(fail=True)
+    manager = InputManager(pool=pool)
+    assert manager.handle_batch(encode_batch([("BUTTON", "A", 1, 0)]), session_id="s1") == 0
+    stats = pool.stats()
+    assert stats["devices"] == 0 and stats["failures"] == 3 and stats["allocations"] == 0
+
+def test_release_through_the_input_thread():
+    pool, backend = make_pool()
+    manager = InputManager(pool=pool)
+    store = TelemetryStore()
+    session = store.open("s1")
+    pool.allocate("s1")
+    worker = InputThread(manager, priority="normal")
+    worker.start()
+    try:
+        worker.submit(BATCH, encode_batch([("BUTTON", "RB", 1, 0)]), session)
+        worker.submit(RELEASE, None, session)
+        deadline = time.time() + 2
+        while pool.stats()["releases"] < 1 and time.time() < deadline:
+            time.sleep(0.001)
+    finally:
+        worker.stop()
+    assert backend.created[0].writes == [(ecodes.EV_KEY, ecodes.BTN_TR, 1), (ecodes.EV_KEY, ecodes.BTN_TR, 0)]
+    assert pool.stats()["in_use"] == 0
+    assert session.distribution("input_latency_ms")["count"] == 1 # The release is not an input message
+
+if __name__ == "__main__":
+    test_devices_created_up_front()
+    test_sessions_never_share_player_one()
+    test_release_neutralizes_and_recycles()
+    test_failed_backend_drops_input_without_raising()
+    test_release_through_the_input_thread()
+    print("✅ Pool de gamepads OK")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Testes da detecção de cena estática: frame-diff numpy, keep-alive, mpdecimate e integração nos caminhos de captura.
+"""
+import io
+import fractions
+from types import SimpleNamespace
+import numpy as np
+import av
+from idle_detect import StaticSceneDetector, mpdecimate_filter
+
+W, H = 64, 48
+
+def luma(value=0, noise=None):
+    plane = np.full((H, W), value, dtype=np.uint8)
+    if noise is not None:
+        plane = (plane.astype(np.int16) + noise).clip(0, 255).astype(np.uint8)
+    return plane
+
+def test_static_frames_drop_to_keepalive_rate():
+    detector = StaticSceneDetector(keepalive_fps=2)
+    kept = [not detector.check(luma(), now=i / 60) for i in range(120)] # 2 s at 60 fps
+    assert sum(kept) == 4 # First frame + a keep-alive every 0.5 s
+    stats = detector.stats()
+    assert stats["idle"] and stats["skipped"] == 116 and stats["skipped_fraction"] == round(116 / 120, 3)
+
+def test_motion_resumes_immediately():
+    detector = StaticSceneDetector(keepalive_fps=2)
+    detector.check(luma(), now=0.0)
+    assert detector.check(luma(), now=0.1)
+    moved = luma()
+    moved[8:24, 8:24] = 200 # A window opened in a corner
+    assert not detector.check(moved, now=0.12)
+    assert not detector.idle
+
+def test_sensor_noise_is_still_static():
+    rng = np.random.default_rng(1)
+    detector = StaticSceneDetector()
+    detector.check(luma(100), now=0.0)
+    assert detector.check(luma(100, rng.integers(-2, 3, (H, W))), now=0.02)
+    assert not detector.check(luma(140), now=0.04) # Global fade / brightness change
+
+def test_mpdecimate_filter_is_valid():
+    assert "mpdecimate" in av.filter.filters_available
+    assert mpdecimate_filter(60, 2).endswith(":max=29")
+    graph = av.filter.Graph()
+    src = graph.add_buffer(width=W, height=H, format="yuv420p", time_base=fractions.Fraction(1, 60))
+    decimate = graph.add("mpdecimate", mpdecimate_filter(60, 2)[len("mpdecimate="):])
+    sink = graph.add("buffersink")
+    src.link_to(decimate)
+    decimate.link_to(sink)
+    graph.configure()
+
+def test_engine_skips_static_frames():
+    from pyav_engine import PyAVVideoEngine
+    packets = []
+    detector = StaticSceneDetector(keepalive_fps=2)
+    engine = PyAVVideoEngine("color=c=gray:size=160x120:rate=60:duration=1", "lavfi", {}, 160, 120, 60,
+                             bitrate=300000, on_packet=lambda data, t: packets.append(data),
+                             idle_detector=detector)
+    engine.start()
+    engine._thread.join(20)
+    stats = detector.stats()
+    assert stats["frames"] == 60 and stats["skipped"] >= 55
+    assert engine.stats()["frames"] == 60 - stats["skipped"] == len(packets)
+
+def test_raw_reader_skips_duplicate_frames():
+    from capture_system import WindowsVideoTrack
+    frame_size = W * H * 3 // 2
+    contents = [10, 10, 10, 200, 200, 10]
+    stream = io.BytesIO(b"".join(bytes([v]) * frame_size for v in contents))
+    track = WindowsVideoTrack("test", SimpleNamespace(resolution=f"{W}x{H}", idle_skip=True))
+    track._running = True
+    track.process = SimpleNamespace(stdout=stream, poll=lambda: None, terminate=lambda: None)
+    published = []
+    original_set = track._ev.set
+    def on_frame():
+        with track._lock:
+            slot, track._latest_frame = track._latest_frame, None
+        if slot is not None:
+            published.append(int(slot.array[0, 0]))
+            track._frame_pool.release(slot)
+        original_set()
+    track._ev.set = on_frame
+    track._read_loop_raw()
+    assert published == [10, 200, 10]
+    assert track.idle_stats()["skipped"] == 3
+    assert track._frame_pool.stats()["free"] == 4 # Skipped frames went straight back to the pool
+
+if __name__ == "__main__":
+    test_static_frames_drop_to_keepalive_rate()
+    test_motion_resumes_immediately()
+    test_sensor_noise_is_still_static()
+    test_mpdecimate_filter_is_valid()
+    test_engine_skips_static_frames()
+    test_raw_reader_skips_duplicate_frames()
+    print("✅ Detecção de cena estática OK")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Testes da proteção anti-flood de input (token bucket por sessão) e da coalescência de eixos por tick (sem /dev/uinput).
+"""
+from evdev import ecodes
+from input_guard import TokenBucket, InputGuard
+from input_protocol import encode_batch, encode_snapshot
+from test_fakes import make_manager
+from telemetry import TelemetryStore
+
+def test_token_bucket_rate_and_burst():
+    now = [0.0]
+    bucket = TokenBucket(rate=100, burst=10, clock=lambda: now[0])
+    assert sum(bucket.take() for _ in range(50)) == 10 # Burst, then empty
+    now[0] += 0.05 # 5 tokens refilled
+    assert sum(bucket.take() for _ in range(50)) == 5
+    now[0] += 60.0 # Never above the burst
+    assert sum(bucket.take() for _ in range(50)) == 10
+
+def test_guard_drops_a_flood_and_counts_it():
+    now = [0.0]
+    store = TelemetryStore()
+    session = store.open("s1")
+    guard = InputGuard("s1", session, rate=1000, burst=250, clock=lambda: now[0])
+    # A misbehaving client: 5000 messages in one second, sent in 1 ms slices
+    allowed = 0
+    for _ in range(1000):
+        now[0] += 0.001
+        allowed += sum(guard.allow() for _ in range(5))
+    assert 1000 <= allowed <= 1000 + 250
+    assert guard.dropped == 5000 - allowed and guard.stats()["dropped"] == guard.dropped
+    assert f'neon_session_input_dropped_total{{session="s1"}} {guard.dropped}' in store.prometheus().splitlines()
+    assert store.to_json()["sessions"][0]["counters"]["input_dropped"] == guard.dropped
+
+def test_guard_lets_a_normal_client_through():
+    now = [0.0]
+    guard = InputGuard(rate=1000, burst=250, clock=lambda: now[0])
+    for _ in range(600): # 10 s of a 60 Hz snapshot client
+        now[0] += 1 / 60
+        assert guard.allow()
+    assert guard.dropped == 0
+
+def test_coalescing_keeps_latest_axis_and_every_button_edge():
+    manager, (pad,) = make_manager()
+    messages = [("batch", encode_batch([("AXIS", "LEFT_X", v, 0), ("BUTTON", "A", v % 2, 0)]), None)
+                for v in range(1, 101)] # 100 messages piled up: A toggles every message
+    messages.append(("event", {"type": "AXIS", "code": "LEFT_Y", "value": 7, "gamepadIndex": 0}, None))
+    decoded, written = manager.apply_messages(messages)
+    assert decoded == 201 and written == 102 and manager.coalesced == 99
+    assert pad.syns == 1
+    assert [w for w in pad.writes if w[1] == ecodes.ABS_X] == [(ecodes.EV_ABS, ecodes.ABS_X, 100)]
+    button_a = [w[2] for w in pad.writes if w[1] == ecodes.BTN_A]
+    assert button_a == [1, 0] * 50 # No edge lost
+
+def test_coalescing_drops_repeated_button_values():
+    manager, (pad,) = make_manager()
+    repeat = encode_batch([("BUTTON", "B", 1, 0)])
+    manager.apply_messages([("batch", repeat, None)] * 5)
+    assert pad.writes == [(ecodes.EV_KEY, ecodes.BTN_B, 1)]
+
+def test_coalesced_snapshots_keep_a_short_tap():
+    """A press and release in two snapshots queued in the same tick both reach the device."""
+    manager, (pad,) = make_manager()
+    manager.apply_messages([("snapshot", encode_snapshot({0: (["X"], (10, 0, 0, 0))}, seq=1), None),
+                            ("snapshot", encode_snapshot({0: ([], (20, 0, 0, 0))}, seq=2), None),
+                            ("snapshot", encode_snapshot({0: ([], (30, 0, 0, 0))}, seq=3), None)])
+    assert pad.writes == [(ecodes.EV_KEY, ecodes.BTN_X, 1), (ecodes.EV_KEY, ecodes.BTN_X, 0),
+                          (ecodes.EV_ABS, ecodes.ABS_X, 30)]
+    # The device state followed: the same snapshot again writes nothing
+    pad.writes.clear()
+    manager.apply_messages([("snapshot", encode_snapshot({0: ([], (30, 0, 0, 0))}, seq=4), None)])
+    assert pad.writes == []
+
+if __name__ == "__main__":
+    test_token_bucket_rate_and_burst()
+    test_guard_drops_a_flood_and_counts_it()
+    test_guard_lets_a_normal_client_through()
+    test_coalescing_keeps_latest_axis_and_every_button_edge()
+    test_coalescing_drops_repeated_button_values()
+    test_coalesced_snapshots_keep_a_short_tap()
+    print("✅ Proteção anti-flood OK")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Testes da instrumentação de latência de input: cabeçalho v2 (sequência + horário do poll),
+estimativa de offset de relógio por PING/PONG, perdas/reordenação e histogramas por sessão.
+"""
+import time
+import pytest
+from input_protocol import encode_batch, decode_batch, decode_header, SEQ_MOD
+from input_latency import ClockOffset, InputLatency
+from input_thread import InputThread, BATCH
+from telemetry import TelemetryStore
+
+TICK = [("BUTTON", "A", 1, 0), ("AXIS", "LEFT_X", -32768, 1)]
+
+def test_v2_header_round_trip():
+    message = encode_batch(TICK, seq=SEQ_MOD + 7, sent_ms=1700000000123.25)
+    assert decode_header(message) == (14, 2, 7, 1700000000123.25)
+    assert list(decode_batch(message)) == list(decode_batch(encode_batch(TICK)))
+    assert decode_header(encode_batch(TICK))[2:] == (None, None) # v1: old clients, unstamped
+    with pytest.raises(ValueError):
+        decode_header(message[:10])
+
+def test_clock_offset_prefers_lowest_rtt():
+    clock = ClockOffset()
+    # Client clock 250 ms ahead; 10 ms each way, one sample with 80 ms of uplink queueing
+    assert clock.add(t0=1000.0, t1=1260.0, t3=1020.0) == 250.0
+    clock.add(t0=2000.0, t1=2260.0, t3=2100.0) # Skewed by the queue
+    assert clock.offset_ms == 250.0 and clock.rtt_ms == 20.0
+    assert clock.add(t0=0.0, t1=5.0, t3=-1.0) is None # Negative RTT: clock jump
+
+def test_ping_pong_and_transit():
+    now = [100.0]
+    store = TelemetryStore()
+    session = store.open("s1")
+    latency = InputLatency(session, clock=lambda: now[0])
+    assert latency.received_input(0, 99_000.0) is None # No clock estimate yet
+    ping = latency.ping()
+    assert ping["type"] == "PING" and ping["t0"] == 100_000.0
+    # Client clock 5 s behind; the PONG arrives 30 ms later (15 ms each way)
+    assert latency.pong({"id": ping["id"], "t0": ping["t0"], "t1": 95_015.0}, now_ms=100_030.0) == -5000.0
+    assert session.last("input_clock_offset_ms") == -5000.0 and session.last("input_clock_rtt_ms") == 30.0
+    # Polled at client 95_100 (= server 100_100), received at server 100_118
+    assert latency.received_input(1, 95_100.0, now_ms=100_118.0) == 18.0
+    assert latency.received_input(2, 95_200.0, now_ms=100_199.0) == 0.0 # Offset error: clamped
+    assert latency.received_input(3, 95_300.0, now_ms=100_100.0) is None # Far off: not a sample
+    assert session.distribution("input_transit_ms")["count"] == 2
+    assert latency.pong({"t0": "x"}) is None
+
+def test_sequence_gaps_late_and_wrap():
+    latency = InputLatency()
+    for seq in (SEQ_MOD - 2, SEQ_MOD - 1, 1, 2, 2, 0, 5):
+        latency.received_input(seq, 1.0)
+    # Gap at 0 (filled late), duplicate 2, gap 3-4
+    assert latency.gaps == 3 and latency.late == 1 and latency.duplicates == 1 and latency.lost == 2
+    latency.received_input(None, None)
+    stats = latency.stats()
+    assert stats["messages"] == {"received": 8, "unstamped": 1, "lost": 2, "late": 1, "duplicates": 1,
+                                 "stale_snapshots": 0}
+
+def test_server_side_split_per_session():
+    class SlowManager:
+        def apply_messages(self, messages):
+            time.sleep(0.003) # Device write
+    store = TelemetryStore()
+    session = store.open("s1")
+    worker = InputThread(SlowManager(), priority="normal")
+    worker.start()
+    try:
+        for seq in range(5):
+            worker.submit(BATCH, encode_batch(TICK, seq=seq, sent_ms=0.0), session)
+            if seq == 0:
+                time.sleep(0.001) # The thread takes the first one alone; the rest queue behind its write
+        deadline = time.time() + 2
+        while worker.applied < 5 and time.time() < deadline:
+            time.sleep(0.001)
+    finally:
+        worker.stop()
+    queue, write, total = (session.distribution(name) for name in ("input_queue_ms", "input_write_ms", "input_latency_ms"))
+    assert queue["count"] == write["count"] == total["count"] == 5
+    assert write["min"] >= 3.0 and queue["max"] >= 1.0 # Later messages waited behind the first write
+    assert total["max"] >= write["max"]
+    stats = InputLatency(session).stats()
+    assert stats["distributions"]["input_write_ms"]["count"] == 5
+    assert "neon_session_input_write_ms_count" in store.prometheus()
+
+if __name__ == "__main__":
+    test_v2_header_round_trip()
+    test_clock_offset_prefers_lowest_rtt()
+    test_ping_pong_and_transit()
+    test_sequence_gaps_late_and_wrap()
+    test_server_side_split_per_session()
+    print("✅ Latência de input OK")
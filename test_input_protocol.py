@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Testes do protocolo binário de input: lote por tick de polling, tabela de códigos, fallback JSON
+escrita em lote no uinput (um syn por dispositivo por lote) e snapshots de estado (sem /dev/uinput).
+"""
+import json
+import os
+import timeit
+import pytest
+from evdev import ecodes
+import input_protocol
+from input_protocol import encode_batch, decode_batch, encode_snapshot, decode_snapshot, is_snapshot
+import input_manager
+from input_manager import InputManager, INPUT_EVENT
+from test_fakes import make_manager
+
+TICK = [("BUTTON", "A", 1, 0), ("AXIS", "LEFT_X", -32768, 0), ("AXIS", "LEFT_Y", 32767, 0),
+        ("BUTTON", "DPAD_LEFT", 1, 0), ("BUTTON", "RT", 1, 0), ("BUTTON", "HOME", 0, 0)]
+
+def test_round_trip_and_size():
+    message = encode_batch(TICK)
+    assert len(message) == 4 + 5 * len(TICK)
+    assert list(decode_batch(message)) == [(1, 0, 0, 1), (2, 0, 0, -32768), (2, 0, 1, 32767),
+                                           (1, 0, 14, 1), (1, 0, 7, 1), (1, 0, 16, 0)]
+    assert len(json.dumps([{"type": t, "code": c, "value": v, "gamepadIndex": g} for t, c, v, g in TICK])) > 4 * len(message)
+
+def test_rejects_malformed_batches():
+    message = encode_batch(TICK)
+    with pytest.raises(ValueError):
+        decode_batch(message[:-1]) # Truncated
+    with pytest.raises(ValueError):
+        decode_batch(b"\x4e\x02" + message[2:]) # Future version
+    with pytest.raises(ValueError):
+        decode_batch(b"{}") # Text that slipped in as bytes
+    assert list(decode_batch(encode_batch([]))) == []
+
+def test_batch_matches_json_path():
+    binary, (pad_b,) = make_manager()
+    text, (pad_t,) = make_manager()
+    assert binary.handle_batch(encode_batch(TICK)) == len(TICK)
+    for type_, code, value, gamepad in TICK:
+        text.handle_input({"type": type_, "code": code, "value": value, "gamepadIndex": gamepad})
+    assert pad_b.writes == pad_t.writes
+    assert (ecodes.EV_ABS, ecodes.ABS_HAT0X, -1) in pad_b.writes
+    assert (ecodes.EV_KEY, ecodes.BTN_A, 1) in pad_b.writes
+
+def test_unknown_codes_are_skipped_and_pads_routed():
+    manager, pads = make_manager(pads=2)
+    message = bytearray(encode_batch([("BUTTON", "A", 1, 1), ("BUTTON", "B", 1, 0)]))
+    message[4 + 2] = 200 # Code from a newer client table
+    assert manager.handle_batch(bytes(message)) == 1
+    assert pads[0].writes == [(ecodes.EV_KEY, ecodes.BTN_B, 1)] and pads[1].writes == []
+
+class PipeDevice:
+    """uinput stand-in with a real fd: what the manager writes can be read back from the pipe."""
+    def __init__(self):
+        self.read_fd, self.fd = os.pipe()
+    def write(self, *event):
+        raise AssertionError("fd devices get one os.write per batch")
+    syn = write
+    def events(self):
+        data = os.read(self.read_fd, 65536)
+        return [event[2:] for event in INPUT_EVENT.iter_unpack(data)]
+
+def test_one_syn_per_device_per_batch():
+    manager, pads = make_manager(pads=2)
+    tick = TICK + [("AXIS", "RIGHT_X", 100, 1), ("BUTTON", "B", 1, 1)]
+    assert manager.handle_batch(encode_batch(tick)) == len(tick)
+    assert pads[0].syns == 1 and pads[1].syns == 1
+    assert len(pads[0].writes) == len(TICK)
+    assert pads[1].writes == [(ecodes.EV_ABS, ecodes.ABS_RX, 100), (ecodes.EV_KEY, ecodes.BTN_B, 1)]
+
+    manager.apply_events([("BUTTON", "A", 0, 0), ("BUTTON", "NOPE", 1, 0), ("AXIS", "LEFT_X", 5, 0)])
+    assert pads[0].syns == 2 and pads[0].writes[-2:] == [(ecodes.EV_KEY, ecodes.BTN_A, 0), (ecodes.EV_ABS, ecodes.ABS_X, 5)]
+
+def test_fd_device_gets_a_single_write():
+    manager = InputManager()
+    device = manager.gamepads[0] = PipeDevice()
+    calls = []
+    real_write = os.write
+    input_manager.os.write = lambda fd, data: calls.append(fd) or real_write(fd, data)
+    try:
+        manager.handle_batch(encode_batch(TICK))
+    finally:
+        input_manager.os.write = real_write
+    assert calls == [device.fd]
+    events = device.events()
+    assert events[-1] == (0, 0, 0) # SYN_REPORT closes the batch
+    assert events[:-1] == [(ecodes.EV_KEY, ecodes.BTN_A, 1), (ecodes.EV_ABS, ecodes.ABS_X, -32768),
+                           (ecodes.EV_ABS, ecodes.ABS_Y, 32767), (ecodes.EV_ABS, ecodes.ABS_HAT0X, -1),
+                           (ecodes.EV_ABS, ecodes.ABS_RZ, 255), (ecodes.EV_KEY, ecodes.BTN_MODE, 0)]
+
+def test_dispatch_tables_cover_the_wire_codes():
+    manager = InputManager()
+    for type_id, codes in input_protocol.CODES.items():
+        assert len(manager._dispatch_ids[type_id]) == len(codes)
+        assert all(action is not None for action in manager._dispatch_ids[type_id])
+    assert manager._dispatch[("BUTTON", "DPAD_UP")] == (ecodes.EV_ABS, ecodes.ABS_HAT0Y, -1)
+    assert manager._dispatch[("AXIS", "RIGHT_Y")] == (ecodes.EV_ABS, ecodes.ABS_RY, None)
+
+def test_snapshot_round_trip():
+    message = encode_snapshot({1: ([], (0, 0, 0, 0)), 0: (["A", "HOME"], (-32768, 1, 2, 32767))}, seq=70000, sent_ms=5.0)
+    assert is_snapshot(message) and not is_snapshot(encode_batch(TICK, seq=1))
+    seq, pads = decode_snapshot(message)
+    assert seq == 70000 % input_protocol.SEQ_MOD
+    assert list(pads) == [(0, 1 | 1 << 16, -32768, 1, 2, 32767), (1, 0, 0, 0, 0, 0)]
+    with pytest.raises(ValueError):
+        decode_batch(message)
+
+def test_snapshot_writes_only_the_diff():
+    manager, (pad,) = make_manager()
+    assert manager.handle_snapshot(encode_snapshot({0: (["A", "DPAD_DOWN"], (100, 0, 0, 0))}, seq=1)) == 3
+    assert pad.writes == [(ecodes.EV_KEY, ecodes.BTN_A, 1), (ecodes.EV_ABS, ecodes.ABS_HAT0Y, 1),
+                          (ecodes.EV_ABS, ecodes.ABS_X, 100)]
+    # Repeated snapshot (refresh): nothing to write
+    assert manager.handle_snapshot(encode_snapshot({0: (["A", "DPAD_DOWN"], (100, 0, 0, 0))}, seq=2)) == 0
+    assert pad.syns == 1
+    # DOWN -> UP share the hat axis: the release goes first so UP wins
+    pad.writes.clear()
+    assert manager.handle_snapshot(encode_snapshot({0: (["A", "DPAD_UP"], (100, 0, 0, 0))}, seq=3)) == 2
+    assert pad.writes == [(ecodes.EV_ABS, ecodes.ABS_HAT0Y, 0), (ecodes.EV_ABS, ecodes.ABS_HAT0Y, -1)]
+
+def test_snapshot_heals_a_lost_release():
+    """A delta release lost on the wire leaves A stuck; the next snapshot releases it."""
+    manager, (pad,) = make_manager()
+    manager.handle_batch(encode_batch([("BUTTON", "A", 1, 0)], seq=1)) # Press arrives, release is lost
+    pad.writes.clear()
+    manager.handle_snapshot(encode_snapshot({0: ([], (0, 0, 0, 0))}, seq=3))
+    assert pad.writes == [(ecodes.EV_KEY, ecodes.BTN_A, 0)]
+
+def test_stale_snapshots_dropped_per_session():
+    from input_latency import InputLatency
+    latency = InputLatency()
+    accepted = []
+    for seq in (1, 3, 2, 3, 4):
+        latency.received_input(seq, 0.0)
+        if not latency.stale:
+            accepted.append(seq)
+    assert accepted == [1, 3, 4]
+
+def test_binary_decode_is_cheaper_than_json():
+    messages_json = [json.dumps({"type": t, "code": c, "value": v, "gamepadIndex": g}) for t, c, v, g in TICK]
+    message = encode_batch(TICK)
+    json_time = timeit.timeit(lambda: [json.loads(m) for m in messages_json], number=2000)
+    binary_time = timeit.timeit(lambda: list(decode_batch(message)), number=2000)
+    assert binary_time < json_time
+
+def test_bench_baseline_replays_the_old_dispatch():
+    import input_bench
+    old, (pad_old,) = make_manager()
+    new, (pad_new,) = make_manager()
+    for type_, code, value, gamepad in TICK:
+        input_bench.baseline_apply(old, type_, code, value, gamepad)
+        new.handle_input({"type": type_, "code": code, "value": value, "gamepadIndex": gamepad})
+    assert pad_old.writes == pad_new.writes and pad_old.syns == len(TICK)
+    real_write = os.write
+    result = input_bench.run("baseline", ticks=10, pads=2)
+    assert os.write is real_write # The counting wrapper never outlives the run
+    assert result["syscalls"] == result["events"] * 2 # write + syn per event
+
+if __name__ == "__main__":
+    test_round_trip_and_size()
+    test_rejects_malformed_batches()
+    test_batch_matches_json_path()
+    test_unknown_codes_are_skipped_and_pads_routed()
+    test_one_syn_per_device_per_batch()
+    test_fd_device_gets_a_single_write()
+    test_dispatch_tables_cover_the_wire_codes()
+    test_snapshot_round_trip()
+    test_snapshot_writes_only_the_diff()
+    test_snapshot_heals_a_lost_release()
+    test_stale_snapshots_dropped_per_session()
+    test_binary_decode_is_cheaper_than_json()
+    test_bench_baseline_replays_the_old_dispatch()
+    print("✅ Protocolo binário de input OK")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Testes da thread de input: fila SPSC, aplicação fora do loop asyncio, latência recebimento -> escrita e prioridade.
+"""
+import asyncio
+import threading
+import time
+from input_thread import SPSCQueue, InputThread, BATCH, EVENT
+from input_protocol import encode_batch
+from telemetry import TelemetryStore
+
+class RecordingManager:
+    """InputManager stand-in: records what was applied and on which thread."""
+    def __init__(self, delay=0.0):
+        self.applied = []
+        self.threads = set()
+        self.delay = delay
+    def apply_messages(self, messages):
+        for kind, payload, _ in messages:
+            self._record(("batch", payload) if kind == BATCH else ("event", payload["code"]))
+    def _record(self, entry):
+        if self.delay:
+            time.sleep(self.delay)
+        self.threads.add(threading.current_thread().name)
+        self.applied.append(entry)
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+def test_spsc_queue_order_and_bound():
+    queue = SPSCQueue(4)
+    assert queue.pop() is None
+    assert all(queue.push(i) for i in range(4))
+    assert not queue.push(4) # Full: the producer is never blocked
+    assert [queue.pop(), queue.pop()] == [0, 1]
+    assert queue.push(5) and queue.push(6) # Wraps around
+    assert [queue.pop() for _ in range(4)] == [2, 3, 5, 6] and len(queue) == 0
+
+def test_spsc_queue_across_threads():
+    queue = SPSCQueue(64)
+    out = []
+    def consumer():
+        while len(out) < 20000:
+            item = queue.pop()
+            if item is not None:
+                out.append(item)
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    for i in range(20000):
+        while not queue.push(i):
+            pass
+    thread.join(10)
+    assert out == list(range(20000))
+
+def test_applies_on_input_thread_in_order():
+    manager = RecordingManager()
+    worker = InputThread(manager, priority="normal")
+    worker.submit(EVENT, {"code": "A"}) # Not started yet: applied inline
+    assert manager.threads == {threading.current_thread().name}
+    worker.start()
+    try:
+        batch = encode_batch([("BUTTON", "B", 1, 0)])
+        for i in range(500):
+            worker.submit(BATCH if i % 2 else EVENT, batch if i % 2 else {"code": i})
+            if i % 100 == 0:
+                time.sleep(0.01) # Let the thread go idle so the doorbell path runs too
+        assert wait_for(lambda: worker.applied == 501)
+    finally:
+        worker.stop()
+    assert "NeonInput" in manager.threads
+    assert [entry for entry in manager.applied[1:] if entry[0] == "event"] == [("event", i) for i in range(0, 500, 2)]
+    stats = worker.stats()
+    assert stats["received"] == 501 and stats["dropped"] == 0 and stats["latency_ms"]["count"] == 501
+    assert stats["scheduling"] == "inline" and not stats["running"]
+
+def test_input_does_not_wait_for_a_blocked_loop():
+    """A long synchronous stall on the loop (getStats/SDP/gc) must not hold queued input."""
+    manager = RecordingManager()
+    worker = InputThread(manager, priority="normal")
+    worker.start()
+    applied_during_stall = []
+    async def main():
+        worker.submit(EVENT, {"code": "A"})
+        time.sleep(0.2) # Blocks the event loop
+        applied_during_stall.append(len(manager.applied))
+    try:
+        asyncio.run(main())
+    finally:
+        worker.stop()
+    assert applied_during_stall == [1]
+
+def test_latency_recorded_per_session_and_overflow_counted():
+    store = TelemetryStore()
+    session = store.open("s1")
+    manager = RecordingManager(delay=0.002)
+    worker = InputThread(manager, priority="normal", capacity=8)
+    worker.start()
+    try:
+        results = [worker.submit(EVENT, {"code": i}, session) for i in range(50)]
+        assert wait_for(lambda: worker.applied == results.count(True))
+    finally:
+        worker.stop()
+    assert worker.dropped == results.count(False) > 0
+    stats = session.distribution("input_latency_ms")
+    assert stats["count"] == worker.applied and stats["min"] >= 2.0 # Includes the device write
+    assert "neon_session_input_latency_ms_count" in store.prometheus()
+
+def test_priority_falls_back_when_not_permitted():
+    worker = InputThread(RecordingManager(), priority="realtime")
+    worker.start()
+    try:
+        assert wait_for(lambda: worker.scheduling != "inline")
+        scheduling = worker.scheduling
+    finally:
+        worker.stop()
+    assert scheduling.startswith(("SCHED_FIFO", "nice", "normal", "time critical", "highest"))
+
+if __name__ == "__main__":
+    test_spsc_queue_order_and_bound()
+    test_spsc_queue_across_threads()
+    test_applies_on_input_thread_in_order()
+    test_input_does_not_wait_for_a_blocked_loop()
+    test_latency_recorded_per_session_and_overflow_counted()
+    test_priority_falls_back_when_not_permitted()
+    print("✅ Thread de input OK")
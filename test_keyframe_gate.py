@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Testes do keyframe sob demanda: PLI/FIR do aiortc -> IDR no encoder de captura, com limite de taxa.
+"""
+import asyncio
+from types import SimpleNamespace
+from keyframe_gate import KeyframeGate
+from test_fakes import FakeClock
+
+def test_first_request_fires_and_storm_is_coalesced():
+    clock = FakeClock(100.0)
+    fired = []
+    gate = KeyframeGate(lambda: fired.append(clock.now), min_interval=0.5, clock=clock)
+    assert gate.request()
+    for _ in range(10): # PLI storm from several viewers
+        clock.now += 0.02
+        assert not gate.request()
+    assert not gate.poll() # Still inside the interval
+    clock.now = 100.5
+    assert gate.poll() and not gate.poll()
+    assert fired == [100.0, 100.5]
+    assert gate.stats() == {"requests": 11, "forced": 2, "coalesced": 9, "pending": False}
+
+def test_gop_keyframe_serves_pending_request():
+    clock = FakeClock(100.0)
+    fired = []
+    gate = KeyframeGate(lambda: fired.append(clock.now), min_interval=0.5, clock=clock)
+    gate.request()
+    clock.now += 0.1
+    gate.request()
+    gate.on_keyframe() # An IDR went out anyway
+    clock.now += 1.0
+    assert not gate.poll()
+    assert len(fired) == 1
+
+def test_passthrough_encode_forwards_force_keyframe():
+    import compat
+    from aiortc.codecs.h264 import H264Encoder
+    from capture_system import PassthroughVideoFrame
+    requests = []
+    frame = PassthroughVideoFrame(16, 16, "yuv420p")
+    frame._encoded_payload = [b"\x00\x00\x00\x01\x41\x9a\x00\x00"]
+    frame._request_keyframe = lambda: requests.append(1)
+    frame.pts, frame.time_base = 0, compat.VIDEO_TIME_BASE
+    encoder = H264Encoder()
+    encoder.encode(frame, False)
+    assert requests == []
+    payloads, _ = encoder.encode(frame, True)
+    assert requests == [1] and payloads
+
+def test_pli_produces_idr_from_pyav_pipeline():
+    from capture_system import EncodedVideoTrack
+    from packet_queue import classify_access_unit
+    args = SimpleNamespace(resolution="160x120", region="full", bitrate=300, fps=30, capture_backend="synthetic",
+                           engine="pyav", encoder="cpu", gop=600)
+    async def main():
+        track = EncodedVideoTrack("test", args)
+        track._start_capture()
+        units = []
+        async def collect(count):
+            for _ in range(200):
+                await asyncio.sleep(0.02)
+                while (unit := track._video_queue.pop()) is not None:
+                    units.append(classify_access_unit(unit)[0])
+                if len(units) >= count:
+                    return
+        try:
+            await collect(5) # Initial IDR + P-frames
+            frame = track._make_frame(b"")
+            for _ in range(5):
+                frame._request_keyframe() # Same loss reported by several viewers
+            await collect(len(units) + 5)
+        finally:
+            track.stop()
+        return units, track.keyframe_stats()
+    units, stats = asyncio.run(main())
+    assert units[0] and sum(units) == 2 # Exactly one extra IDR for the whole storm
+    assert stats["forced"] == 1 and stats["requests"] == 5
+
+def test_pli_respawns_ffmpeg_cli_when_the_gop_is_far():
+    import capture_system
+    from capture_system import EncodedVideoTrack, CLI_KEYFRAME_RESPAWN_INTERVAL
+    args = SimpleNamespace(resolution="160x120", fps=30, gop=600) # 20 s GOP
+    async def main():
+        track = EncodedVideoTrack("test", args)
+        starts = []
+        track._start_capture = lambda: starts.append(1)
+        track._running, track._loop = True, asyncio.get_running_loop()
+        track._last_keyframe_at = capture_system.time.monotonic()
+        assert track.request_keyframe()
+        await asyncio.sleep(0)
+        assert len(starts) == 1
+        track.keyframes._last_forced -= 1.0 # Past the gate, not past the respawn interval
+        assert track.request_keyframe()
+        await asyncio.sleep(0)
+        assert len(starts) == 1
+        # GOP IDR due soon: no respawn needed
+        track._keyframe_respawn_at -= CLI_KEYFRAME_RESPAWN_INTERVAL
+        track._last_keyframe_at = capture_system.time.monotonic() - 19.5
+        track.keyframes._last_forced -= 1.0
+        track.request_keyframe()
+        await asyncio.sleep(0)
+        track._running = False
+        return starts, track.keyframe_stats()
+    starts, stats = asyncio.run(main())
+    assert len(starts) == 1 and stats["respawns"] == 1 and stats["forced"] == 3
+
+if __name__ == "__main__":
+    test_first_request_fires_and_storm_is_coalesced()
+    test_gop_keyframe_serves_pending_request()
+    test_passthrough_encode_forwards_force_keyframe()
+    test_pli_produces_idr_from_pyav_pipeline()
+    test_pli_respawns_ffmpeg_cli_when_the_gop_is_far()
+    print("✅ Keyframe sob demanda OK")
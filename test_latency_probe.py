@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Testes do --latency-probe: marcador de timecode nos frames (numpy e drawbox do FFmpeg), leitura e distribuição glass-to-glass.
+"""
+import fractions
+import numpy as np
+import av
+import latency_probe
+from latency_probe import stamp_frame, stamp_buffer, read_marker, drawbox_filter, glass_to_glass_ms, stamp_ms
+
+def gray_frame(width, height, value=90):
+    frame = av.VideoFrame(width, height, "yuv420p")
+    for plane in frame.planes:
+        np.frombuffer(plane, np.uint8)[:] = value
+    return frame
+
+def split_chain(chain):
+    """Filter chain -> filter specs (commas inside quoted expressions stay)."""
+    specs, current, quoted = [], "", False
+    for ch in chain:
+        if ch == "'":
+            quoted = not quoted
+        if ch == "," and not quoted:
+            specs.append(current)
+            current = ""
+        else:
+            current += ch
+    return specs + [current]
+
+def encode_decode(frames, width, height, bitrate=300000):
+    """x264 at a low bitrate, then decoded and scaled like a browser would see it."""
+    encoder = av.CodecContext.create("libx264", "w")
+    encoder.width, encoder.height, encoder.pix_fmt = width, height, "yuv420p"
+    encoder.time_base = fractions.Fraction(1, 30)
+    encoder.bit_rate = bitrate
+    encoder.options = {"preset": "ultrafast", "tune": "zerolatency"}
+    decoder = av.CodecContext.create("h264", "r")
+    decoded = []
+    for i, frame in enumerate(frames):
+        frame.pts = i
+        for packet in encoder.encode(frame):
+            decoded += decoder.decode(packet)
+    for packet in encoder.encode():
+        decoded += decoder.decode(packet)
+    return decoded
+
+def test_marker_round_trip_through_h264():
+    stamps = [0, 1, 0x8000, 0xFFFF, 12345, 54321]
+    frames = []
+    for stamp in stamps:
+        frame = gray_frame(1280, 720)
+        stamp_frame(frame, stamp)
+        frames.append(frame)
+    decoded = encode_decode(frames, 1280, 720)
+    assert [read_marker(f.to_ndarray()[:720]) for f in decoded] == stamps
+    # Scaled down on the way (--dynamic-scale rung, or the client's own resize)
+    small = [f.reformat(width=960, height=540) for f in decoded]
+    assert [read_marker(f.to_ndarray()[:540]) for f in small] == stamps
+    assert read_marker(gray_frame(1280, 720).to_ndarray()[:720]) is None # No marker
+
+def test_raw_buffer_stamp():
+    width, height = 320, 240
+    buffer = np.full((height * 3 // 2, width), 200, np.uint8) # FrameBufferPool slot layout
+    stamp_buffer(buffer, width, height, 0xBEEF)
+    assert read_marker(buffer[:height]) == 0xBEEF
+    assert buffer[height, 0] == latency_probe.NEUTRAL # U plane starts right after luma
+
+def test_drawbox_filter_stamps_wall_clock():
+    graph = av.filter.Graph()
+    src = graph.add_buffer(width=640, height=360, format="yuv420p", time_base=fractions.Fraction(1, 60))
+    last = src
+    for spec in split_chain(drawbox_filter(360)):
+        name, _, args = spec.partition("=")
+        node = graph.add(name, args)
+        last.link_to(node)
+        last = node
+    sink = graph.add("buffersink")
+    last.link_to(sink)
+    graph.configure()
+    for i in range(5):
+        frame = gray_frame(640, 360)
+        frame.pts, frame.time_base = i, fractions.Fraction(1, 60)
+        before = stamp_ms()
+        src.push(frame)
+        out = sink.pull()
+        stamp = read_marker(out.to_ndarray()[:360])
+        assert (stamp - before) % latency_probe.PROBE_MOD <= 50
+        assert stamp == (out.pts // 1000) % latency_probe.PROBE_MOD # RTCTIME pts, in us
+
+def test_drawbox_filter_survives_a_later_scale():
+    """VAAPI CLI path: marker drawn at capture size, then scaled to the session size."""
+    graph = av.filter.Graph()
+    src = graph.add_buffer(width=1920, height=1080, format="yuv420p", time_base=fractions.Fraction(1, 60))
+    last = src
+    for spec in split_chain(drawbox_filter()) + ["scale=1280:720"]:
+        name, _, args = spec.partition("=")
+        node = graph.add(name, args)
+        last.link_to(node)
+        last = node
+    sink = graph.add("buffersink")
+    last.link_to(sink)
+    graph.configure()
+    frame = gray_frame(1920, 1080)
+    frame.pts, frame.time_base = 0, fractions.Fraction(1, 60)
+    src.push(frame)
+    out = sink.pull()
+    assert (out.width, out.height) == (1280, 720)
+    assert read_marker(out.to_ndarray()[:720]) == (out.pts // 1000) % latency_probe.PROBE_MOD
+
+def test_engine_stamps_encoded_frames():
+    from pyav_engine import PyAVVideoEngine
+    packets = []
+    engine = PyAVVideoEngine("testsrc2=size=320x240:rate=30:duration=1", "lavfi", {}, 320, 240, 30,
+                             bitrate=500000, on_packet=lambda data, t: packets.append((data, stamp_ms())),
+                             latency_probe=True)
+    engine.start()
+    engine._thread.join(20)
+    decoder = av.CodecContext.create("h264", "r")
+    delays = []
+    for data, received in packets:
+        for frame in decoder.decode(av.Packet(data)):
+            stamp = read_marker(frame.to_ndarray()[:240])
+            assert stamp is not None
+            delays.append((received - stamp) % latency_probe.PROBE_MOD)
+    assert len(delays) >= 25 and max(delays) < 1000
+
+def test_glass_to_glass_and_distribution():
+    now = 1700000000.0
+    stamp = stamp_ms(now - 0.045)
+    assert glass_to_glass_ms(stamp, now=now, uplink_ms=10, display_ms=8) == 43.0
+    assert glass_to_glass_ms(stamp_ms(1.0), now=1.0 + 65.6) is not None # Across the 16-bit wrap
+    assert glass_to_glass_ms(stamp_ms(now + 0.1), now=now) is None # Misread: "from the future"
+    assert glass_to_glass_ms("garbage", now=now) is None
+
+    from telemetry import TelemetryStore
+    store = TelemetryStore()
+    session = store.open("s1")
+    for latency in range(1, 101):
+        session.record_distribution("g2g_latency_ms", float(latency))
+    stats = session.distribution("g2g_latency_ms")
+    assert stats["count"] == 100 and stats["p50"] == 50.0 and stats["p99"] == 99.0 and stats["max"] == 100.0
+    lines = store.prometheus().splitlines()
+    assert "# TYPE neon_session_g2g_latency_ms summary" in lines
+    assert 'neon_session_g2g_latency_ms{session="s1",quantile="0.9"} 90.0' in lines
+    assert 'neon_session_g2g_latency_ms_count{session="s1"} 100' in lines
+    assert store.to_json()["sessions"][0]["distributions"]["g2g_latency_ms"]["p90"] == 90.0
+
+if __name__ == "__main__":
+    test_marker_round_trip_through_h264()
+    test_raw_buffer_stamp()
+    test_drawbox_filter_stamps_wall_clock()
+    test_drawbox_filter_survives_a_later_scale()
+    test_engine_stamps_encoded_frames()
+    test_glass_to_glass_and_distribution()
+    print("✅ Latency probe OK")
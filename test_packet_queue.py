@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Testes das filas de pacotes do caminho passthrough (sem FFmpeg).
+"""
+from packet_queue import VideoPacketQueue, AudioPacketQueue, classify_access_unit
+
+SPS = b"\x00\x00\x00\x01\x67\x42\xc0\x1f"
+PPS = b"\x00\x00\x00\x01\x68\xce\x3c\x80"
+IDR = SPS + PPS + b"\x00\x00\x01\x65\x88\x84"
+P_REF = b"\x00\x00\x00\x01\x41\x9a\x02"     # nal_ref_idc 2, type 1
+P_DISPOSABLE = b"\x00\x00\x00\x01\x01\x9a"  # nal_ref_idc 0, type 1
+
+def test_classify_access_unit():
+    assert classify_access_unit(IDR) == (True, False)
+    assert classify_access_unit(P_REF) == (False, False)
+    assert classify_access_unit(P_DISPOSABLE) == (False, True)
+
+def test_waits_for_first_keyframe():
+    q = VideoPacketQueue(max_depth=4)
+    assert not q.push(P_REF)
+    assert q.push(IDR)
+    assert q.pop() == IDR
+    assert q.stats()["dropped_packets"] == 1
+
+def test_fifo_without_overflow():
+    q = VideoPacketQueue(max_depth=4)
+    for unit in (IDR, P_REF, P_REF):
+        q.push(unit)
+    assert [q.pop(), q.pop(), q.pop(), q.pop()] == [IDR, P_REF, P_REF, None]
+
+def test_overflow_drops_disposable_first():
+    q = VideoPacketQueue(max_depth=3)
+    q.push(IDR)
+    q.push(P_DISPOSABLE)
+    q.push(P_REF)
+    q.push(P_REF + b"\x01")
+    assert q.stats()["dropped_packets"] == 1
+    assert [q.pop(), q.pop(), q.pop()] == [IDR, P_REF, P_REF + b"\x01"]
+
+def test_capture_path_keeps_the_disposable_flag():
+    """_on_encoded_packet classifies once and hands both flags to the queue."""
+    from capture_system import BaseCaptureTrack
+    class VideoTrack(BaseCaptureTrack):
+        kind = "video"
+    track = VideoTrack()
+    track._video_queue = VideoPacketQueue(max_depth=3)
+    for unit in (IDR, P_DISPOSABLE, P_REF, P_REF + b"\x01"):
+        track._on_encoded_packet(unit)
+    q = track._video_queue
+    assert q.stats()["dropped_packets"] == 1 and q.stats()["dropped_gops"] == 0
+    assert [q.pop(), q.pop(), q.pop()] == [IDR, P_REF, P_REF + b"\x01"]
+
+def test_overflow_skips_to_newest_gop():
+    q = VideoPacketQueue(max_depth=4)
+    idr2 = IDR + b"\x02"
+    for unit in (IDR, P_REF, idr2, P_REF):
+        q.push(unit)
+    q.push(P_REF + b"\x03")
+    assert q.pop() == idr2
+    assert q.stats()["dropped_gops"] == 1
+
+def test_overflow_inside_single_gop_waits_for_next_idr():
+    q = VideoPacketQueue(max_depth=3)
+    for unit in (IDR, P_REF, P_REF):
+        q.push(unit)
+    assert not q.push(P_REF)
+    assert len(q) == 0 and q.waiting_keyframe
+    assert not q.push(P_REF)
+    assert q.push(IDR)
+    assert q.pop() == IDR
+
+def test_incoming_keyframe_replaces_stale_queue():
+    q = VideoPacketQueue(max_depth=2)
+    q.push(IDR)
+    q.push(P_REF)
+    idr2 = IDR + b"\x02"
+    q.push(idr2)
+    assert q.pop() == idr2
+    assert q.pop() is None
+
+def test_audio_queue_stays_under_target():
+    q = AudioPacketQueue(frame_ms=20, target_ms=40)
+    for i in range(20):
+        q.push(bytes([i]), now=i * 0.02)
+    stats = q.stats()
+    assert stats["depth"] <= q.target_frames + AudioPacketQueue.CATCHUP_SLACK_FRAMES
+    assert stats["dropped_packets"] > 0 and stats["catchups"] > 0
+    # Oldest packets were dropped, newest survive
+    assert q.pop(now=0.4) is not None
+    remaining = []
+    while len(q):
+        remaining.append(q.pop(now=0.4))
+    assert remaining[-1] == bytes([19])
+
+def test_audio_queue_absorbs_small_jitter():
+    q = AudioPacketQueue(frame_ms=20, target_ms=40)
+    for i in range(q.target_frames + AudioPacketQueue.CATCHUP_SLACK_FRAMES):
+        q.push(bytes([i]))
+    assert q.stats()["dropped_packets"] == 0
+    assert q.pop() == bytes([0])
+
+def test_audio_queue_latency_metrics():
+    q = AudioPacketQueue(frame_ms=10, target_ms=80)
+    q.push(b"a", now=1.0)
+    q.push(b"b", now=1.0)
+    assert q.stats()["latency_ms"] == 20
+    q.pop(now=1.05)
+    assert q.stats()["avg_queue_age_ms"] == 50.0
+
+if __name__ == "__main__":
+    test_classify_access_unit()
+    test_waits_for_first_keyframe()
+    test_fifo_without_overflow()
+    test_overflow_drops_disposable_first()
+    test_capture_path_keeps_the_disposable_flag()
+    test_overflow_skips_to_newest_gop()
+    test_overflow_inside_single_gop_waits_for_next_idr()
+    test_incoming_keyframe_replaces_stale_queue()
+    test_audio_queue_stays_under_target()
+    test_audio_queue_absorbs_small_jitter()
+    test_audio_queue_latency_metrics()
+    print("✅ Filas de pacotes OK")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Testes do leitor de pipe: divisão Annex-B em access units e páginas Ogg em pacotes Opus.
+Usa o PyAV para gerar fluxos reais em memória (sem FFmpeg CLI, sem X11/Pulse).
+"""
+import io
+import sys
+import time
+from types import SimpleNamespace
+import fractions
+import av
+import numpy as np
+from pipe_reader import AnnexBSplitter, OggPacketSplitter
+
+def encode_h264(frames=12, gop=4):
+    codec = av.CodecContext.create("libx264", "w")
+    codec.width, codec.height = 64, 48
+    codec.pix_fmt = "yuv420p"
+    codec.time_base = fractions.Fraction(1, 60)
+    codec.options = {"tune": "zerolatency", "preset": "ultrafast", "g": str(gop), "bf": "0"}
+    units = []
+    for i in range(frames):
+        img = np.full((48, 64, 3), (i * 20) % 255, dtype=np.uint8)
+        frame = av.VideoFrame.from_ndarray(img, format="rgb24").reformat(format="yuv420p")
+        frame.pts = i
+        units += [bytes(p) for p in codec.encode(frame)]
+    units += [bytes(p) for p in codec.encode(None)]
+    return units
+
+def split_all(stream, chunk_sizes):
+    splitter = AnnexBSplitter()
+    out = []
+    pos = 0
+    i = 0
+    while pos < len(stream):
+        size = chunk_sizes[i % len(chunk_sizes)]
+        out += splitter.feed(stream[pos:pos + size])
+        pos += size
+        i += 1
+    tail = splitter.flush()
+    if tail:
+        out.append(tail)
+    return out, splitter
+
+def test_one_read_per_access_unit_is_zero_copy():
+    units = encode_h264()
+    splitter = AnnexBSplitter()
+    out = []
+    for unit in units:
+        out += splitter.feed(unit)
+    out.append(splitter.flush())
+    assert out == units
+    # Every unit but the last one was handed out as the original read object
+    assert all(a is b for a, b in zip(out[:-1], units[:-1]))
+    assert splitter.bytes_copied == 0
+
+def test_arbitrary_read_boundaries():
+    units = encode_h264()
+    stream = b"".join(units)
+    for sizes in ([1], [2, 3], [5, 7, 11], [1000], [len(stream)]):
+        out, _ = split_all(stream, sizes)
+        assert out == units, f"chunking {sizes}"
+
+def test_multi_slice_access_unit_kept_together():
+    sps = b"\x00\x00\x00\x01\x67\x42"
+    idr_slice0 = b"\x00\x00\x01\x65\x88\x01"   # first_mb_in_slice == 0
+    idr_slice1 = b"\x00\x00\x01\x65\x40\x02"   # first_mb_in_slice != 0
+    p_slice0 = b"\x00\x00\x00\x01\x41\x9a\x03"
+    stream = sps + idr_slice0 + idr_slice1 + p_slice0
+    out, _ = split_all(stream, [3])
+    assert out == [sps + idr_slice0 + idr_slice1, p_slice0]
+
+def mux_ogg_opus(packets=25):
+    buf = io.BytesIO()
+    out = av.open(buf, "w", format="ogg")
+    stream = out.add_stream("libopus", rate=48000)
+    stream.layout = "stereo"
+    expected = []
+    for i in range(packets):
+        samples = np.zeros((1, 960 * 2), dtype=np.int16)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="stereo")
+        frame.sample_rate = 48000
+        frame.pts = i * 960
+        for packet in stream.encode(frame):
+            expected.append(bytes(packet))
+            out.mux(packet)
+    for packet in stream.encode(None):
+        expected.append(bytes(packet))
+        out.mux(packet)
+    out.close()
+    return buf.getvalue(), expected
+
+def test_ogg_pages_to_opus_packets():
+    data, expected = mux_ogg_opus()
+    for size in (7, 100, len(data)):
+        splitter = OggPacketSplitter()
+        got = []
+        for pos in range(0, len(data), size):
+            got += splitter.feed(data[pos:pos + size])
+        assert got == expected, f"chunk {size}"
+
+def test_raw_pipe_drains_stderr():
+    """Raw Popen path (Windows ddagrab/WASAPI): a chatty FFmpeg must not block on a full stderr pipe."""
+    from capture_system import WindowsAudioTrack
+    track = WindowsAudioTrack(SimpleNamespace(audio_latency="low"))
+    # ~600 KB of progress lines (several pipe buffers) before the first PCM block
+    script = ("import sys; sys.stderr.write('frame=    1 fps=60 q=-0.0 speed=1x\\n' * 16384); sys.stderr.flush(); "
+              f"sys.stdout.buffer.write(bytes({track.frame_size} * 50)); sys.stdout.flush()")
+    track._start_ffmpeg([sys.executable, "-c", script])
+    try:
+        deadline = time.time() + 10
+        while track._frame_counter < 50 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        track.stop()
+    assert track._frame_counter == 50
+
+if __name__ == "__main__":
+    test_one_read_per_access_unit_is_zero_copy()
+    test_arbitrary_read_boundaries()
+    test_multi_slice_access_unit_kept_together()
+    test_ogg_pages_to_opus_packets()
+    test_raw_pipe_drains_stderr()
+    print("✅ Leitor de pipe OK")
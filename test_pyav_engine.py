@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Testes do engine PyAV in-process: lavfi testsrc2 -> libx264, sem X11 nem FFmpeg CLI.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+import pyav_engine
+from pyav_engine import PyAVVideoEngine
+from packet_queue import classify_access_unit
+
+def run_engine(frames, config=None, during=None, **kwargs):
+    """Runs the engine until `frames` packets arrived; during(engine, index) is called per packet."""
+    got = []
+    done = threading.Event()
+    kwargs.setdefault("gop", 600)
+    engine = PyAVVideoEngine("testsrc2=size=320x240:rate=60", "lavfi", {}, 160, 120, 60,
+                             bitrate=500000, config=config, **kwargs)
+    def on_packet(data, capture_time):
+        got.append(data)
+        if during:
+            during(engine, len(got))
+        if len(got) >= frames:
+            engine.stop()
+            done.set()
+    engine.on_packet = on_packet
+    engine.start()
+    assert done.wait(20), "engine produced no packets"
+    engine._thread.join(5)
+    return engine, got
+
+def test_packets_are_annexb_access_units():
+    engine, got = run_engine(10)
+    assert classify_access_unit(got[0])[0] # Starts on an IDR with in-band SPS/PPS
+    assert not any(classify_access_unit(unit)[0] for unit in got[1:])
+    assert engine.stats()["frames"] >= 10
+    assert not engine.is_alive()
+
+def test_keyframe_request_applies_to_next_frame():
+    def during(engine, index):
+        if index == 5:
+            engine.request_keyframe()
+    engine, got = run_engine(12, during=during)
+    keys = [i for i, unit in enumerate(got) if classify_access_unit(unit)[0]]
+    assert keys == [0, 5]
+    assert engine.stats()["reopens"] == 0
+
+def test_live_bitrate_and_gop_reopen_encoder():
+    pyav_engine.MIN_REOPEN_INTERVAL = 0.0
+    try:
+        config = {"bitrate": 500000, "gop": 600}
+        def during(engine, index):
+            if index == 5:
+                config["bitrate"] = 2000000
+            if index == 10:
+                engine.set_gop(4)
+        engine, got = run_engine(20, config=config, during=during)
+    finally:
+        pyav_engine.MIN_REOPEN_INTERVAL = 1.0
+    stats = engine.stats()
+    assert stats["bitrate"] == 2000000 and stats["gop"] == 4
+    assert stats["reopens"] == 2
+    keys = [i for i, unit in enumerate(got) if classify_access_unit(unit)[0]]
+    assert keys[:3] == [0, 5, 10] and len(keys) >= 4 # GOP 4 after the second reopen
+
+def test_small_bitrate_change_is_ignored():
+    pyav_engine.MIN_REOPEN_INTERVAL = 0.0
+    try:
+        def during(engine, index):
+            if index == 3:
+                engine.set_bitrate(510000)
+        engine, _ = run_engine(8, during=during)
+    finally:
+        pyav_engine.MIN_REOPEN_INTERVAL = 1.0
+    assert engine.stats()["reopens"] == 0
+
+def test_decimate_to_governed_fps():
+    engine = PyAVVideoEngine("testsrc2", "lavfi", {}, 160, 120, 60)
+    times = [i / 60 for i in range(120)]
+    assert not any(engine._decimate(t) for t in times) # At the input rate nothing is dropped
+    for fps, kept in ((45, 90), (30, 60)):
+        engine.fps, engine._next_due = fps, 0.0
+        # Jittered 60 fps capture times
+        assert sum(not engine._decimate(t + (0.002 if i % 3 else -0.002)) for i, t in enumerate(times)) == kept
+
+def test_live_resolution_and_fps_reopen_encoder():
+    pyav_engine.MIN_REOPEN_INTERVAL = 0.0
+    try:
+        def during(engine, index):
+            if index == 3:
+                engine.set_resolution(96, 64)
+                engine.set_fps(30)
+        engine, got = run_engine(8, during=during)
+    finally:
+        pyav_engine.MIN_REOPEN_INTERVAL = 1.0
+    stats = engine.stats()
+    assert stats["resolution"] == "96x64" and stats["fps"] == 30 and stats["reopens"] == 1
+    assert engine._encoder.width == 96 and engine._encoder.time_base.denominator == 30
+    assert classify_access_unit(got[3])[0] # New SPS + IDR right after the switch
+
+def test_intra_refresh_replaces_periodic_idrs():
+    def during(engine, index):
+        if index == 30:
+            engine.request_keyframe() # A PLI still gets a real IDR
+    engine, got = run_engine(40, during=during, gop=10, intra_refresh=True)
+    keys = [i for i, unit in enumerate(got) if classify_access_unit(unit)[0]]
+    assert keys == [0, 30] # No IDR every 10 frames
+    assert engine.stats()["intra_refresh"]
+    assert pyav_engine.encoder_options("h264_vaapi", 1000000, 60, intra_refresh=True) == \
+        pyav_engine.encoder_options("h264_vaapi", 1000000, 60)
+
+def test_stop_joins_the_engine_thread():
+    engine = PyAVVideoEngine("testsrc2=size=320x240:rate=60", "lavfi", {}, 160, 120, 60, bitrate=500000)
+    first = threading.Event()
+    engine.on_packet = lambda data, capture_time: first.set()
+    engine.start()
+    assert first.wait(20), "engine produced no packets"
+    engine.stop()
+    assert not engine.is_alive()
+
+def test_restart_drops_packets_of_the_stopped_engine():
+    from capture_system import EncodedVideoTrack
+    class FakeEngine:
+        def start(self): pass
+        def stop(self): pass
+        def is_alive(self): return True
+
+    async def run():
+        track = EncodedVideoTrack("test", SimpleNamespace(resolution="160x120", fps=60, bitrate=500))
+        received = []
+        track._on_encoded_packet = lambda data, capture_time=None: received.append(data)
+        old, new = FakeEngine(), FakeEngine()
+        track._start_engine(old)
+        old.on_packet(b"old", 0.0) # Posted to the loop just before the restart
+        track._start_engine(new)
+        new.on_packet(b"new", 0.0)
+        await asyncio.sleep(0)
+        track._engine = None
+        return received
+
+    assert asyncio.run(run()) == [b"new"]
+
+if __name__ == "__main__":
+    test_packets_are_annexb_access_units()
+    test_keyframe_request_applies_to_next_frame()
+    test_live_bitrate_and_gop_reopen_encoder()
+    test_small_bitrate_change_is_ignored()
+    test_decimate_to_governed_fps()
+    test_live_resolution_and_fps_reopen_encoder()
+    test_intra_refresh_replaces_periodic_idrs()
+    test_stop_joins_the_engine_thread()
+    test_restart_drops_packets_of_the_stopped_engine()
+    print("✅ Engine PyAV OK")
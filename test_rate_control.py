@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Testes do --adaptive-bitrate: AIMD por sessão (perda RTCP, RTT, REMB, STATS do cliente) e encoder compartilhado.
+"""
+import time
+from types import SimpleNamespace
+from rate_control import BitrateController
+from test_fakes import FakeClock
+
+def make_controller(max_kbps=20000, **kw):
+    clock = FakeClock(100.0)
+    return BitrateController(max_kbps * 1000, clock=clock, **kw), clock
+
+def step(rate, clock, seconds=1.0):
+    clock.now += seconds
+    return rate.update()
+
+def test_heavy_loss_backs_off_moderate_loss_holds():
+    rate, clock = make_controller()
+    rate.report_loss(0.20)
+    assert step(rate, clock) == 18000000 # 20 Mbps * (1 - 0.2 / 2)
+    rate.report_loss(0.05)
+    assert step(rate, clock) is None and rate.target == 18000000 and rate.state == "hold"
+    for _ in range(30): # Wi-Fi dip that doesn't go away
+        rate.report_loss(0.30)
+        step(rate, clock)
+    assert rate.target == 500000 # Floor
+
+def test_recovers_gradually_capped_by_received_rate():
+    rate, clock = make_controller(start_bps=4000000)
+    rate.report_loss(0.0)
+    assert step(rate, clock) == 4320000 # +8% per second
+    for _ in range(10):
+        rate.report_loss(0.0)
+        rate.report_client(received_mbps="3.00", rtt_ms=30)
+        step(rate, clock)
+    assert rate.target == 4500000 # 1.5x what the client actually receives
+    for _ in range(60):
+        rate.report_loss(0.0)
+        rate.report_client(received_mbps=str(rate.target / 1e6 * 0.98))
+        step(rate, clock)
+    assert rate.target == 20000000 # Ceiling = configured bitrate
+
+def test_rtt_growth_backs_off_to_received_rate():
+    rate, clock = make_controller()
+    rate.report_loss(0.0, rtt_ms=20)
+    rate.report_client(received_mbps="10.0")
+    step(rate, clock)
+    rate.report_loss(0.0, rtt_ms=180) # Queues filling up, nothing lost yet
+    assert step(rate, clock) == 8500000
+    assert rate.stats()["rtt_min_ms"] == 20
+
+def test_remb_caps_and_small_changes_are_ignored():
+    rate, clock = make_controller()
+    rate.report_remb(6000000)
+    assert step(rate, clock) == 6000000
+    rate.report_remb(5900000)
+    assert step(rate, clock) is None and rate.target == 5900000 and rate.applied == 6000000
+    clock.now += 10 # REMB went stale: free to probe again
+    rate.report_loss(0.0)
+    assert step(rate, clock) > 6000000
+
+def test_shared_encoder_follows_slowest_viewer():
+    from capture_system import EncodedVideoTrack
+    track = EncodedVideoTrack("test", SimpleNamespace(resolution="1280x720", bitrate=20000, engine="pyav"))
+    applied = []
+    track._engine = SimpleNamespace(set_bitrate=applied.append)
+    track.set_session_bitrate("a", 12000000)
+    track.set_session_bitrate("b", 4000000)
+    track.set_session_bitrate("a", 15000000)
+    assert applied == [12000000, 4000000, 4000000] and track.bitrate == 4000000
+    track.set_session_bitrate("b", None) # Slow viewer left
+    assert track.bitrate == 15000000
+    track.reconfigure(bitrate=10000000) # /api/settings lowers the ceiling
+    assert track.bitrate == 10000000
+    track._engine = None
+
+def test_cli_retunes_only_in_big_steps():
+    from capture_system import EncodedVideoTrack
+    track = EncodedVideoTrack("test", SimpleNamespace(resolution="1280x720", bitrate=20000))
+    track._capture_started -= 60
+    assert not track.set_session_bitrate("a", 17000000) # -15%: not worth a respawn
+    assert track.set_session_bitrate("a", 12000000)
+    assert track.bitrate == 12000000
+    track._capture_started = time.monotonic()
+    assert not track.set_session_bitrate("a", 5000000) # Just respawned
+    assert track.reconfigure(bitrate=8000000) # Explicit /api/settings change goes through
+    assert track.bitrate == 5000000 # Still the viewer's lower target
+
+def test_remb_reaches_session_through_passthrough_encoder():
+    import compat
+    from aiortc.codecs.h264 import H264Encoder
+    from capture_system import PassthroughVideoFrame
+    rate, clock = make_controller()
+    encoder = H264Encoder()
+    encoder.target_bitrate = 7000000 # What aiortc does on REMB (clamped to 3 Mbps for its own encoder)
+    frame = PassthroughVideoFrame(16, 16, "yuv420p")
+    frame._encoded_payload = [b"\x00\x00\x00\x01\x41\x9a\x00\x00"]
+    frame._report_remb = rate.report_remb
+    frame.pts, frame.time_base = 0, compat.VIDEO_TIME_BASE
+    encoder.encode(frame)
+    assert rate.stats()["remb_kbps"] == 7000
+    assert step(rate, clock) == 7000000
+
+if __name__ == "__main__":
+    test_heavy_loss_backs_off_moderate_loss_holds()
+    test_recovers_gradually_capped_by_received_rate()
+    test_rtt_growth_backs_off_to_received_rate()
+    test_remb_caps_and_small_changes_are_ignored()
+    test_shared_encoder_follows_slowest_viewer()
+    test_cli_retunes_only_in_big_steps()
+    test_remb_reaches_session_through_passthrough_encoder()
+    print("✅ Adaptive bitrate OK")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Testes do handler de mensagens do data channel do servidor (input binário, PONG e PROBE, sem WebRTC).
+"""
+import json
+from types import SimpleNamespace
+import server
+import input_thread
+from input_protocol import encode_batch, encode_snapshot
+from input_latency import InputLatency
+from latency_probe import stamp_ms
+from telemetry import TelemetryStore
+
+TICK = [("BUTTON", "A", 1, 0), ("AXIS", "LEFT_X", -32768, 1)]
+
+class FakeWorker:
+    def __init__(self):
+        self.submitted = []
+    def submit(self, kind, payload, session):
+        self.submitted.append((kind, payload, session))
+        return True
+
+def run_messages(messages):
+    worker = FakeWorker()
+    session = TelemetryStore().open("s1")
+    latency = InputLatency(session)
+    saved = server.input_worker
+    server.input_worker = worker
+    try:
+        on_message = server.make_message_handler(SimpleNamespace(), session, latency)
+        for message in messages(latency):
+            on_message(message)
+    finally:
+        server.input_worker = saved
+    return worker, session, latency
+
+def test_input_batch_and_pong_reach_the_session():
+    batch = encode_batch(TICK, seq=1, sent_ms=1000.0)
+    def messages(latency):
+        ping = latency.ping()
+        yield json.dumps({"type": "PONG", "id": ping["id"], "t0": ping["t0"], "t1": ping["t0"]})
+        yield batch
+    worker, session, latency = run_messages(messages)
+    assert worker.submitted == [(input_thread.BATCH, batch, session)]
+    assert session.last("input_clock_offset_ms") is not None
+    assert latency.stats()["messages"]["received"] == 1
+
+def test_probe_records_glass_to_glass():
+    def messages(latency):
+        yield json.dumps({"type": "PROBE", "stamp": stamp_ms(), "display_ms": 0})
+        yield encode_batch(TICK, seq=1, sent_ms=1000.0) # Still an input message after a PROBE
+    worker, session, _ = run_messages(messages)
+    assert session.distribution("g2g_latency_ms")["count"] == 1
+    assert len(worker.submitted) == 1
+
+def test_malformed_message_does_not_reuse_the_stale_flag():
+    snapshot = encode_snapshot({0: (["A"], (0, 0, 0, 0))}, seq=2, sent_ms=1000.0)
+    def messages(latency):
+        yield encode_snapshot({0: ([], (0, 0, 0, 0))}, seq=1, sent_ms=1000.0)
+        yield encode_snapshot({0: ([], (0, 0, 0, 0))}, seq=1, sent_ms=1000.0) # Duplicate: stale
+        yield snapshot[:5] # Truncated header
+        yield snapshot
+    worker, _, latency = run_messages(messages)
+    assert [kind for kind, _, _ in worker.submitted] == [input_thread.SNAPSHOT, input_thread.SNAPSHOT]
+    assert worker.submitted[-1][1] == snapshot
+    assert latency.stale_snapshots == 1
+
+if __name__ == "__main__":
+    test_input_batch_and_pong_reach_the_session()
+    test_probe_records_glass_to_glass()
+    test_malformed_message_does_not_reuse_the_stale_flag()
+    print("✅ Handler de mensagens OK")
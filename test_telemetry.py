@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Testes da telemetria por sessão: ring buffers, deltas dos STATS do cliente, RTP de saída e exportação Prometheus.
+"""
+import json
+from telemetry import SessionTelemetry, TelemetryStore
+from test_fakes import FakeClock
+
+def stats_message(received, lost, jb_delay, jb_count, fps=60, bitrate="12.50", latency=18):
+    return {"type": "STATS", "fps": fps, "bitrate": bitrate, "latency": latency,
+            "video": {"jitter": 0.004, "packetsReceived": received, "packetsLost": lost, "framesDropped": 0,
+                      "jitterBufferDelay": jb_delay, "jitterBufferEmittedCount": jb_count},
+            "audio": {"jitter": 0.002}}
+
+def test_series_are_bounded():
+    clock = FakeClock(1000.0)
+    session = SessionTelemetry("a", history=10, clock=clock)
+    for i in range(25):
+        clock.now += 1
+        session.record("client_fps", i)
+    data = session.to_dict()
+    assert len(data["series"]["client_fps"]) == 10
+    assert data["latest"]["client_fps"] == 24
+    assert data["summary"]["client_fps"] == {"min": 15, "avg": 19.5, "max": 24}
+    assert len(session.to_dict(points=3)["series"]["client_fps"]) == 3
+
+def test_client_stats_become_interval_metrics():
+    clock = FakeClock(1000.0)
+    session = SessionTelemetry("a", clock=clock)
+    session.record_client(stats_message(1000, 0, 3.0, 60))
+    assert "client_loss" not in session.latest() # First message: nothing to diff yet
+    clock.now += 1
+    session.record_client(stats_message(1950, 50, 5.4, 120))
+    latest = session.latest()
+    assert latest["client_fps"] == 60 and latest["client_bitrate_mbps"] == 12.5 and latest["client_rtt_ms"] == 18
+    assert latest["client_loss"] == 0.05 # 50 of 1000 expected this second
+    assert latest["client_jitter_buffer_ms"] == 40.0 # 2.4 s over 60 frames
+    assert latest["client_jitter_ms"] == 4.0 and latest["audio_jitter_ms"] == 2.0
+    clock.now += 1
+    session.record_client(stats_message(10, 0, 0.1, 5)) # Client reconnected: counters restart
+    assert session.latest()["client_loss"] == 0.05
+    session.record_client({"type": "STATS", "fps": 30, "bitrate": "n/a"}) # Old client.js, bad values
+    assert session.latest()["client_fps"] == 30
+
+def test_outbound_rate_from_cumulative_counters():
+    clock = FakeClock(1000.0)
+    session = SessionTelemetry("a", clock=clock)
+    session.record_outbound("video", 100, 1000000)
+    clock.now += 5
+    session.record_outbound("video", 600, 7250000)
+    assert session.latest()["video_send_kbps"] == 10000.0
+    assert session.counters == {"video_packets_sent": 600, "video_bytes_sent": 7250000}
+
+def test_prometheus_exposition():
+    store = TelemetryStore()
+    a = store.open("a1b2c3d4")
+    b = store.open('we"ird', host="box-1")
+    a.record("client_fps", 59.0)
+    b.record("client_fps", 30.0)
+    a.record_outbound("audio", 10, 2000)
+    text = store.prometheus()
+    lines = text.splitlines()
+    assert "neon_sessions_active 2" in lines
+    assert "# TYPE neon_session_client_fps gauge" in lines
+    assert 'neon_session_client_fps{session="a1b2c3d4"} 59.0' in lines
+    assert 'neon_session_client_fps{session="we\\"ird",host="box-1"} 30.0' in lines
+    assert 'neon_rtp_bytes_sent_total{session="a1b2c3d4",kind="audio"} 2000' in lines
+    assert "neon_session_rr_loss" not in text # No samples, no family
+    store.close("a1b2c3d4")
+    assert json.loads(json.dumps(store.to_json()))["sessions"][0]["session"] == 'we"ird'
+
+if __name__ == "__main__":
+    test_series_are_bounded()
+    test_client_stats_become_interval_metrics()
+    test_outbound_rate_from_cumulative_counters()
+    test_prometheus_exposition()
+    print("✅ Telemetria por sessão OK")